@@ -29,6 +29,8 @@ class AIEngine(ABC):
     """ Class that implements the AI logic """
 
     codec = None
+    # whether the call interrupts the playback when the caller speaks
+    barge_in = False
 
     @abstractmethod
     def __init__(self, call, cfg):
@@ -54,4 +56,21 @@ class AIEngine(ABC):
         """ returns the chosen codec """
         return self.codec
 
+    def interrupt(self):
+        """ drops the answer being generated or spoken """
+
+    @classmethod
+    def preload(cls):
+        """ loads the models used by the flavor, before serving calls """
+
+    @classmethod
+    async def warm_up(cls):
+        """ prepares process-wide resources before the first call """
+
+    @classmethod
+    def get_prompts(cls):
+        """ returns the fixed prompts that can be rendered before a call, as
+        (engine, voice, codec, text, synthesize) tuples """
+        return []
+
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -25,18 +25,99 @@ Azure Services for STT and TTS
 
 import azure.cognitiveservices.speech as speechsdk
 import logging
+import queue
 import asyncio
+import threading
 from ai import AIEngine
 from chatgpt_api import ChatGPT
-from codec import get_codecs, CODECS, UnsupportedCodec
+from conversation import DEFAULT_CONTEXT_TOKENS
+from codec import get_codecs, get_default_codec, CODECS, UnsupportedCodec
 from config import Config
+from prompts import play_prompt
+from speech_pipeline import SpeechPipeline, AnswerTasks, speak_answer
+from text_chunker import split_text
+from tts_cache import cached
+
+# bytes of synthesized audio read at once from the Azure SDK: 100 ms of
+# 8 kHz, 8-bit G.711
+RENDER_CHUNK_SIZE = 800
+
+
+class PushStreamWriter:
+    """ Writes the audio of a call to an Azure push stream from a dedicated
+    thread, in batches, so that the event loop never blocks in the SDK.
+    Batches are dropped, and counted, when more than `queue_size` of them
+    are waiting to be written. """
+
+    def __init__(self, stream, batch_size=1, queue_size=50):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.pending = []
+        self.batches = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name="azure-push-stream")
+        self.thread.start()
+
+    def write(self, audio):
+        """ Queues a packet, writing a batch once it is complete """
+        self.pending.append(audio)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Queues the pending packets as a batch """
+        if not self.pending:
+            return
+        try:
+            self.batches.put_nowait((b"".join(self.pending),
+                                     len(self.pending)))
+            self.written += len(self.pending)
+        except queue.Full:
+            self.dropped += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        """ Writes the pending audio, then closes the stream """
+        self.flush()
+        while True:
+            try:
+                self.batches.put_nowait(None)
+                break
+            except queue.Full:
+                pass
+            # make room for the end of the stream
+            try:
+                _, packets = self.batches.get_nowait()
+                self.written -= packets
+                self.dropped += packets
+            except queue.Empty:
+                pass
+        if self.dropped:
+            logging.warning("Azure push stream: %d of %d packets dropped",
+                            self.dropped, self.dropped + self.written)
+
+    def _run(self):
+        try:
+            while True:
+                batch = self.batches.get()
+                if batch is None:
+                    break
+                self.stream.write(batch[0])
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("Error writing to the Azure push stream")
+        finally:
+            # ends the recognition, which would otherwise wait for audio
+            self.stream.close()
 
 
 class AzureAI(AIEngine):
 
     """ Implements Azure AI communication """
 
-    llm = None
+    barge_in = True
 
     def __init__(self, call, cfg):
         self.queue = call.rtp
@@ -51,6 +132,8 @@ class AzureAI(AIEngine):
 
         chatgpt_key = self.cfg.get(["chatgpt_key", "openai_key"], ["CHATGPT_API_KEY", "OPENAI_API_KEY"])
         chatgpt_model = self.cfg.get("chatgpt_model", "CHATGPT_API_MODEL", "gpt-4o")
+        context_tokens = int(self.cfg.get("llm_context_tokens", "AZURE_LLM_CONTEXT_TOKENS",
+                                          DEFAULT_CONTEXT_TOKENS))
 
         self.language = self.cfg.get("language", "AZURE_LANGUAGE", "en-US")
         self.voice = self.cfg.get("voice", "AZURE_VOICE", "en-US-AriaNeural")
@@ -58,40 +141,33 @@ class AzureAI(AIEngine):
         self.instructions = self.cfg.get("instructions", "AZURE_INSTRUCTIONS")
 
         self.events = asyncio.Queue()
+        self.speech = None
+        self.answers = AnswerTasks()
+        # used to serialize the answers in the LLM context
+        self.answer_lock = asyncio.Lock()
 
-        speech_config = speechsdk.SpeechConfig(subscription=self.key, region=self.region)
-        speech_config.speech_recognition_language=self.language
-        speech_config.speech_synthesis_language=self.language
-        speech_config.speech_synthesis_voice_name=self.voice
-
-        if not AzureAI.llm:
-            AzureAI.llm = ChatGPT(chatgpt_key,
-                                  chatgpt_model)
-
-        if self.codec.name == "mulaw":
-            self.audio_format = speechsdk.audio.AudioStreamFormat(samples_per_second=self.codec.sample_rate, 
-                                                                  bits_per_sample=8, 
-                                                                  channels=1,
-                                                                  wave_stream_format=speechsdk.audio.AudioStreamWaveFormat.MULAW)
-            speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw8Khz8BitMonoMULaw)
-        elif self.codec.name == "alaw":
-            self.audio_format = speechsdk.audio.AudioStreamFormat(samples_per_second=self.codec.sample_rate,
-                                                                  bits_per_sample=8,
-                                                                  channels=1,
-                                                                  wave_stream_format=speechsdk.audio.AudioStreamWaveFormat.ALAW)
-            speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw8Khz8BitMonoALaw)
-        else:
-            raise UnsupportedCodec(self.codec.name)
-        
-        AzureAI.llm.create_call(self.b2b_key, self.instructions)
+        speech_config, self.audio_format = self.get_speech_config(
+            self.key, self.region, self.language, self.voice, self.codec)
+        self.llm = ChatGPT.get(chatgpt_key, chatgpt_model)
+        self.llm.create_call(self.b2b_key, self.instructions, context_tokens)
 
         self.input_stream = speechsdk.audio.PushAudioInputStream(
                                                                 stream_format=self.audio_format
                                                                 )
         self.input_audio_config = speechsdk.audio.AudioConfig(stream=self.input_stream)
+        # inbound packets are written in batches of audio_batch_ms
+        batch_ms = int(self.cfg.get("audio_batch_ms", "AZURE_AUDIO_BATCH_MS", 60))
+        self.writer = PushStreamWriter(
+            self.input_stream,
+            max(1, round(batch_ms / self.codec.ptime)),
+            int(self.cfg.get("audio_queue_size", "AZURE_AUDIO_QUEUE_SIZE", 50)))
         self.speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=self.input_audio_config)
 
-        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.speech_config = speech_config
+        # one synthesizer per sentence being synthesized, as stopping a
+        # synthesizer stops everything it is synthesizing
+        self.synthesizers = [self.new_synthesizer()]
+        self.connections = []
 
         def recognize_callback(evt):
             if len(evt.result.text) <= 2:
@@ -102,21 +178,110 @@ class AzureAI(AIEngine):
 
         self.speech_recognizer.recognized.connect(recognize_callback)
 
-    def speak(self, phrase):
-        """ Speaks a phrase """
-        result = self.synthesizer.speak_text_async(phrase).get()
-        self.drain_queue()
+    @staticmethod
+    def get_speech_config(key, region, language, voice, codec):
+        """ Returns the speech config and the audio format of a codec """
+        speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
+        speech_config.speech_recognition_language=language
+        speech_config.speech_synthesis_language=language
+        speech_config.speech_synthesis_voice_name=voice
+
+        if codec.name == "mulaw":
+            audio_format = speechsdk.audio.AudioStreamFormat(samples_per_second=codec.sample_rate, 
+                                                             bits_per_sample=8, 
+                                                             channels=1,
+                                                             wave_stream_format=speechsdk.audio.AudioStreamWaveFormat.MULAW)
+            speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw8Khz8BitMonoMULaw)
+        elif codec.name == "alaw":
+            audio_format = speechsdk.audio.AudioStreamFormat(samples_per_second=codec.sample_rate,
+                                                             bits_per_sample=8,
+                                                             channels=1,
+                                                             wave_stream_format=speechsdk.audio.AudioStreamWaveFormat.ALAW)
+            speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw8Khz8BitMonoALaw)
+        else:
+            raise UnsupportedCodec(codec.name)
+        return speech_config, audio_format
+
+    @staticmethod
+    def render(synthesizer, codec, phrase, emit, stopped):
+        """ Synthesizes a phrase, emitting its codec packets as soon as
+        its audio is received; returns early once `stopped` is set.
+        Returns True if the whole phrase was synthesized. """
+        # resolves as soon as the first audio chunk is available
+        result = synthesizer.start_speaking_text_async(phrase).get()
+        if stopped.is_set():
+            return False
+        if result.reason == speechsdk.ResultReason.Canceled:
+            details = result.cancellation_details
+            logging.warning("Azure synthesis canceled: %s %s",
+                            details.reason, details.error_details)
+            return False
 
         stream = speechsdk.AudioDataStream(result)
-        data = b''
-        buffer = bytes(self.codec.get_payload_len())
-        while True:
+        assembler = codec.assembler()
+        while not stopped.is_set():
+            # a new buffer for each read, as the packets are views into it
+            buffer = bytes(RENDER_CHUNK_SIZE)
             red = stream.read_data(buffer)
             if red == 0:
                 break
-            data += buffer
-        packets, _ = self.codec.parse(data, b'')
-        return packets 
+            for packet in assembler.feed(memoryview(buffer)[:red]):
+                emit(packet)
+        if stopped.is_set():
+            return False
+        packet = assembler.flush()
+        if packet:
+            emit(packet)
+        if stream.status == speechsdk.StreamStatus.Canceled:
+            logging.warning("Azure synthesis of '%s' interrupted", phrase)
+            return False
+        return True
+
+    @classmethod
+    async def stream_speech(cls, synthesizer, codec, text, sink):
+        """ Synthesizes a text in a worker thread, putting the packets in
+        the sink as they are produced; returns True if it completed """
+        loop = asyncio.get_running_loop()
+        stopped = threading.Event()
+
+        def emit(packet):
+            loop.call_soon_threadsafe(sink.put_nowait, packet)
+
+        render = asyncio.ensure_future(asyncio.to_thread(
+            cls.render, synthesizer, codec, text, emit, stopped))
+        try:
+            return await asyncio.shield(render)
+        except asyncio.CancelledError:
+            # the thread stops reading the synthesized audio, and the
+            # synthesizer stops producing it; the synthesizer is only free
+            # once both are done
+            stopped.set()
+            await asyncio.to_thread(synthesizer.stop_speaking_async().get)
+            await asyncio.gather(render, return_exceptions=True)
+            raise
+
+    @classmethod
+    def get_prompts(cls):
+        """ Returns the welcome message rendered for each codec """
+        cfg = Config.get("azure")
+        intro = cfg.get("welcome_message", "AZURE_WELCOME_MSG")
+        if not intro:
+            return []
+        language = cfg.get("language", "AZURE_LANGUAGE", "en-US")
+        voice = cfg.get("voice", "AZURE_VOICE", "en-US-AriaNeural")
+        prompts = []
+        for name in ["pcma", "pcmu"]:
+            codec = get_default_codec(name)
+            speech_config, _ = cls.get_speech_config(
+                cfg.get("key", "AZURE_KEY"), cfg.get("region", "AZURE_REGION"),
+                language, voice, codec)
+            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+            async def synthesize(text, sink, codec=codec, synthesizer=synthesizer):
+                return await cls.stream_speech(synthesizer, codec, text, sink)
+
+            prompts.append(("azure", voice, codec.name, intro, synthesize))
+        return prompts
 
     def drain_queue(self):
         """ Drains the playback queue """
@@ -124,16 +289,58 @@ class AzureAI(AIEngine):
         with self.queue.mutex:
             self.queue.queue.clear()
 
+    async def synthesize(self, text, sink):
+        """ Synthesizes a chunk of text into the sink """
+        synthesizer = (self.synthesizers.pop() if self.synthesizers
+                       else self.new_synthesizer(connect=True))
+        try:
+            return await self.stream_speech(synthesizer, self.codec, text,
+                                            sink)
+        finally:
+            self.synthesizers.append(synthesizer)
+
+    def new_synthesizer(self, connect=False):
+        """ Returns a new synthesizer, opening its connection if asked """
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=self.speech_config, audio_config=None)
+        if connect:
+            connection = speechsdk.Connection.from_speech_synthesizer(
+                synthesizer)
+            connection.open(True)
+            self.connections.append(connection)
+        return synthesizer
+
+    def start_speech(self):
+        """ Drops the current speech and starts a new pipeline """
+        if self.speech:
+            self.speech.cancel()
+        self.drain_queue()
+        synthesize = cached(self.synthesize, "azure", self.voice,
+                            self.codec.name)
+        self.speech = SpeechPipeline(synthesize, self.queue)
+        return self.speech
+
     async def process_speech(self, phrase):
-        """ Processes the speech received from LLM """
-        packets = await asyncio.to_thread(self.speak, phrase)
-        for packet in packets:
-            self.queue.put_nowait(packet)
+        """ Processes the speech received from LLM, sentence by sentence """
+        speech = self.start_speech()
+        for chunk in split_text(phrase, self.language):
+            speech.push(chunk)
+        speech.finish()
+        await speech.wait()
 
     async def handle_phrase(self, phrase):
-        """ Handles the response from a phrase """
-        response = await AzureAI.llm.handle(self.b2b_key, phrase)
-        asyncio.create_task(self.process_speech(response))
+        """ Speaks the answer of a phrase, each sentence being synthesized
+        as soon as the LLM generated it """
+        async with self.answer_lock:
+            await speak_answer(self.start_speech(),
+                               self.llm.stream(self.b2b_key, phrase),
+                               self.language)
+
+    def interrupt(self):
+        """ Drops the answers being generated or spoken """
+        if self.speech:
+            self.speech.cancel()
+        self.answers.cancel()
 
     def choose_codec(self, sdp):
         """ Returns the preferred codec from a list """
@@ -150,23 +357,41 @@ class AzureAI(AIEngine):
 
     async def start(self):
         """ Starts the Azure AI engine """
+        # a pre-rendered welcome message starts playing with the first packet
+        intro_played = self.intro and play_prompt(
+            self.queue, "azure", self.voice, self.codec.name, self.intro)
+
+        # open the connections now rather than on the first recognition
+        # and the first answer
+        self.connections = [
+            speechsdk.Connection.from_recognizer(self.speech_recognizer),
+            speechsdk.Connection.from_speech_synthesizer(
+                self.synthesizers[0])]
+        for connection in self.connections:
+            connection.open(True)
+
         self.speech_recognizer.start_continuous_recognition_async()
 
-        if self.intro:
+        if self.intro and not intro_played:
             asyncio.create_task(self.process_speech(self.intro))
 
         try:
             while True:
                 phrase = await self.events.get()
-                await self.handle_phrase(phrase)
+                self.interrupt()
+                self.answers.start(self.handle_phrase(phrase))
         except asyncio.CancelledError:
             pass
 
     async def send(self, audio):
         """ Sends audio to the Azure AI engine """
-        self.input_stream.write(audio)
+        self.writer.write(audio)
 
     async def close(self):
         """ Closes the Azure AI engine """
+        self.interrupt()
         self.speech_recognizer.stop_continuous_recognition()
-        self.input_stream.close()
+        self.writer.close()
+        for connection in self.connections:
+            connection.close()
+        self.llm.delete_call(self.b2b_key)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Interrupts the playback when the caller starts speaking """
+
+import time
+import logging
+import numpy as np
+from config import Config
+
+
+def _ulaw_decode_table():
+    """ Returns the linear value of every mu-law byte """
+    ulaw = ~np.arange(256) & 0xFF
+    exponent = (ulaw >> 4) & 0x07
+    magnitude = (((ulaw & 0x0F) << 3) + 0x84) << exponent
+    return np.where(ulaw & 0x80, 0x84 - magnitude,
+                    magnitude - 0x84).astype(np.float32)
+
+
+def _alaw_decode_table():
+    """ Returns the linear value of every A-law byte """
+    alaw = np.arange(256) ^ 0x55
+    exponent = (alaw >> 4) & 0x07
+    mantissa = (alaw & 0x0F) << 4
+    magnitude = np.where(exponent == 0, mantissa + 8,
+                         (mantissa + 0x108) << np.maximum(exponent - 1, 0))
+    return np.where(alaw & 0x80, magnitude, -magnitude).astype(np.float32)
+
+
+DECODE_TABLES = {
+    "mulaw": _ulaw_decode_table(),
+    "alaw": _alaw_decode_table(),
+}
+
+
+class BargeIn:  # pylint: disable=too-many-instance-attributes
+    """ Watches the inbound audio of a call with an energy based VAD while
+    audio is being played back. When the caller speaks for long enough, the
+    playback queue is flushed and the AI engine is asked to drop the answer
+    it is generating or synthesizing. """
+
+    # keeps watching for a while after the last played packet, to catch
+    # the gaps between the synthesized sentences
+    HOLD_TIME = 0.3
+
+    def __init__(self, call, table, threshold=-35.0, margin=12.0,
+                 min_speech_ms=200):
+        self.call = call
+        self.table = table
+        self.threshold = threshold
+        self.margin = margin
+        self.min_speech_ms = min_speech_ms
+        self.noise_floor = -60.0
+        self.speech_ms = 0
+        self.onset = None
+        self.triggered = 0.0
+        self.count = 0
+
+    @classmethod
+    def create(cls, call, flavor, ai, cfg):
+        """ Returns the barge-in controller of a call, or None if disabled """
+        section = Config.get(flavor, cfg)
+        if not section.getboolean("barge_in", f"{flavor.upper()}_BARGE_IN",
+                                  ai.barge_in):
+            return None
+        table = DECODE_TABLES.get(ai.get_codec().name)
+        if table is None:
+            logging.info("barge-in is not supported with %s codec",
+                         ai.get_codec().name)
+            return None
+        return cls(call, table,
+                   float(section.get("barge_in_threshold",
+                                     f"{flavor.upper()}_BARGE_IN_THRESHOLD",
+                                     -35)),
+                   min_speech_ms=int(section.get(
+                       "barge_in_min_speech_ms",
+                       f"{flavor.upper()}_BARGE_IN_MIN_SPEECH_MS", 200)))
+
+    def _is_playing(self, now):
+        """ checks whether the bot is speaking """
+        if self.call.last_playout <= self.triggered:
+            return False
+        return (not self.call.rtp.empty() or
+                now - self.call.last_playout < self.HOLD_TIME)
+
+    def _level(self, payload):
+        """ returns the level of a G.711 payload, in dBFS """
+        samples = self.table[np.frombuffer(payload, dtype=np.uint8)]
+        power = float(np.dot(samples, samples)) / len(samples)
+        return 10 * np.log10(power / (32768.0 ** 2) + 1e-10)
+
+    def process(self, payload):
+        """ Processes an inbound payload; returns True on barge-in """
+        if not payload:
+            return False
+        now = time.monotonic()
+        level = self._level(payload)
+        if level < max(self.threshold, self.noise_floor + self.margin):
+            # slowly follow the background noise
+            self.noise_floor += 0.05 * (level - self.noise_floor)
+            self.speech_ms = 0
+            self.onset = None
+            return False
+        if not self._is_playing(now):
+            return False
+        if self.onset is None:
+            self.onset = now
+        # 8 bytes per ms for G.711
+        self.speech_ms += len(payload) // 8
+        if self.speech_ms < self.min_speech_ms:
+            return False
+        self._trigger(now)
+        return True
+
+    def _trigger(self, now):
+        """ stops the playback and the answer being prepared """
+        with self.call.rtp.mutex:
+            dropped = len(self.call.rtp.queue)
+            self.call.rtp.queue.clear()
+        self.call.ai.interrupt()
+        self.triggered = now
+        self.count += 1
+        logging.info("Barge-in #%d after %d ms of speech: dropped %d "
+                     "packets, reaction time %.0f ms", self.count,
+                     self.speech_ms, dropped,
+                     (time.monotonic() - self.onset) * 1000)
+        self.speech_ms = 0
+        self.onset = None
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
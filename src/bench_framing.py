@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Compares framing audio deltas inline and in a worker thread """
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from queue import Queue
+from codec import get_default_codec
+
+
+async def frame_deltas(codec, deltas, offload):
+    """ Frames the deltas into a playout queue, returning the latency of
+    each delta in microseconds """
+    queue = Queue()
+    assembler = codec.assembler()
+    latencies = []
+    for delta in deltas:
+        start = time.perf_counter()
+        if offload:
+            packets = await asyncio.to_thread(assembler.feed, delta)
+        else:
+            packets = assembler.feed(delta)
+        for packet in packets:
+            queue.put_nowait(packet)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def percentile(values, pct):
+    """ Returns a percentile of a list of values """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def bench(codec, size, count):
+    """ Runs and reports both variants for a delta size """
+    deltas = [os.urandom(size) for _ in range(count)]
+    for offload in (False, True):
+        cpu = time.process_time()
+        latencies = await frame_deltas(codec, deltas, offload)
+        cpu = (time.process_time() - cpu) * 1e6 / count
+        print(f"{size:>6} B {'thread' if offload else 'inline':>7}: "
+              f"p50 {percentile(latencies, 50):8.1f} us, "
+              f"p99 {percentile(latencies, 99):8.1f} us, "
+              f"cpu {cpu:8.1f} us/delta")
+
+
+def main():
+    """ Parses the arguments and runs the benchmark """
+    parser = argparse.ArgumentParser(description=__doc__, prog=sys.argv[0])
+    parser.add_argument('-c', '--codec', default='pcmu',
+                        choices=['pcmu', 'pcma'])
+    parser.add_argument('-n', '--count', type=int, default=2000,
+                        help='number of deltas per size')
+    parser.add_argument('sizes', type=int, nargs='*',
+                        default=[480, 800, 2400, 4800, 16384, 65536],
+                        help='delta sizes, in bytes')
+    args = parser.parse_args()
+    codec = get_default_codec(args.codec)
+    for size in args.sizes:
+        asyncio.run(bench(codec, size, args.count))
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -20,6 +20,7 @@
 
 """ Handles the a SIP call """
 
+import time
 import random
 import socket
 import asyncio
@@ -30,6 +31,7 @@ from queue import Queue, Empty
 from aiortc.sdp import SessionDescription
 from config import Config
 
+from barge_in import BargeIn
 from rtp import decode_rtp_packet, generate_rtp_packet
 from utils import get_ai
 
@@ -73,6 +75,8 @@ class Call():  # pylint: disable=too-many-instance-attributes
         self.terminated = False
 
         self.rtp = Queue()
+        # when the last queued packet was played back
+        self.last_playout = 0.0
         self.stop_event = asyncio.Event()
         self.stop_event.clear()
 
@@ -81,6 +85,7 @@ class Call():  # pylint: disable=too-many-instance-attributes
         self.ai = get_ai(flavor, self, cfg)
 
         self.codec = self.ai.get_codec()
+        self.barge_in = BargeIn.create(self, flavor, self.ai, cfg)
 
         self.serversock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.bind(host_ip)
@@ -166,6 +171,8 @@ class Call():  # pylint: disable=too-many-instance-attributes
         try:
             packet = decode_rtp_packet(data.hex())
             audio = bytes.fromhex(packet['payload'])
+            if self.barge_in:
+                self.barge_in.process(audio)
             asyncio.create_task(self.ai.send(audio))
         except ValueError:
             pass
@@ -186,6 +193,7 @@ class Call():  # pylint: disable=too-many-instance-attributes
         while not self.stop_event.is_set():
             try:
                 payload = self.rtp.get_nowait()
+                self.last_playout = time.monotonic()
             except Empty:
                 if self.terminated:
                     self.terminate()
@@ -21,44 +21,215 @@
 
 """ Communicates with ChatGPT AI """
 
+import time
+import asyncio
 import logging
-from openai import AsyncOpenAI  # pylint: disable=import-error
+import httpx  # pylint: disable=import-error
+from openai import AsyncOpenAI, BadRequestError  # pylint: disable=import-error
+from config import Config
+from conversation import ConversationContext, DEFAULT_CONTEXT_TOKENS
 
 
 class ChatGPT:
     """ Class that implements ChatGPT communication """
 
-    def __init__(self, api_key, model):
+    # clients, by (api_key, model, base_url)
+    _clients = {}
+    # OpenAI clients, each with its own connection pool, by (api_key,
+    # base_url): the clients of the different models of an endpoint share it
+    _pools = {}
+    _warmups = set()
+
+    # the contexts of all the calls, whatever client they are using
+    contexts = {}
+
+    def __init__(self, api_key, model, base_url=None):
         self.api_key = api_key
         self.model = model
-        self.api = AsyncOpenAI(api_key=api_key)
-        self.contexts = {}
+        self.base_url = base_url
+        # base_url allows any OpenAI compatible server to be used
+        self.api = self._pool(api_key, base_url)
+        # some OpenAI compatible servers reject the stream_options
+        self.include_usage = True
+
+    @classmethod
+    def get(cls, api_key, model, base_url=None):
+        """ Returns the client of a key, model and endpoint, shared by all
+        the calls using them """
+        key = (api_key, model, base_url or None)
+        client = cls._clients.get(key)
+        if client is None:
+            client = cls(api_key, model, base_url or None)
+            cls._clients[key] = client
+        return client
+
+    @classmethod
+    def _pool(cls, api_key, base_url):
+        """ Returns the OpenAI client, and the connections, of a key and
+        endpoint, opening them the first time """
+        api = cls._pools.get((api_key, base_url))
+        if api is not None:
+            return api
+        cfg = Config.get("llm")
+        limits = httpx.Limits(
+            max_connections=int(cfg.get("max_connections",
+                                        "LLM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(cfg.get("max_keepalive",
+                                                  "LLM_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(cfg.get("keepalive_expiry",
+                                           "LLM_KEEPALIVE_EXPIRY", 30)))
+        timeout = float(cfg.get("timeout", "LLM_TIMEOUT", 30))
+        api = AsyncOpenAI(api_key=api_key, base_url=base_url,
+                          http_client=httpx.AsyncClient(
+                              limits=limits,
+                              timeout=httpx.Timeout(timeout, connect=5.0)))
+        cls._pools[(api_key, base_url)] = api
+        if cfg.getboolean("warmup", "LLM_WARMUP", True):
+            cls._warm_up(api)
+        return api
 
-    def create_call(self, b2b_key, hint=None):
-        """ Creates a ChatGPT context """
-        self.contexts[b2b_key] = []
+    @classmethod
+    def _warm_up(cls, api):
+        """ Opens a connection to the endpoint in the background, so that
+        the first answer does not wait for the TCP and TLS handshakes """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        async def warm_up():
+            start = time.monotonic()
+            try:
+                await api.models.list()
+                logging.info("LLM connection to %s opened in %.0f ms",
+                             api.base_url, (time.monotonic() - start) * 1000)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning("LLM warm-up of %s failed: %s",
+                                api.base_url, e)
+
+        task = loop.create_task(warm_up())
+        cls._warmups.add(task)
+        task.add_done_callback(cls._warmups.discard)
+
+    def create_call(self, b2b_key, hint=None,
+                    max_tokens=DEFAULT_CONTEXT_TOKENS):
+        """ Creates a ChatGPT context, kept within max_tokens """
         if not hint:
             hint = "Please answer with simple text messages."
-        self.contexts[b2b_key].append({"role": "system",
-                                       "content": hint})
+        self.contexts[b2b_key] = ConversationContext(hint, max_tokens)
 
     def delete_call(self, b2b_key):
         """ Deletes a ChatGPT context """
-        self.contexts.pop(b2b_key)
+        self.contexts.pop(b2b_key, None)
 
     async def handle(self, b2b_key, message):
         """ Sends a ChatGPT message """
-        self.contexts[b2b_key].append({"role": "user", "content": message})
-
+        context = self.contexts[b2b_key]
+        start = time.monotonic()
         response = await self.api.chat.completions.create(
             model=self.model,
-            messages=self.contexts[b2b_key]
+            messages=context.request(message)
         )
 
-        role = response.choices[0].message.role
         content = response.choices[0].message.content
-        self.contexts[b2b_key].append({"role": role, "content": content})
+        self.add_exchange(b2b_key, message, content)
         logging.info("Assistant: %s", content)
+        self._log_turn(context, response.usage, start, time.monotonic())
         return content
 
+    def add_exchange(self, b2b_key, message, answer):
+        """ Adds a message and its (possibly partial) answer to a context """
+        context = self.contexts.get(b2b_key)
+        if context is None:
+            return
+        context.add("user", message)
+        if answer:
+            context.add("assistant", answer)
+
+    @staticmethod
+    def _log_turn(context, usage, start, first, tokens=0, end=None):
+        """ Records and logs the prompt size and the latency of a turn """
+        prompt = cached = None
+        if usage:
+            prompt = usage.prompt_tokens
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) or 0
+            tokens = usage.completion_tokens or tokens
+        end = end or first
+        context.last_turn = {
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "context_tokens": context.total,
+            "first_token_ms": (first - start) * 1000,
+            "completion_tokens": tokens,
+            "duration": end - first,
+        }
+        logging.info("ChatGPT turn: prompt %s tokens (%s cached, ~%d in "
+                     "context, %d messages), first token %.0f ms, %d tokens "
+                     "in %.2f s (%.1f tokens/s)",
+                     prompt if prompt is not None else "?",
+                     cached if cached is not None else "?",
+                     context.total, len(context.messages),
+                     (first - start) * 1000, tokens, end - first,
+                     tokens / (end - first) if end > first else 0.0)
+
+    async def _create_stream(self, messages):
+        """ Starts a streamed completion, asking for its usage report
+        unless the server does not support it """
+        if self.include_usage:
+            try:
+                return await self.api.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+            except BadRequestError as e:
+                error = e
+        response = await self.api.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True
+        )
+        if self.include_usage:
+            logging.info("%s rejected the usage reports, not asking for "
+                         "them anymore: %s", self.base_url or "OpenAI", error)
+            self.include_usage = False
+        return response
+
+    async def stream(self, b2b_key, message, commit=True):
+        """ Sends a ChatGPT message and yields the answer as it is generated.
+        Unless `commit` is False, the exchange is added to the context when
+        the answer ends, or when the stream is interrupted, with the part
+        generated so far. """
+        context = self.contexts[b2b_key]
+        start = time.monotonic()
+        first = None
+        usage = None
+        content = []
+        response = None
+        try:
+            response = await self._create_stream(context.request(message))
+            async for chunk in response:
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if first is None:
+                    first = time.monotonic()
+                content.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        finally:
+            if response is not None:
+                await response.close()
+            answer = "".join(content)
+            if commit:
+                self.add_exchange(b2b_key, message, answer)
+            if answer:
+                logging.info("Assistant: %s", answer)
+            if first is not None:
+                # without usage reports, each delta is roughly one token
+                self._log_turn(context, usage, start, first, len(content),
+                               time.monotonic())
+
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -21,15 +21,76 @@
 
 """ Module that implements a generic codec """
 
+import asyncio
 from abc import ABC, abstractmethod
 from aiortc import RTCRtpCodecParameters
-from opus import OggOpus
+from opus import OggOpusDemuxer
+
+
+# audio chunks larger than this (in bytes) are framed off the event loop;
+# smaller ones are cheaper to frame inline than to hand over to a thread
+PARSE_OFFLOAD_SIZE = 16384
 
 
 class UnsupportedCodec(Exception):
     """ Raised when there is a codec mismatch """
 
 
+class FrameAssembler:
+    """ Cuts a stream of audio chunks of any size into frames of a fixed
+    size, keeping the incomplete tail between chunks.
+
+    Frames are returned as memoryview slices of the chunks they come from,
+    so the chunks must not be modified afterwards; only a frame straddling
+    two chunks is copied, through a buffer that is reused. """
+
+    def __init__(self, frame_size, silence):
+        self.frame_size = frame_size
+        self.silence = silence
+        self._tail = bytearray()
+
+    def feed(self, data):
+        """ Returns the complete frames available after a chunk """
+        view = memoryview(data).cast('B')
+        frames = []
+        start = 0
+        if self._tail:
+            start = min(self.frame_size - len(self._tail), len(view))
+            self._tail += view[:start]
+            if len(self._tail) < self.frame_size:
+                return frames
+            frames.append(bytes(self._tail))
+            self._tail.clear()
+        end = start + (len(view) - start) // self.frame_size * self.frame_size
+        frames.extend(view[i:i + self.frame_size]
+                      for i in range(start, end, self.frame_size))
+        self._tail += view[end:]
+        return frames
+
+    def flush(self):
+        """ Returns the incomplete tail padded with silence, or None """
+        if not self._tail:
+            return None
+        frame = bytes(self._tail).ljust(self.frame_size, self.silence)
+        self._tail.clear()
+        return frame
+
+    def reset(self):
+        """ Drops the incomplete tail """
+        self._tail.clear()
+
+
+async def queue_frames(assembler, data, queue):
+    """ Frames an audio chunk with an assembler into the playback queue;
+    the chunks larger than PARSE_OFFLOAD_SIZE are framed in a thread """
+    if len(data) > PARSE_OFFLOAD_SIZE:
+        packets = await asyncio.to_thread(assembler.feed, data)
+    else:
+        packets = assembler.feed(data)
+    for packet in packets:
+        queue.put_nowait(packet)
+
+
 class GenericCodec(ABC):
     """ Generic Abstract class for a codec """
 
@@ -40,17 +101,23 @@ class GenericCodec(ABC):
         self.sample_rate = params.clockRate
         self.ts_increment = int(self.sample_rate // (1000 / ptime))
 
-    @abstractmethod
     async def process_response(self, response, queue):
         """ Processes the response from speech engine """
+        assembler = self.assembler()
+        async for data in response.aiter_bytes():
+            for packet in assembler.feed(data):
+                queue.put_nowait(packet)
+        packet = assembler.flush()
+        if packet:
+            queue.put_nowait(packet)
 
     @abstractmethod
-    def get_silence(self):
-        """ Returns a silence packet """
+    def assembler(self):
+        """ Returns a new packetizer of an audio stream of this codec """
 
     @abstractmethod
-    def parse(self, data, leftovers):
-        """ Parses codec packets """
+    def get_silence(self):
+        """ Returns a silence packet """
 
 
 class Opus(GenericCodec):
@@ -64,13 +131,8 @@ class Opus(GenericCodec):
         self.bitrate = 96000
         self.container = 'ogg'
 
-    async def process_response(self, response, queue):
-        async for data in response.aiter_bytes():
-            for packet in self.parse(data, None):
-                queue.put_nowait(packet)
-
-    def parse(self, data, leftovers):
-        return OggOpus(data).packets()
+    def assembler(self):
+        return OggOpusDemuxer()
 
     def get_silence(self):
         return b'\xf8\xff\xfe'
@@ -87,32 +149,8 @@ class G711(GenericCodec):
         self.container = 'none'
         self.name = "g711"
 
-    async def process_response(self, response, queue):
-        leftovers = b''
-        async for data in response.aiter_bytes():
-            packets, leftovers = self.parse(data, leftovers)
-            for packet in packets:
-                queue.put_nowait(packet)
-        packet = self.parse(None, leftovers)
-
-    def parse(self, data, leftovers):
-        chunk_size = self.get_payload_len()
-
-        if not data:
-            data = leftovers
-            data += self.get_silence_byte() * (chunk_size - len(data))
-            return data
-
-        data = leftovers + data
-
-        chunks = [data[i:i + chunk_size]
-                  for i in range(0, len(data), chunk_size)]
-        if len(chunks[-1]) < chunk_size:
-            leftovers = chunks.pop()
-        else:
-            leftovers = b''
-
-        return chunks, leftovers
+    def assembler(self):
+        return FrameAssembler(self.get_payload_len(), self.get_silence_byte())
 
     def get_silence(self):
         return self.get_silence_byte() * self.get_payload_len()
@@ -171,4 +209,17 @@ CODECS = {
     "pcmu": PCMU,
 }
 
+DEFAULT_CODEC_PARAMS = {
+    "opus": {"mimeType": "audio/opus", "clockRate": 48000, "channels": 2,
+             "payloadType": 111},
+    "pcma": {"mimeType": "audio/PCMA", "clockRate": 8000, "payloadType": 8},
+    "pcmu": {"mimeType": "audio/PCMU", "clockRate": 8000, "payloadType": 0},
+}
+
+
+def get_default_codec(name):
+    """ Returns a codec with its default parameters, to render audio
+    outside of a call """
+    return CODECS[name](RTCRtpCodecParameters(**DEFAULT_CODEC_PARAMS[name]))
+
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -78,12 +78,21 @@ class ConfigSection(dict):
 class Config():
     """ class that handles the config """
 
+    file = None
+
     @staticmethod
     def init(config_file):
         """ Initializes the config with a configuration file """
         config_file = config_file or os.getenv('CONFIG_FILE')
         if config_file:
             _Config.read(config_file)
+        Config.file = config_file
+
+    @staticmethod
+    def reload():
+        """ Re-reads the configuration file """
+        if Config.file:
+            _Config.read(Config.file)
 
     @staticmethod
     def get(section, init_data=None):
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Keeps the conversation of a call within a token budget """
+
+DEFAULT_CONTEXT_TOKENS = 3000
+
+# tokens added by the chat format to each message
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text):
+    """ Returns a rough count of the tokens of a message: about 4
+    characters per token for the usual languages """
+    return len(text) // 4 + 1 + MESSAGE_OVERHEAD
+
+
+class ConversationContext:
+    """ The messages of a call: the system prompt, then the turns.
+
+    When the turns grow over `max_tokens`, the oldest exchanges are dropped
+    until the context is back to `low_water` of the budget. The messages
+    sent to the model are thus only appended to between two compactions,
+    keeping their prefix identical from one turn to the next, which lets
+    the provider reuse its cached prompt. """
+
+    OMITTED_NOTE = "The earlier part of the conversation was omitted."
+
+    def __init__(self, system, max_tokens=DEFAULT_CONTEXT_TOKENS,
+                 low_water=0.6):
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.messages = []
+        self._tokens = []
+        self.total = 0
+        # index of the first message that can be dropped
+        self._head = 1
+        self.compactions = 0
+        self.dropped = 0
+        self.last_turn = {}
+        self._append("system", system)
+
+    def _append(self, role, content):
+        tokens = estimate_tokens(content)
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self.total += tokens
+
+    def add(self, role, content):
+        """ Adds a message, compacting the context if over budget """
+        self._append(role, content)
+        if self.max_tokens and self.total > self.max_tokens:
+            self._compact()
+
+    def request(self, message):
+        """ Returns the messages to send for a new user message """
+        return self.messages + [{"role": "user", "content": message}]
+
+    def _compact(self):
+        """ Drops the oldest exchanges, always keeping the last one """
+        if self._head == 1:
+            # tell the model that it misses a part of the conversation
+            self.messages.insert(1, {"role": "system",
+                                     "content": self.OMITTED_NOTE})
+            self._tokens.insert(1, estimate_tokens(self.OMITTED_NOTE))
+            self.total += self._tokens[1]
+            self._head = 2
+        target = self.max_tokens * self.low_water
+        last_user = max((i for i, m in enumerate(self.messages)
+                         if m["role"] == "user"), default=self._head)
+        end = self._head
+        total = self.total
+        while end < last_user and total > target:
+            total -= self._tokens[end]
+            end += 1
+            # drop whole exchanges: stop on a user message only
+            while end < last_user and self.messages[end]["role"] != "user":
+                total -= self._tokens[end]
+                end += 1
+        if end == self._head:
+            return
+        self.dropped += end - self._head
+        del self.messages[self._head:end]
+        del self._tokens[self._head:end]
+        self.total = total
+        self.compactions += 1
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -23,8 +23,10 @@
 Module that implements Deepgram communcation
 """
 
+import time
 import logging
 import asyncio
+import httpx  # pylint: disable=import-error
 
 from deepgram import (  # pylint: disable=import-error
     LiveOptions,
@@ -35,15 +37,25 @@ from deepgram import (  # pylint: disable=import-error
 
 from ai import AIEngine
 from chatgpt_api import ChatGPT
+from conversation import DEFAULT_CONTEXT_TOKENS
 from config import Config
-from codec import get_codecs, CODECS, UnsupportedCodec
+from codec import get_codecs, get_default_codec, CODECS, UnsupportedCodec
+from prompts import play_prompt
+from speech_pipeline import SpeechPipeline, AnswerTasks, speak_answer
+from text_chunker import split_text
+from tts_cache import cached
+
+
+SPEAK_URL = "https://api.deepgram.com/v1/speak"
 
 
 class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
 
     """ Implements Deeepgram communication """
 
-    chatgpt = None
+    barge_in = True
+    # connections to the TTS API, shared by all the calls
+    _http = None
 
     def __init__(self, call, cfg):
 
@@ -52,11 +64,13 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
                                    ["CHATGPT_API_KEY", "OPENAI_API_KEY"])
         chatgpt_model = self.cfg.get("chatgpt_model", "CHATGPT_API_MODEL",
                                      "gpt-4o")
+        context_tokens = int(self.cfg.get("llm_context_tokens",
+                                          "DEEPGRAM_LLM_CONTEXT_TOKENS",
+                                          DEFAULT_CONTEXT_TOKENS))
 
-        if not Deepgram.chatgpt:
-            Deepgram.chatgpt = ChatGPT(chatgpt_key, chatgpt_model)
-        self.deepgram = DeepgramClient(self.cfg.get("key",
-                                                    "DEEPGRAM_API_KEY"))
+        self.chatgpt = ChatGPT.get(chatgpt_key, chatgpt_model)
+        self.key = self.cfg.get("key", "DEEPGRAM_API_KEY")
+        self.deepgram = DeepgramClient(self.key)
         self.language = self.cfg.get("language", "DEEPGRAM_LANGUAGE", "en-US")
         self.model = self.cfg.get("speech_model", "DEEPGRAM_SPEECH_MODEL",
                                   "nova-2-conversationalai")
@@ -67,14 +81,18 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
         self.codec = self.choose_codec(call.sdp)
         self.queue = call.rtp
         self.stt = self.deepgram.listen.asyncwebsocket.v("1")
-        self.tts = self.deepgram.speak.asyncrest.v("1")
+        # time to the first byte of each synthesized chunk
+        self.ttfb = []
         # used to serialize the speech events
         self.speech_lock = asyncio.Lock()
+        self.speech = None
+        self.answers = AnswerTasks()
 
         self.buf = []
         sentences = self.buf
         call_ref = self
-        Deepgram.chatgpt.create_call(self.b2b_key, self.intro)
+        self.chatgpt.create_call(self.b2b_key, self.intro,
+                                 context_tokens)
 
         async def on_text(__, result, **_):
             sentence = result.channel.alternatives[0].transcript
@@ -87,7 +105,8 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
                 return
             phrase = " ".join(sentences)
             logging.info("Speaker: %s", phrase)
-            asyncio.create_task(call_ref.handle_phrase(phrase))
+            call_ref.interrupt()
+            call_ref.answers.start(call_ref.handle_phrase(phrase))
             sentences.clear()
 
         self.stt.on(LiveTranscriptionEvents.Transcript, on_text)
@@ -100,19 +119,75 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
             utterance_end_ms="1000",
             encoding=self.codec.name,
             sample_rate=self.codec.sample_rate)
+        self.speak_options = self.get_speak_options(self.codec, self.voice)
+
+    @staticmethod
+    def get_speak_options(codec, voice):
+        """ Returns the TTS options for a codec """
         # don't use sample_rate if we have a bitrate
-        if self.codec.bitrate:
-            self.speak_options = SpeakOptions(
-                model=self.voice,
-                encoding=self.codec.name,
-                bit_rate=self.codec.bitrate,
-                container=self.codec.container)
-        else:
-            self.speak_options = SpeakOptions(
-                model="aura-asteria-en",
-                encoding=self.codec.name,
-                sample_rate=self.codec.sample_rate,
-                container=self.codec.container)
+        if codec.bitrate:
+            return SpeakOptions(
+                model=voice,
+                encoding=codec.name,
+                bit_rate=codec.bitrate,
+                container=codec.container)
+        return SpeakOptions(
+            model="aura-asteria-en",
+            encoding=codec.name,
+            sample_rate=codec.sample_rate,
+            container=codec.container)
+
+    @classmethod
+    def http(cls):
+        """ Returns the HTTP client of the TTS API, opening it the first
+        time, so that the chunks reuse the same connections """
+        if cls._http is None:
+            cls._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=20,
+                                    keepalive_expiry=60),
+                timeout=httpx.Timeout(30.0, connect=5.0))
+        return cls._http
+
+    @classmethod
+    async def speak(cls, key, options, codec, text, sink):
+        """ Streams the synthesized text into the sink as it is received;
+        returns the time to its first byte, in seconds """
+        params = {k: v for k, v in vars(options).items() if v is not None}
+        start = time.monotonic()
+        async with cls.http().stream("POST", SPEAK_URL, params=params,
+                                     json={"text": text},
+                                     headers={"Authorization":
+                                              f"Token {key}"}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise RuntimeError(f"Deepgram TTS error "
+                                   f"{response.status_code}: "
+                                   f"{response.text}")
+            timed = _TimedResponse(response)
+            await codec.process_response(timed, sink)
+        return (timed.first or time.monotonic()) - start
+
+    @classmethod
+    def get_prompts(cls):
+        """ Returns the welcome message rendered for each codec """
+        cfg = Config.get("deepgram")
+        intro = cfg.get("welcome_message", "DEEPGRAM_WELCOME_MSG")
+        if not intro:
+            return []
+        key = cfg.get("key", "DEEPGRAM_API_KEY")
+        voice = cfg.get("voice", "DEEPGRAM_VOICE", "aura-asteria-en")
+        prompts = []
+        for name in ["opus", "pcma", "pcmu"]:
+            codec = get_default_codec(name)
+            options = cls.get_speak_options(codec, voice)
+
+            async def synthesize(text, sink, codec=codec, options=options):
+                await cls.speak(key, options, codec, text, sink)
+                return True
+
+            prompts.append(("deepgram", options.model, codec.name, intro,
+                            synthesize))
+        return prompts
 
     def choose_codec(self, sdp):
         """ Returns the preferred codec from a list """
@@ -134,13 +209,30 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
         """ Sends audio to Deepgram """
         await self.stt.send(audio)
 
-    async def process_speech(self, phrase):
-        """ Processes the speech received """
-        response = await self.tts.stream_raw({"text": phrase},
-                                             self.speak_options)
+    async def synthesize(self, text, sink):
+        """ Synthesizes a chunk of text into the sink """
+        ttfb = await self.speak(self.key, self.speak_options, self.codec,
+                                text, sink)
+        self.ttfb.append(ttfb)
+        logging.debug("TTS first byte after %.0f ms: %s", ttfb * 1000, text)
+        return True
+
+    def start_speech(self):
+        """ Drops the current playback and starts a new speech pipeline """
         self.drain_queue()
+        synthesize = cached(self.synthesize, "deepgram",
+                            self.speak_options.model, self.codec.name)
+        self.speech = SpeechPipeline(synthesize, self.queue)
+        return self.speech
+
+    async def process_speech(self, phrase):
+        """ Processes the speech received, sentence by sentence """
         async with self.speech_lock:
-            await self.codec.process_response(response, self.queue)
+            speech = self.start_speech()
+            for chunk in split_text(phrase, self.language):
+                speech.push(chunk)
+            speech.finish()
+            await speech.wait()
 
     def drain_queue(self):
         """ Drains the playback queue """
@@ -150,20 +242,55 @@ class Deepgram(AIEngine):  # pylint: disable=too-many-instance-attributes
 
     async def start(self):
         """ Starts a Depgram connection """
+        # a pre-rendered welcome message starts playing with the first packet
+        intro_played = self.intro and play_prompt(
+            self.queue, "deepgram", self.speak_options.model,
+            self.codec.name, self.intro)
+
         if await self.stt.start(self.transcription_options) is False:
             return
 
-        if self.intro:
+        if self.intro and not intro_played:
             asyncio.create_task(self.process_speech(self.intro))
 
     async def handle_phrase(self, phrase):
-        """ handles the response of a phrase """
-        response = await Deepgram.chatgpt.handle(self.b2b_key, phrase)
-        asyncio.create_task(self.process_speech(response))
+        """ speaks the answer of a phrase, each sentence being synthesized
+        as soon as ChatGPT generated it """
+        async with self.speech_lock:
+            await speak_answer(self.start_speech(),
+                               self.chatgpt.stream(self.b2b_key, phrase),
+                               self.language)
+
+    def interrupt(self):
+        """ drops the answers being generated or spoken """
+        if self.speech:
+            self.speech.cancel()
+        self.answers.cancel()
 
     async def close(self):
         """ closes the Deepgram session """
-        Deepgram.chatgpt.delete_call(self.b2b_key)
+        self.interrupt()
+        self.chatgpt.delete_call(self.b2b_key)
+        if self.ttfb:
+            ttfb = sorted(self.ttfb)
+            logging.info("TTS: %d chunks, first byte after %.0f ms median, "
+                         "%.0f ms max", len(ttfb),
+                         ttfb[len(ttfb) // 2] * 1000, ttfb[-1] * 1000)
         await self.stt.finish()
 
+
+class _TimedResponse:  # pylint: disable=too-few-public-methods
+    """ Records when the first bytes of a streamed response arrive """
+
+    def __init__(self, response):
+        self.response = response
+        self.first = None
+
+    async def aiter_bytes(self):
+        """ Yields the body of the response as it is received """
+        async for data in self.response.aiter_bytes():
+            if self.first is None:
+                self.first = time.monotonic()
+            yield data
+
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
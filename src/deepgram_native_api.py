@@ -23,15 +23,15 @@
 OpenAI WS communication
 """
 
-import json
 import logging
 import asyncio
 from queue import Empty
 from websockets.asyncio.client import connect
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 from ai import AIEngine
-from codec import get_codecs, CODECS, UnsupportedCodec
+from codec import get_codecs, CODECS, UnsupportedCodec, queue_frames
 from config import Config
+from messages import MessageDispatcher, loads, dumps
 
 DEEPGRAM_VOICE_AGENT_URL = "wss://agent.deepgram.com/agent"
 
@@ -46,6 +46,7 @@ class DeepgramNative(AIEngine):  # pylint: disable=too-many-instance-attributes
         self.call = call
         self.ws = None
         self.session = None
+        self.assembler = self.codec.assembler()
         self.intro = None
         self.cfg = Config.get("deepgram_native", cfg)
         self.key = self.cfg.get("key", "DEEPGRAM_API_KEY")
@@ -86,7 +87,7 @@ class DeepgramNative(AIEngine):  # pylint: disable=too-many-instance-attributes
         }
         self.ws = await connect(DEEPGRAM_VOICE_AGENT_URL, additional_headers=deepgram_headers)
         try:
-            resp = json.loads(await self.ws.recv())
+            resp = loads(await self.ws.recv())
             logging.info(f"Connected to Deepgram: {resp}")
         except ConnectionClosedOK:
             logging.info("WS Connection with Deepgram is closed")
@@ -152,9 +153,9 @@ class DeepgramNative(AIEngine):  # pylint: disable=too-many-instance-attributes
         logging.info(f"Sending session: {self.session}")
 
         try:
-            await self.ws.send(json.dumps(self.session))
+            await self.ws.send(dumps(self.session))
             if self.intro:
-                await self.ws.send(json.dumps({"type": "InjectAgentMessage", "message": self.intro}))
+                await self.ws.send(dumps({"type": "InjectAgentMessage", "message": self.intro}))
             await self.handle_command()
         except ConnectionClosedError as e:
             logging.error(f"Error while communicating with Deepgram: {e}. Terminating call.")
@@ -167,34 +168,53 @@ class DeepgramNative(AIEngine):  # pylint: disable=too-many-instance-attributes
         """ Terminates the call """
         self.call.terminated = True
 
-    async def handle_command(self):  # pylint: disable=too-many-branches
-        """ Handles a command from the server """
-        leftovers = b''
-        async for smsg in self.ws:
-            try:
+    async def handle_command(self):
+        """ Handles the commands from the server """
+        self.assembler.reset()
+        dispatcher = MessageDispatcher("Deepgram", {
+            "AgentAudioDone": self.handle_audio_done,
+            "EndOfThought": self.handle_end_of_thought,
+            "ConversationText": self.handle_conversation_text,
+            "Error": self.handle_error,
+        })
+        try:
+            async for smsg in self.ws:
                 if isinstance(smsg, bytes):
-                    packets, leftovers = await self.run_in_thread(
-                        self.codec.parse, smsg, leftovers)
-                    for packet in packets:
-                        self.queue.put_nowait(packet)
+                    await self.queue_audio(smsg)
                 else:
-                    msg = json.loads(smsg)
-                    logging.info(f"Received message: {msg}")
-                    t = msg["type"]
-                    if t == "AgentAudioDone":
-                        if len(leftovers) > 0:
-                            packet = await self.run_in_thread(
-                                self.codec.parse, None, leftovers)
-                            self.queue.put_nowait(packet)
-                            leftovers = b''
-                    elif t == "EndOfThought":
-                        self.drain_queue()
-            except Exception as e:
-                logging.error(f"Unexpected error while processing message: {type(e)}: {e}")
-                raise
+                    await dispatcher.dispatch(smsg)
+        except Exception as e:
+            logging.error(f"Unexpected error while processing message: {type(e)}: {e}")
+            raise
+        finally:
+            dispatcher.log_stats()
+
+    async def queue_audio(self, media):
+        """ Queues the packets of an audio fragment """
+        await queue_frames(self.assembler, media, self.queue)
+
+    async def handle_audio_done(self, _):
+        """ Flushes the last audio packet of an answer """
+        packet = self.assembler.flush()
+        if packet:
+            self.queue.put_nowait(packet)
+
+    async def handle_end_of_thought(self, _):
+        """ Drops the playback when the user starts speaking """
+        self.drain_queue()
+
+    async def handle_conversation_text(self, msg):
+        """ Logs the conversation """
+        logging.info("%s: %s", "Speaker" if msg.get("role") == "user" else "Engine",
+                     msg.get("content"))
+
+    async def handle_error(self, msg):
+        """ Logs an error reported by the server """
+        logging.error("Deepgram error: %s", msg)
 
     def drain_queue(self):
         """ Drains the playback queue """
+        self.assembler.reset()
         count = 0
         try:
             while self.queue.get_nowait():
@@ -203,10 +223,6 @@ class DeepgramNative(AIEngine):  # pylint: disable=too-many-instance-attributes
             if count > 0:
                 logging.info("dropping %d packets", count)
 
-    async def run_in_thread(self, func, *args):
-        """ Runs a function in a thread """
-        return await asyncio.to_thread(func, *args)
-
     async def send(self, audio):
         """ Sends audio to OpenAI """
         if not self.ws or self.call.terminated:
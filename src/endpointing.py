@@ -0,0 +1,104 @@
+import re
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def same_utterance(first, second):
+    """Check whether two transcripts of an utterance have the same words
+
+    Args:
+        first: A transcript
+        second: Another transcript
+
+    Returns:
+        bool: True if they only differ by case, punctuation or spacing
+    """
+    def words(text):
+        return re.sub(r'[^\w\s]', ' ', text.lower()).split()
+    return words(first) == words(second)
+
+
+class Speculation:
+    """An answer started on a partial transcript, before the final one"""
+
+    def __init__(self, text):
+        self.text = text
+        self.final_text = None
+        self.started = time.monotonic()
+        self.confirmed = asyncio.Event()
+        self.awaiting_final = True
+        self.timer = None
+        self.task = None
+
+
+class Endpointer:
+    """Detects the end of the caller's turn before the STT final result
+
+    The turn is considered over once the VAD reports the end of speech and
+    the partial transcript did not change for `stability_ms`.
+    """
+
+    def __init__(self, on_endpoint, stability_ms=300):
+        """
+        Args:
+            on_endpoint: Callback receiving the stable partial transcript
+            stability_ms: Time the partial transcript must stay unchanged
+        """
+        self.on_endpoint = on_endpoint
+        self.stability = stability_ms / 1000
+        self.partial = ""
+        self.changed = time.monotonic()
+        self.speech_ended = False
+        self.fired = False
+        self._timer = None
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm(self):
+        """Schedule the endpoint once the partial transcript is stable"""
+        self._cancel_timer()
+        if not self.speech_ended or not self.partial or self.fired:
+            return
+        delay = max(0.0, self.changed + self.stability - time.monotonic())
+        self._timer = asyncio.get_running_loop().call_later(delay, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        self.fired = True
+        logger.debug("Endpoint on stable partial: %s", self.partial)
+        self.on_endpoint(self.partial)
+
+    def on_speech_start(self):
+        """The VAD detected the start of speech"""
+        self.speech_ended = False
+        self._cancel_timer()
+
+    def on_speech_end(self):
+        """The VAD detected the end of speech"""
+        self.speech_ended = True
+        self._arm()
+
+    def on_partial(self, text):
+        """A partial transcript was received"""
+        if text == self.partial:
+            return
+        self.partial = text
+        self.changed = time.monotonic()
+        self.fired = False
+        self._arm()
+
+    def on_final(self):
+        """The final transcript of the utterance was received"""
+        self._cancel_timer()
+        self.partial = ""
+        self.fired = False
+
+    def close(self):
+        """Stop the pending endpoint"""
+        self._cancel_timer()
@@ -34,6 +34,7 @@ from aiortc.sdp import SessionDescription
 from call import Call
 from config import Config
 from codec import UnsupportedCodec
+from log_context import bind_call
 from utils import UnknownSIPUser
 import utils as utils
 
@@ -46,6 +47,23 @@ mi_conn = OpenSIPSMI(conn="datagram", datagram_ip=mi_ip, datagram_port=mi_port)
 
 calls = {}
 
+# background tasks of the engine, referenced until they are done
+tasks = set()
+
+
+def _task_done(task):
+    tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error("Background task failed", exc_info=task.exception())
+
+
+def start_task(coro):
+    """ Runs a coroutine in a background task """
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
 
 def mi_reply(key, method, code, reason, body=None):
     """ Replies to the server """
@@ -135,7 +153,9 @@ def handle_call(call, key, method, params):
 
         try:
             flavor, to, cfg = parse_params(params)
-            new_call = Call(key, mi_conn, sdp, flavor, to, cfg)
+            # the tasks and readers of the call inherit its log context
+            with bind_call(key):
+                new_call = Call(key, mi_conn, sdp, flavor, to, cfg)
             calls[key] = new_call
             mi_reply(key, method, 200, 'OK', new_call.get_body())
         except UnsupportedCodec:
@@ -157,7 +177,8 @@ def handle_call(call, key, method, params):
             call.terminated = True
     
     elif method == 'BYE':
-        asyncio.create_task(call.close())
+        with bind_call(key):
+            start_task(call.close())
         calls.pop(key, None)
     
     if not call:
@@ -197,10 +218,11 @@ def udp_handler(data):
 async def shutdown(s, loop, event):
     """ Called when the program is shutting down """
     logging.info("Received exit signal %s...", s)
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-    for task in tasks:
+    pending = [t for t in asyncio.all_tasks()
+               if t is not asyncio.current_task()]
+    for task in pending:
         task.cancel()
-    logging.info("Cancelling %d outstanding tasks", len(tasks))
+    logging.info("Cancelling %d outstanding tasks", len(pending))
     for call in calls.values():
         if call.terminated:
             continue
@@ -211,11 +233,18 @@ async def shutdown(s, loop, event):
         logging.error("Error unsubscribing from event: %s", e)
     except OpenSIPSMIException as e:
         logging.error("Error unsubscribing from event: %s", e)
-    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.gather(*pending, return_exceptions=True)
     loop.stop()
     logging.info("Shutdown complete.")
 
 
+async def reload_config():
+    """ Called on SIGHUP: re-reads the config and re-renders the prompts """
+    logging.info("Reloading configuration")
+    Config.reload()
+    await utils.render_flavor_prompts()
+
+
 async def async_run():
     """ Main function """
     host_ip = Config.engine("event_ip", "EVENT_IP", "127.0.0.1")
@@ -232,21 +261,24 @@ async def async_run():
 
     logging.info("Starting server at %s:%hu", host_ip, port)
 
+    start_task(utils.prepare_flavors())
+
     loop = asyncio.get_running_loop()
     stop = loop.create_future()
 
     loop.add_signal_handler(
         signal.SIGTERM,
-        lambda: asyncio.create_task(shutdown(signal.SIGTERM,
-                                             loop,
-                                             event)),
+        lambda: start_task(shutdown(signal.SIGTERM, loop, event)),
     )
 
     loop.add_signal_handler(
         signal.SIGINT,
-        lambda: asyncio.create_task(shutdown(signal.SIGINT,
-                                             loop,
-                                             event)),
+        lambda: start_task(shutdown(signal.SIGINT, loop, event)),
+    )
+
+    loop.add_signal_handler(
+        signal.SIGHUP,
+        lambda: start_task(reload_config()),
     )
 
     try:
@@ -257,6 +289,8 @@ async def async_run():
 
 def run():
     """ Runs the entire engine asynchronously """
+    utils.load_enabled_flavors()
+    utils.preload_flavors()
     asyncio.run(async_run())
 
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
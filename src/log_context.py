@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Call context, per-call levels and sampling of the log records """
+
+import sys
+import time
+import queue
+import atexit
+import logging
+import contextlib
+import contextvars
+import logging.handlers
+from config import Config
+
+DEFAULT_FORMAT = ('%(asctime)s - tid: %(thread)d - %(levelname)s - '
+                  '%(call)s%(message)s')
+
+# key of the call being handled; inherited by the tasks and the threads
+# (asyncio.to_thread) started while handling it
+_call = contextvars.ContextVar("call", default=None)
+
+# calls logged with a lower level than the rest of the process
+_call_levels = {}
+
+
+@contextlib.contextmanager
+def bind_call(key):
+    """ Tags the records logged in this block, and in the tasks it starts,
+    with the key of a call """
+    token = _call.set(key)
+    try:
+        yield
+    finally:
+        _call.reset(token)
+
+
+def current_call():
+    """ Returns the key of the call being handled, or None """
+    return _call.get()
+
+
+class CallContextFilter(logging.Filter):
+    """ Adds the call key to the records and applies the per-call and
+    per-component levels """
+
+    def __init__(self, level=logging.INFO, components=None):
+        super().__init__()
+        self.level = level
+        self.components = components or {}
+        self._thresholds = {}
+
+    def configure(self, level, components):
+        """ Changes the global and the per-component levels """
+        self.level = level
+        self.components = components
+        self._thresholds.clear()
+
+    def threshold(self, name):
+        """ Returns the level of a logger: the one of its closest configured
+        component, or the global one """
+        level = self._thresholds.get(name)
+        if level is None:
+            level = self.level
+            parts = name.split(".")
+            while parts:
+                component = ".".join(parts)
+                if component in self.components:
+                    level = self.components[component]
+                    break
+                parts.pop()
+            self._thresholds[name] = level
+        return level
+
+    def filter(self, record):
+        key = _call.get()
+        record.call = f"[{key}] " if key else ""
+        level = _call_levels.get(key) if key else None
+        if level is None:
+            level = self.threshold(record.name)
+        return record.levelno >= level
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """ Queues the records as they are: the message is formatted by the
+    listener thread, so the caller only pays for building the record.
+    Records are dropped, and counted, when the queue is full. """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_filter = CallContextFilter()
+_listener = None
+_queue_handler = None
+
+
+def _parse_level(level):
+    """ Returns the numeric value of a level name or number """
+    if isinstance(level, int) or str(level).isdigit():
+        return int(level)
+    value = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(value, int):
+        raise ValueError(f"unknown log level {level}")
+    return value
+
+
+def _parse_components(spec):
+    """ Parses a "component=LEVEL, ..." specification """
+    components = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, level = item.partition("=")
+        components[name.strip()] = _parse_level(level)
+    return components
+
+
+def _update_root_level():
+    """ Lowers the root logger to the most verbose per-call level, so that
+    the records of those calls are built; the filter drops the others """
+    levels = [_filter.level, *_call_levels.values()]
+    logging.getLogger().setLevel(min(levels))
+
+
+def set_call_level(key, level):
+    """ Logs a call with a different level than the rest of the process """
+    _call_levels[key] = _parse_level(level)
+    _update_root_level()
+
+
+def clear_call_level(key):
+    """ Reverts a call to the global levels """
+    if _call_levels.pop(key, None) is not None:
+        _update_root_level()
+
+
+def setup_logging():
+    """ Configures the logging of the process from the [logging] section """
+    global _listener, _queue_handler  # pylint: disable=global-statement
+    cfg = Config.get("logging")
+    _filter.configure(_parse_level(cfg.get("level", "LOG_LEVEL", "INFO")),
+                      _parse_components(cfg.get("components",
+                                                "LOG_COMPONENTS", "")))
+    for name, level in _filter.components.items():
+        logging.getLogger(name).setLevel(level)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(
+        cfg.get("format", "LOG_FORMAT", DEFAULT_FORMAT)))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    if cfg.getboolean("queue", "LOG_QUEUE", True):
+        _queue_handler = _LazyQueueHandler(
+            queue.Queue(int(cfg.get("queue_size", "LOG_QUEUE_SIZE", 10000))))
+        # filter before queueing: the call is only known by the caller
+        _queue_handler.addFilter(_filter)
+        root.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue,
+                                                   handler)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler.addFilter(_filter)
+        root.addHandler(handler)
+    _update_root_level()
+
+
+def stop_logging():
+    """ Writes the queued records and stops the logging thread """
+    global _listener  # pylint: disable=global-statement
+    if not _listener:
+        return
+    _listener.stop()
+    _listener = None
+    if _queue_handler.dropped:
+        sys.stderr.write(f"{_queue_handler.dropped} log records were "
+                         "dropped because the log queue was full\n")
+
+
+class LogSampler:  # pylint: disable=too-few-public-methods
+    """ Rate limits a frequent (e.g. per packet) log message: lets through
+    one event out of `every`, and at most one each `interval` seconds """
+
+    def __init__(self, every=1, interval=0.0):
+        self.every = max(1, every)
+        self.interval = interval
+        self._count = 0
+        self._last = 0.0
+
+    def sample(self):
+        """ Accounts an event; returns the number of events suppressed since
+        the previous one that was let through, or None to suppress it """
+        self._count += 1
+        if self._count < self.every:
+            return None
+        now = time.monotonic()
+        if self.interval and now - self._last < self.interval:
+            return None
+        skipped = self._count - 1
+        self._count = 0
+        self._last = now
+        return skipped
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -22,7 +22,6 @@
 """ Main module that starts the Deepgram AI integration """
 
 import sys
-import logging
 import argparse
 from config import Config
 from version import __version__
@@ -46,10 +45,8 @@ parser.add_argument('-c', '--config',
 parsed_args = parser.parse_args()
 Config.init(parsed_args.config)
 
-logging.basicConfig(
-    level=logging.INFO,  # Set level to INFO or DEBUG for more verbosity
-    format='%(asctime)s - tid: %(thread)d - %(levelname)s - %(message)s',
-)
+from log_context import setup_logging  # pylint: disable=wrong-import-position
+setup_logging()
 
 if __name__ == '__main__':
     from engine import run
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Decodes and dispatches the JSON messages of the WebSocket backends """
+
+import re
+import json
+import base64
+import logging
+from collections import Counter
+
+try:
+    import orjson  # pylint: disable=import-error
+
+    def loads(data):
+        """ Decodes a JSON message """
+        return orjson.loads(data)
+
+    def dumps(obj):
+        """ Encodes a JSON message as text """
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+    loads = json.loads
+
+    def dumps(obj):
+        """ Encodes a JSON message as text """
+        return json.dumps(obj, separators=(',', ':'))
+
+
+# type of a message, when it is the first member of the object
+_LEADING_TYPE = re.compile(r'\s*\{\s*"type"\s*:\s*"([^"\\]*)"')
+
+
+def peek_type(frame):
+    """ Returns the type of a message without decoding it, or None """
+    match = _LEADING_TYPE.match(frame)
+    return match.group(1) if match else None
+
+
+_MEMBER_PATTERNS = {}
+
+
+def extract_base64(frame, member):
+    """ Decodes a base64 string member straight out of the raw message,
+    without decoding the rest of the message; returns None if it cannot """
+    pattern = _MEMBER_PATTERNS.get(member)
+    if pattern is None:
+        pattern = re.compile(rf'"{re.escape(member)}"\s*:\s*"')
+        _MEMBER_PATTERNS[member] = pattern
+    match = pattern.search(frame)
+    if not match:
+        return None
+    start = match.end()
+    end = frame.find('"', start)
+    if end < 0 or frame.find('\\', start, end) >= 0:
+        return None
+    return base64.b64decode(frame[start:end])
+
+
+class MessageDispatcher:
+    """ Decodes each message once and calls the handler of its type.
+
+    `raw_handlers` receive the undecoded frame of the types they handle,
+    which lets them pick out large payloads without decoding the message;
+    the other `handlers` receive the decoded message. Messages without a
+    handler are counted, not logged. """
+
+    def __init__(self, name, handlers, raw_handlers=None):
+        self.name = name
+        self.handlers = handlers
+        self.raw_handlers = raw_handlers or {}
+        self.unhandled = Counter()
+
+    async def dispatch(self, frame):
+        """ Handles a text frame """
+        raw_handler = self.raw_handlers.get(peek_type(frame))
+        if raw_handler and await raw_handler(frame):
+            return
+        msg = loads(frame)
+        handler = self.handlers.get(msg.get("type"))
+        if handler:
+            await handler(msg)
+        else:
+            self.unhandled[msg.get("type")] += 1
+
+    def log_stats(self):
+        """ Logs the number of messages that were not handled """
+        if self.unhandled:
+            logging.info("%s unhandled messages: %s", self.name,
+                         ", ".join(f"{t}={c}" for t, c in
+                                   self.unhandled.most_common()))
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
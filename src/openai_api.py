@@ -23,7 +23,6 @@
 OpenAI WS communication
 """
 
-import json
 import base64
 import logging
 import asyncio
@@ -31,12 +30,17 @@ from queue import Empty
 from websockets.asyncio.client import connect
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 from ai import AIEngine
-from codec import get_codecs, CODECS, UnsupportedCodec
+from codec import get_codecs, CODECS, UnsupportedCodec, queue_frames
 from config import Config
+from messages import MessageDispatcher, extract_base64, loads, dumps
 
 OPENAI_API_MODEL = "gpt-4o-realtime-preview-2024-10-01"
 OPENAI_URL_FORMAT = "wss://api.openai.com/v1/realtime?model={}"
 
+# input_audio_buffer.append message, built around the base64 audio
+APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+APPEND_SUFFIX = '"}'
+
 
 class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
 
@@ -48,6 +52,7 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
         self.call = call
         self.ws = None
         self.session = None
+        self.assembler = self.codec.assembler()
         self.intro = None
         self.transfer_to = None
         self.transfer_by = None
@@ -64,6 +69,17 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
         self.transfer_to = self.cfg.get("transfer_to", "OPENAI_TRANSFER_TO")
         self.transfer_by = self.cfg.get("transfer_by", "OPENAI_TRANSFER_BY", self.call.to)
 
+        # inbound packets are sent in batches of audio_batch_ms
+        self.batch_time = int(self.cfg.get("audio_batch_ms",
+                                           "OPENAI_AUDIO_BATCH_MS",
+                                           80)) / 1000
+        self.batch_size = max(1, round(self.batch_time * 1000 /
+                                       self.codec.ptime))
+        self.pending = []
+        self.flush_timer = None
+        self.sent_packets = 0
+        self.sent_messages = 0
+
         # normalize codec
         if self.codec.name == "mulaw":
             self.codec_name = "g711_ulaw"
@@ -93,7 +109,7 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
         }
         self.ws = await connect(self.url, additional_headers=openai_headers)
         try:
-            json.loads(await self.ws.recv())
+            loads(await self.ws.recv())
         except ConnectionClosedOK:
             logging.info("WS Connection with OpenAI is closed")
             return
@@ -162,13 +178,13 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
             self.session["instructions"] = self.instructions
 
         try:
-            await self.ws.send(json.dumps({"type": "session.update", "session": self.session}))
+            await self.ws.send(dumps({"type": "session.update", "session": self.session}))
             if self.intro:
                 self.intro = {
                     "instructions": "Please greet the user with the following: " +
                     self.intro
                 }
-                await self.ws.send(json.dumps({"type": "response.create", "response": self.intro}))
+                await self.ws.send(dumps({"type": "response.create", "response": self.intro}))
             await self.handle_command()
         except ConnectionClosedError as e:
             logging.error(f"Error while communicating with OpenAI: {e}. Terminating call.")
@@ -178,64 +194,98 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
             self.terminate_call()
 
 
-    async def handle_command(self):  # pylint: disable=too-many-branches
-        """ Handles a command from the server """
-        leftovers = b''
-        async for smsg in self.ws:
-            msg = json.loads(smsg)
-            t = msg["type"]
-            if t == "response.audio.delta":
-                media = base64.b64decode(msg["delta"])
-                packets, leftovers = await self.run_in_thread(
-                    self.codec.parse, media, leftovers)
-                for packet in packets:
-                    self.queue.put_nowait(packet)
-            elif t == "response.audio.done":
-                logging.info(t)
-                if len(leftovers) > 0:
-                    packet = await self.run_in_thread(
-                            self.codec.parse, None, leftovers)
-                    self.queue.put_nowait(packet)
-                    leftovers = b''
-
-            elif t == "conversation.item.created":
-                if msg["item"].get('status') == "completed":
-                    self.drain_queue()
-            elif t == "conversation.item.input_audio_transcription.completed":
-                logging.info("Speaker: %s", msg["transcript"].rstrip())
-            elif t == "response.audio_transcript.done":
-                logging.info("Engine: %s", msg["transcript"])
-            elif t == "response.function_call_arguments.done":
-                if msg["name"] == "terminate_call":
-                    logging.info(t)
-                    self.terminate_call()
-                elif msg["name"] == "transfer_call":
-                    params = {
-                        'key': self.call.b2b_key,
-                        'method': "REFER",
-                        'body': "",
-                        'extra_headers': (
-                            f"Refer-To: <{self.transfer_to}>\r\n"
-                            f"Referred-By: {self.transfer_by}\r\n"
-                        )
-                    }
-                    self.call.mi_conn.execute('ua_session_update', params)
+    async def handle_command(self):
+        """ Handles the commands from the server """
+        self.assembler.reset()
+        dispatcher = MessageDispatcher("OpenAI", {
+            "response.audio.delta": self.handle_audio_delta,
+            "response.audio.done": self.handle_audio_done,
+            "conversation.item.created": self.handle_item_created,
+            "input_audio_buffer.speech_started": self.handle_turn_boundary,
+            "input_audio_buffer.speech_stopped": self.handle_turn_boundary,
+            "conversation.item.input_audio_transcription.completed":
+                self.handle_speaker_transcript,
+            "response.audio_transcript.done": self.handle_engine_transcript,
+            "response.function_call_arguments.done": self.handle_function_call,
+            "error": self.handle_error,
+        }, {
+            "response.audio.delta": self.handle_raw_audio_delta,
+        })
+        try:
+            async for smsg in self.ws:
+                await dispatcher.dispatch(smsg)
+        finally:
+            dispatcher.log_stats()
+
+    async def queue_audio(self, media):
+        """ Queues the packets of an audio fragment """
+        await queue_frames(self.assembler, media, self.queue)
+
+    async def handle_raw_audio_delta(self, smsg):
+        """ Queues the audio of a delta, without decoding the message """
+        media = extract_base64(smsg, "delta")
+        if media is None:
+            return False
+        await self.queue_audio(media)
+        return True
+
+    async def handle_audio_delta(self, msg):
+        """ Queues the audio of a decoded delta """
+        await self.queue_audio(base64.b64decode(msg["delta"]))
+
+    async def handle_audio_done(self, msg):
+        """ Flushes the last audio packet of a response """
+        logging.info(msg["type"])
+        packet = self.assembler.flush()
+        if packet:
+            self.queue.put_nowait(packet)
+
+    async def handle_item_created(self, msg):
+        """ Drops the playback when the user starts a new item """
+        if msg["item"].get('status') == "completed":
+            self.drain_queue()
 
-            elif t == "error":
-                logging.info(msg)
-            else:
-                logging.info(t)
+    async def handle_turn_boundary(self, _msg):
+        """ Sends the pending audio as soon as the user starts or stops
+        speaking, so the turn detection is not delayed by the batching """
+        await self.flush_audio()
+
+    async def handle_speaker_transcript(self, msg):
+        """ Logs what the user said """
+        logging.info("Speaker: %s", msg["transcript"].rstrip())
+
+    async def handle_engine_transcript(self, msg):
+        """ Logs what the engine said """
+        logging.info("Engine: %s", msg["transcript"])
+
+    async def handle_function_call(self, msg):
+        """ Handles the functions called by the engine """
+        if msg["name"] == "terminate_call":
+            logging.info(msg["type"])
+            self.terminate_call()
+        elif msg["name"] == "transfer_call":
+            params = {
+                'key': self.call.b2b_key,
+                'method': "REFER",
+                'body': "",
+                'extra_headers': (
+                    f"Refer-To: <{self.transfer_to}>\r\n"
+                    f"Referred-By: {self.transfer_by}\r\n"
+                )
+            }
+            self.call.mi_conn.execute('ua_session_update', params)
+
+    async def handle_error(self, msg):
+        """ Logs an error reported by the server """
+        logging.info(msg)
 
     def terminate_call(self):
         """ Terminates the call """
         self.call.terminated = True
 
-    async def run_in_thread(self, func, *args):
-        """ Runs a function in a thread """
-        return await asyncio.to_thread(func, *args)
-
     def drain_queue(self):
         """ Drains the playback queue """
+        self.assembler.reset()
         count = 0
         try:
             while self.queue.get_nowait():
@@ -249,14 +299,31 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
         if not self.ws or self.call.terminated:
             return
 
-        audio_data = base64.b64encode(audio)
-        event = {
-            "type": "input_audio_buffer.append",
-            "audio": audio_data.decode("utf-8")
-        }
+        self.pending.append(audio)
+        if len(self.pending) >= self.batch_size:
+            await self.flush_audio()
+        elif not self.flush_timer:
+            # do not hold the audio for long if the packets stop coming
+            self.flush_timer = asyncio.get_running_loop().call_later(
+                self.batch_time + self.codec.ptime / 1000,
+                lambda: asyncio.create_task(self.flush_audio()))
+
+    async def flush_audio(self):
+        """ Sends the batched audio in a single append message """
+        if self.flush_timer:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if not self.pending or not self.ws or self.call.terminated:
+            return
+        audio = b''.join(self.pending)
+        self.sent_packets += len(self.pending)
+        self.sent_messages += 1
+        self.pending = []
 
         try:
-            await self.ws.send(json.dumps(event))
+            await self.ws.send(APPEND_PREFIX +
+                               base64.b64encode(audio).decode("ascii") +
+                               APPEND_SUFFIX)
         except ConnectionClosedError as e:
             logging.error(f"WebSocket connection closed: {e.code}, {e.reason}")
             self.terminate_call()
@@ -265,6 +332,10 @@ class OpenAI(AIEngine):  # pylint: disable=too-many-instance-attributes
             self.terminate_call()
 
     async def close(self):
+        if self.ws:
+            await self.flush_audio()
+        logging.info("sent %d audio packets in %d messages",
+                     self.sent_packets, self.sent_messages)
         await self.ws.close()
 
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
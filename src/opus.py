@@ -22,87 +22,99 @@
 
 """ Module that decodes OGG Opus pages """
 
-
-class OggPageException(Exception):
-    """ Opus parsing exception """
-
-
-class OggOpusPage:
-
-    """ Opus Page """
-
-    def __init__(self, payload):
-        self.header = payload[:27]
-        self.sequence_number = int.from_bytes(self.header[18:22], 'little')
-        self.page_segments = self.header[26]
-        header_len = 27 + self.page_segments
-        self.segments_lens = payload[27:header_len]
-        segments_len = sum(self.segments_lens)
-        page_len = header_len + segments_len
-        self.page = payload[0:page_len]
-        self.segments_payload = self.page[header_len:]
-        self.segments = []
-
-        if self.sequence_number == 0 and \
-                self.segments_payload.startswith(b'OpusHead'):
-            return
-        if self.sequence_number == 1 and \
-                self.segments_payload.startswith(b'OpusTags'):
-            return
-
-        for i in range(self.page_segments):
-            segment_len = self.segments_lens[i]
-            segment = self.segments_payload[0:segment_len]
-            self.segments_payload = self.segments_payload[segment_len:]
-            self.segments.append(segment)
-
-    def size(self):
-        """ returns the size of an Opus Page """
-        return len(self.page)
-
-    def __str__(self):
-        return f"OpusOggPage({self.size()})"
-
-
-class OggOpus:
-
-    """ Opus Packet """
-
-    def __init__(self, payload):
-        self.payload = payload
-        self.last_packet = None
-        self.pages = []
-        self.discarded = []
-        self.parse()
-
-    def parse_page(self):
-        """ parses an Opus Page """
-        if not self.payload.startswith(b'OggS'):
-            # search first occurance of header
-            n = self.payload.find(b'OggS')
-            if n < 0:
-                # no page found
-                n = len(self.payload)
-                self.discarded.append(self.payload)
-                self.payload = ""
-                return
-            self.discarded.append(self.payload[0:n])
-            self.payload = self.payload[n:]
-
-        page = OggOpusPage(self.payload)
-        self.payload = self.payload[page.size():]
-        self.pages.append(page)
-
-    def parse(self):
-        """ parses the packet payload """
-        while len(self.payload) > 0:
-            self.parse_page()
-
-    def packets(self):
-        """ returns all the packets within all segments """
+OGG_CAPTURE = b'OggS'
+OGG_HEADER_LEN = 27
+# header type flag of a page that continues the last packet of the previous
+OGG_CONTINUED = 0x01
+
+
+class OggOpusDemuxer:
+
+    """ Streaming Ogg demuxer that extracts the Opus packets of a stream
+    received in chunks of any size.
+
+    Incomplete pages are kept until the rest of them arrives, the pages are
+    walked by offset, and packets laced over several segments or pages are
+    reassembled. Each packet is returned as soon as it is complete. """
+
+    # Opus identification and comment headers, skipped
+    HEADER_PACKETS = (b'OpusHead', b'OpusTags')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._packet = bytearray()
+        self.pages = 0
+        self.discarded = 0
+
+    def _page_len(self, start):
+        """ returns the length of the page at start, or 0 if incomplete """
+        buf = self._buffer
+        if len(buf) - start < OGG_HEADER_LEN:
+            return 0
+        header_len = OGG_HEADER_LEN + buf[start + 26]
+        if len(buf) - start < header_len:
+            return 0
+        page_len = header_len + sum(buf[start + OGG_HEADER_LEN:
+                                        start + header_len])
+        if len(buf) - start < page_len:
+            return 0
+        return page_len
+
+    def _add_packet(self, packets, packet):
+        """ collects a complete packet, unless it is an Opus header """
+        if packet[:8] not in self.HEADER_PACKETS:
+            packets.append(packet)
+
+    def _parse_page(self, view, start, packets):
+        """ extracts the packets of a complete page """
+        if not view[start + 5] & OGG_CONTINUED and self._packet:
+            # the continuation of the last packet was lost
+            self.discarded += len(self._packet)
+            self._packet.clear()
+        segments = view[start + 26]
+        pos = start + OGG_HEADER_LEN + segments
+        for lacing in view[start + OGG_HEADER_LEN:pos]:
+            segment = view[pos:pos + lacing]
+            pos += lacing
+            if lacing == 255:
+                self._packet += segment
+            elif self._packet:
+                self._packet += segment
+                self._add_packet(packets, bytes(self._packet))
+                self._packet.clear()
+            else:
+                self._add_packet(packets, bytes(segment))
+        self.pages += 1
+
+    def feed(self, data):
+        """ Returns the packets completed by a chunk """
+        self._buffer += data
         packets = []
-        for page in self.pages:
-            packets += page.segments
+        offset = 0
+        with memoryview(self._buffer) as view:
+            while True:
+                start = self._buffer.find(OGG_CAPTURE, offset)
+                if start < 0:
+                    # keep what could be the beginning of a capture pattern
+                    start = max(offset, len(self._buffer) -
+                                len(OGG_CAPTURE) + 1)
+                self.discarded += start - offset
+                offset = start
+                page_len = self._page_len(start)
+                if not page_len:
+                    break
+                self._parse_page(view, start, packets)
+                offset = start + page_len
+        del self._buffer[:offset]
         return packets
 
+    def flush(self):
+        """ Drops the incomplete data; Opus packets are never padded """
+        self.reset()
+
+    def reset(self):
+        """ Drops the incomplete page and packet """
+        self._buffer.clear()
+        self._packet.clear()
+
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
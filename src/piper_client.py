@@ -2,10 +2,16 @@ import asyncio
 import websockets
 import json
 import logging
+import time
 import traceback
+from collections import deque
 from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+from websockets.protocol import State
 from typing import Optional, Dict, Any, Union, Callable, Tuple, Awaitable
 
+logger = logging.getLogger(__name__)
+
+
 class PiperClient:
     """Client for Piper TTS WebSocket server.
     
@@ -13,21 +19,19 @@ class PiperClient:
     and send text for synthesis.
     """
     
-    def __init__(self, server_host="localhost", server_port=8000, session_id="", timeout_seconds=10):
+    def __init__(self, server_host="localhost", server_port=8000, timeout_seconds=10):
         """Initialize the Piper TTS client.
         
         Args:
             server_host: Hostname or IP address of the Piper TTS server
             server_port: Port number of the Piper TTS server
-            session_id: Optional session ID prefix for logging
             timeout_seconds: Connection timeout in seconds
         """
         self.server_url = f"ws://{server_host}:{server_port}/tts"
-        self.session_id = session_id
         self.websocket = None
         self.is_connected = False
         self.timeout_seconds = timeout_seconds
-        logging.info(f"{self.session_id}Initialized Piper TTS client for {self.server_url}")
+        logger.info(f"Initialized Piper TTS client for {self.server_url}")
     
     async def connect(self) -> bool:
         """Connect to the Piper TTS WebSocket server.
@@ -36,14 +40,14 @@ class PiperClient:
             bool: True if connection successful, False otherwise
         """
         try:
-            logging.info(f"{self.session_id}Connecting to Piper TTS server at {self.server_url}")
+            logger.info(f"Connecting to Piper TTS server at {self.server_url}")
             # Connect without timeout parameter - we'll handle timeouts separately
             self.websocket = await websockets.connect(self.server_url)
             self.is_connected = True
-            logging.info(f"{self.session_id}Connected to Piper TTS server at {self.server_url}")
+            logger.info(f"Connected to Piper TTS server at {self.server_url}")
             return True
         except Exception as e:
-            logging.error(f"{self.session_id}Failed to connect to Piper TTS server: {e}")
+            logger.error(f"Failed to connect to Piper TTS server: {e}")
             self.is_connected = False
             return False
 
@@ -58,7 +62,7 @@ class PiperClient:
             bool: True if request was sent successfully
         """
         if not self.is_connected or not self.websocket:
-            logging.error(f"{self.session_id}Cannot synthesize text: Not connected to Piper TTS server")
+            logger.error("Cannot synthesize text: Not connected to Piper TTS server")
             return False
         
         try:
@@ -68,11 +72,11 @@ class PiperClient:
                 request["voice"] = voice
                 
             # Send request
-            logging.info(f"{self.session_id}Sending TTS request: '{text[:50]}{'...' if len(text) > 50 else ''}'")
+            logger.info(f"Sending TTS request: '{text[:50]}{'...' if len(text) > 50 else ''}'")
             await self.websocket.send(json.dumps(request))
             return True
         except Exception as e:
-            logging.error(f"{self.session_id}Failed to send text to Piper TTS server: {e}")
+            logger.error(f"Failed to send text to Piper TTS server: {e}")
             self.is_connected = False
             return False
     
@@ -93,74 +97,61 @@ class PiperClient:
             bool: True if stream was processed successfully
         """
         if not self.is_connected or not self.websocket:
-            logging.error(f"{self.session_id}Cannot process stream: Not connected to Piper TTS server")
+            logger.error("Cannot process stream: Not connected to Piper TTS server")
             return False
         
         success = False
         try:
-            # Get start message
-            start_message = await self._wait_with_timeout(self.websocket.recv())
-            if not start_message:
-                logging.error(f"{self.session_id}Timed out waiting for start message from Piper TTS server")
-                return False
-            
-            # Parse start message
-            try:
-                start_data = json.loads(start_message)
-                msg_type = start_data.get("type")
-                # Accept both 'start' and 'connected' as valid initial message types
-                if msg_type in ["start", "connected"]:
-                    logging.info(f"{self.session_id}TTS connection established: {start_data.get('message')}")
-                    if on_start:
-                        await self._maybe_await(on_start(start_data))
-                else:
-                    logging.warning(f"{self.session_id}Unexpected first message from TTS server: {start_data}")
-            except json.JSONDecodeError:
-                logging.warning(f"{self.session_id}Received non-JSON start message: {start_message[:50]}...")
-                return False
-            
-            # Process stream
+            # Control and audio messages are handled in any order, so the same
+            # connection can carry several requests: servers may send their
+            # 'connected' greeting only once, and 'start' per request
             while True:
+                # Wait for message with timeout
+                message = await self._wait_with_timeout(self.websocket.recv())
+                if message is None:
+                    logger.error("Timed out waiting for audio data from Piper TTS server")
+                    break
+                
+                # Handle binary audio data
+                if isinstance(message, bytes):
+                    if on_audio:
+                        await self._maybe_await(on_audio(message))
+                    continue
+                
+                # Handle JSON control messages (text)
                 try:
-                    # Wait for message with timeout
-                    message = await self._wait_with_timeout(self.websocket.recv())
-                    if not message:
-                        logging.error(f"{self.session_id}Timed out waiting for audio data from Piper TTS server")
-                        break
-                    
-                    # Handle JSON control messages (text)
-                    if isinstance(message, str):
-                        try:
-                            data = json.loads(message)
-                            msg_type = data.get("type")
-                            
-                            if msg_type == "end":
-                                logging.info(f"{self.session_id}TTS stream complete: {data.get('message')}")
-                                if on_end:
-                                    await self._maybe_await(on_end(data))
-                                success = True
-                                break
-                            elif msg_type == "error":
-                                logging.error(f"{self.session_id}TTS error: {data.get('message')}")
-                                if on_error:
-                                    await self._maybe_await(on_error(data))
-                                break
-                        except json.JSONDecodeError:
-                            logging.warning(f"{self.session_id}Received non-JSON text message: {message[:50]}...")
-                    
-                    # Handle binary audio data
-                    elif isinstance(message, bytes):
-                        if on_audio:
-                            await self._maybe_await(on_audio(message))
-                    
-                except websockets.exceptions.ConnectionClosed as e:
-                    logging.info(f"{self.session_id}TTS WebSocket connection closed with code {e.code}")
+                    data = json.loads(message)
+                except json.JSONDecodeError:
+                    logger.warning(f"Received non-JSON text message: {message[:50]}...")
+                    continue
+                
+                msg_type = data.get("type")
+                if msg_type in ["start", "connected"]:
+                    logger.info(f"TTS connection established: {data.get('message')}")
+                    if on_start:
+                        await self._maybe_await(on_start(data))
+                elif msg_type == "end":
+                    logger.info(f"TTS stream complete: {data.get('message')}")
+                    if on_end:
+                        await self._maybe_await(on_end(data))
+                    success = True
+                    break
+                elif msg_type == "error":
+                    logger.error(f"TTS error: {data.get('message')}")
+                    if on_error:
+                        await self._maybe_await(on_error(data))
                     break
+                else:
+                    logger.warning(f"Unexpected message from TTS server: {data}")
             
             return success
                 
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"TTS WebSocket connection closed with code {e.code}")
+            self.is_connected = False
+            return success
         except Exception as e:
-            logging.error(f"{self.session_id}Error processing TTS stream: {e}")
+            logger.error(f"Error processing TTS stream: {e}")
             traceback.print_exc()
             return False
             
@@ -187,15 +178,24 @@ class PiperClient:
         except asyncio.TimeoutError:
             return None
     
+    def is_open(self) -> bool:
+        """Check whether the connection can carry another request.
+        
+        Returns:
+            bool: True if the WebSocket connection is open
+        """
+        return (self.is_connected and self.websocket is not None
+                and self.websocket.state is State.OPEN)
+
     async def close(self):
         """Close the connection to the Piper TTS server."""
         if self.websocket:
             try:
                 # Normal closure code
                 await self.websocket.close(code=1000, reason="Normal closure")
-                logging.info(f"{self.session_id}WebSocket connection closed gracefully")
+                logger.info("WebSocket connection closed gracefully")
             except Exception as e:
-                logging.error(f"{self.session_id}Error closing WebSocket connection: {e}")
+                logger.error(f"Error closing WebSocket connection: {e}")
             finally:
                 self.websocket = None
                 self.is_connected = False
@@ -258,4 +258,192 @@ class PiperClient:
         success = await self.process_stream(on_audio=chunk_callback)
         await self.close()
         
-        return success 
\ No newline at end of file
+        return success
+
+
+class PiperClientPool:
+    """Pool of long-lived Piper TTS connections.
+    
+    Connections are reused for consecutive synthesis requests instead of
+    paying a WebSocket handshake per utterance. The pool bounds the number of
+    concurrent connections, evicts connections that stayed idle for too long
+    and reconnects with exponential backoff.
+    """
+
+    _pools = {}
+
+    @classmethod
+    def get(cls, server_host="localhost", server_port=8000, max_size=4,
+            idle_timeout=60.0, timeout_seconds=10):
+        """Return the shared pool for a Piper server, creating it if needed.
+        
+        Args:
+            server_host: Hostname or IP address of the Piper TTS server
+            server_port: Port number of the Piper TTS server
+            max_size: Maximum number of concurrent connections
+            idle_timeout: Seconds after which an idle connection is closed
+            timeout_seconds: Read timeout of the connections
+            
+        Returns:
+            PiperClientPool: The shared pool
+        """
+        key = (server_host, int(server_port))
+        pool = cls._pools.get(key)
+        if pool is None:
+            pool = cls(server_host, server_port, max_size, idle_timeout,
+                       timeout_seconds)
+            cls._pools[key] = pool
+        return pool
+
+    def __init__(self, server_host="localhost", server_port=8000, max_size=4,
+                 idle_timeout=60.0, timeout_seconds=10, connect_retries=3,
+                 backoff_initial=0.2, backoff_max=2.0):
+        self.server_host = server_host
+        self.server_port = int(server_port)
+        self.max_size = int(max_size)
+        self.idle_timeout = float(idle_timeout)
+        self.timeout_seconds = float(timeout_seconds)
+        self.connect_retries = connect_retries
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._idle = deque()  # (client, last used timestamp)
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._evict_task = None
+
+    async def _connect(self) -> Optional[PiperClient]:
+        """Open a new connection, retrying with exponential backoff.
+        
+        Returns:
+            PiperClient: Connected client, or None if all attempts failed
+        """
+        delay = self.backoff_initial
+        for attempt in range(1, self.connect_retries + 1):
+            client = PiperClient(server_host=self.server_host,
+                                 server_port=self.server_port,
+                                 timeout_seconds=self.timeout_seconds)
+            if await client.connect():
+                return client
+            if attempt < self.connect_retries:
+                logger.info(f"Retrying Piper TTS connection in {delay:.1f}s (attempt {attempt}/{self.connect_retries})")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+        return None
+
+    def _evict_idle(self):
+        """Close connections that stayed idle longer than the idle timeout"""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            client, _ = self._idle.popleft()
+            asyncio.create_task(client.close())
+
+    async def _evict_loop(self):
+        """Periodically evict idle connections"""
+        try:
+            while True:
+                await asyncio.sleep(max(self.idle_timeout / 2, 1.0))
+                self._evict_idle()
+        except asyncio.CancelledError:
+            pass
+
+    async def acquire(self) -> Optional[PiperClient]:
+        """Lease a connection, waiting if the pool limit is reached.
+        
+        Returns:
+            PiperClient: Connected client, or None if the server is unreachable
+        """
+        if self._evict_task is None or self._evict_task.done():
+            self._evict_task = asyncio.create_task(self._evict_loop())
+        await self._slots.acquire()
+        try:
+            self._evict_idle()
+            # most recently used connections are the least likely to be stale
+            while self._idle:
+                client, _ = self._idle.pop()
+                if client.is_open():
+                    return client
+                await client.close()
+            client = await self._connect()
+        except BaseException:
+            # e.g. cancelled by a barge-in while connecting
+            self._slots.release()
+            raise
+        if client is None:
+            self._slots.release()
+        return client
+
+    def release(self, client: PiperClient, reuse: bool = True):
+        """Return a leased connection to the pool.
+        
+        Args:
+            client: The client returned by acquire()
+            reuse: False if the connection is in an unknown state (e.g. an
+                   interrupted stream) and must be closed
+        """
+        if reuse and client.is_open():
+            self._idle.append((client, time.monotonic()))
+        else:
+            asyncio.create_task(client.close())
+        self._slots.release()
+
+    async def warm_up(self, count=1):
+        """Pre-open connections so the first utterance skips the handshake.
+        
+        Args:
+            count: Number of connections to open
+        """
+        for _ in range(min(count, self.max_size) - len(self._idle)):
+            client = await self._connect()
+            if client is None:
+                return
+            self._idle.append((client, time.monotonic()))
+
+    async def synthesize(self, text: str, voice: str = None,
+                         on_start=None, on_audio=None, on_end=None, on_error=None) -> bool:
+        """Synthesize text on a pooled connection and stream the result.
+        
+        A pooled connection that turns out to be dead before any audio was
+        delivered is replaced once by a fresh connection.
+        
+        Args:
+            text: The text to synthesize
+            voice: Optional voice name
+            on_start, on_audio, on_end, on_error: process_stream() callbacks
+            
+        Returns:
+            bool: True if the stream completed successfully
+        """
+        audio_received = False
+
+        async def track_audio(chunk):
+            nonlocal audio_received
+            audio_received = True
+            if on_audio:
+                result = on_audio(chunk)
+                if asyncio.iscoroutine(result):
+                    await result
+
+        for _ in range(2):
+            client = await self.acquire()
+            if client is None:
+                logger.error("No Piper TTS connection available")
+                return False
+            success = False
+            try:
+                if await client.synthesize(text, voice=voice):
+                    success = await client.process_stream(
+                        on_start=on_start, on_audio=track_audio,
+                        on_end=on_end, on_error=on_error)
+            finally:
+                self.release(client, reuse=success)
+            if success or audio_received or client.is_open():
+                return success
+            logger.info("Pooled Piper TTS connection was closed, retrying on a new one")
+        return False
+
+    async def close(self):
+        """Close all idle connections"""
+        if self._evict_task and not self._evict_task.done():
+            self._evict_task.cancel()
+        while self._idle:
+            client, _ = self._idle.popleft()
+            await client.close()
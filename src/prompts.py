@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Pre-renders fixed prompts into a memory-mapped bundle of frames """
+
+import os
+import json
+import mmap
+import time
+import asyncio
+import logging
+import tempfile
+from config import Config
+from tts_cache import TTSCache, pack_frames, unpack_frames
+
+BUNDLE_MAGIC = b"OAVCPRM1"
+
+
+class _FrameList(list):
+    """ Sink that collects the rendered frames """
+
+    def put_nowait(self, frame):
+        """ collects a frame """
+        self.append(bytes(frame))
+
+
+class PromptBundle:
+    """ A single file holding the frames of all the pre-rendered prompts.
+
+    The file starts with a magic string and the length of a JSON index that
+    maps each prompt key to the offset and length of its packed frames. It is
+    memory-mapped, so the pages are shared by all the processes using it. """
+
+    _instance = None
+
+    def __init__(self, path):
+        self.path = path
+        self._index = {}
+        self._map = None
+        self.load()
+
+    @classmethod
+    def get(cls):
+        """ Returns the process-wide bundle, or None if it is disabled """
+        if cls._instance is None:
+            cfg = Config.get("prompts")
+            if cfg.getboolean("disabled", "PROMPTS_DISABLE", False):
+                return None
+            path = cfg.get("path", "PROMPTS_PATH",
+                           os.path.join(tempfile.gettempdir(),
+                                        "oavc-prompts.bundle"))
+            cls._instance = cls(path)
+        return cls._instance
+
+    def load(self):
+        """ Maps the bundle file, if present """
+        try:
+            with open(self.path, 'rb') as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return
+        except OSError as e:
+            logging.warning("cannot read prompts bundle %s: %s", self.path, e)
+            return
+        header = len(BUNDLE_MAGIC) + 4
+        if blob[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+            logging.warning("ignoring invalid prompts bundle %s", self.path)
+            return
+        index_len = int.from_bytes(blob[len(BUNDLE_MAGIC):header], 'little')
+        try:
+            index = json.loads(blob[header:header + index_len])
+        except ValueError:
+            logging.warning("ignoring corrupted prompts bundle %s", self.path)
+            return
+        self._map = blob
+        self._index = {key: (header + index_len + offset, size)
+                       for key, (offset, size) in index.items()}
+
+    def keys(self):
+        """ Returns the keys of the bundled prompts """
+        return set(self._index)
+
+    def blob(self, key):
+        """ Returns the packed frames of a prompt, or None """
+        entry = self._index.get(key)
+        if not entry:
+            return None
+        offset, size = entry
+        return memoryview(self._map)[offset:offset + size]
+
+    def lookup(self, engine, voice, codec, text):
+        """ Returns the frames of a prompt, as views into the bundle """
+        blob = self.blob(TTSCache.key(engine, voice, codec, text))
+        return unpack_frames(blob) if blob is not None else None
+
+    def write(self, entries):
+        """ Atomically replaces the bundle with the given packed prompts """
+        index = {}
+        offset = 0
+        for key, blob in entries.items():
+            index[key] = (offset, len(blob))
+            offset += len(blob)
+        index = json.dumps(index).encode()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(BUNDLE_MAGIC)
+            f.write(len(index).to_bytes(4, 'little'))
+            f.write(index)
+            for blob in entries.values():
+                f.write(blob)
+        os.replace(tmp, self.path)
+
+
+def play_prompt(queue, engine, voice, codec, text):
+    """ Queues the frames of a pre-rendered prompt for playback;
+    returns False if the prompt was not rendered """
+    bundle = PromptBundle.get()
+    if not bundle or not text:
+        return False
+    frames = bundle.lookup(engine, voice, codec, text)
+    if not frames:
+        return False
+    for frame in frames:
+        queue.put_nowait(frame)
+    return True
+
+
+async def render_prompts(flavors):
+    """ Renders the prompts of the given flavor classes that are not already
+    in the bundle, and rewrites the bundle if anything changed """
+    bundle = PromptBundle.get()
+    if not bundle:
+        return
+    entries = {}
+    rendered = 0
+    start = time.monotonic()
+    for flavor in flavors:
+        try:
+            prompts = flavor.get_prompts()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("Error listing the prompts of %s",
+                              flavor.__name__)
+            continue
+        for engine, voice, codec, text, synthesize in prompts:
+            key = TTSCache.key(engine, voice, codec, text)
+            if key in entries:
+                continue
+            blob = bundle.blob(key)
+            if blob is None:
+                frames = _FrameList()
+                try:
+                    result = await synthesize(text, frames)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logging.exception("Error rendering %s prompt '%s'",
+                                      engine, text)
+                    continue
+                if result is not True or not frames:
+                    logging.warning("Could not render %s prompt '%s'",
+                                    engine, text)
+                    continue
+                blob = pack_frames(frames)
+                rendered += 1
+            entries[key] = blob
+    if not rendered and set(entries) == bundle.keys():
+        return
+    try:
+        await asyncio.to_thread(bundle.write, entries)
+    except OSError as e:
+        logging.warning("cannot write prompts bundle %s: %s", bundle.path, e)
+        return
+    bundle.load()
+    logging.info("Rendered %d prompts in %.2fs, %d bundled in %s", rendered,
+                 time.monotonic() - start, len(entries), bundle.path)
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Pipelines TTS synthesis of text chunks into the playback queue """
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from text_chunker import SentenceChunker
+
+
+class _Chunk:  # pylint: disable=too-few-public-methods
+    """ A text chunk being synthesized """
+
+    def __init__(self, text):
+        self.text = text
+        self.packets = asyncio.Queue()
+        self.task = None
+
+
+class SpeechPipeline:
+    """ Synthesizes text chunks ahead of their playback and forwards the
+    resulting packets to the playback queue, strictly in order.
+
+    The `synthesize` coroutine receives a chunk of text and a sink, and must
+    put the codec packets in the sink (using `put_nowait`) as they are
+    produced. Up to `lookahead` chunks are synthesized while the current one
+    is being forwarded.
+    """
+
+    def __init__(self, synthesize, queue, lookahead=1):
+        self.synthesize = synthesize
+        self.queue = queue
+        self.lookahead = lookahead
+        self.cancelled = False
+        self.packets = 0
+        self._pending = deque()
+        self._window = deque()
+        self._finished = False
+        self._wakeup = asyncio.Event()
+        self._player = None
+
+    def push(self, text):
+        """ Adds a text chunk to be spoken after the previous ones """
+        if self.cancelled or self._finished or not text:
+            return
+        self._pending.append(_Chunk(text))
+        self._schedule()
+        if self._player is None:
+            self._player = asyncio.create_task(self._play())
+        self._wakeup.set()
+
+    def finish(self):
+        """ Indicates that no more chunks will be pushed """
+        self._finished = True
+        self._wakeup.set()
+
+    def cancel(self):
+        """ Stops synthesis and playback of the chunks not yet queued """
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self._finished = True
+        for chunk in list(self._window) + list(self._pending):
+            if chunk.task:
+                chunk.task.cancel()
+        self._window.clear()
+        self._pending.clear()
+        if self._player:
+            self._player.cancel()
+
+    @property
+    def done(self):
+        """ Returns True once all the chunks were forwarded or cancelled """
+        if self.cancelled:
+            return True
+        return self._finished and not self._window and not self._pending
+
+    async def wait(self):
+        """ Waits until all chunks are forwarded to the playback queue """
+        if self._player is None:
+            return
+        try:
+            await asyncio.shield(self._player)
+        except asyncio.CancelledError:
+            # only the cancellation of the player itself is expected; the
+            # caller being cancelled must still end cancelled
+            if not self.cancelled or asyncio.current_task().cancelling():
+                raise
+
+    def _schedule(self):
+        """ Starts synthesis for the chunks that fit in the window """
+        while self._pending and len(self._window) <= self.lookahead:
+            chunk = self._pending.popleft()
+            chunk.task = asyncio.create_task(self._synthesize(chunk))
+            self._window.append(chunk)
+
+    async def _synthesize(self, chunk):
+        """ Synthesizes a chunk into its own packets queue """
+        try:
+            await self.synthesize(chunk.text, chunk.packets)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("Error synthesizing '%s'", chunk.text)
+        finally:
+            chunk.packets.put_nowait(None)
+
+    async def _play(self):
+        """ Forwards the packets of each chunk, in order """
+        while True:
+            if not self._window:
+                if self._finished:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            chunk = self._window[0]
+            while True:
+                packet = await chunk.packets.get()
+                if packet is None:
+                    break
+                self.queue.put_nowait(packet)
+                self.packets += 1
+            self._window.popleft()
+            self._schedule()
+
+
+async def speak_answer(speech, deltas, language="en"):
+    """ Speaks an answer streamed by the LLM: the text deltas are cut into
+    sentences, each one pushed to the pipeline as soon as it is complete.
+
+    When cancelled, the stream of deltas is closed right away, so that the
+    part already generated is kept in the conversation, and the pipeline is
+    cancelled. """
+    chunker = SentenceChunker(language)
+    try:
+        async with aclosing(deltas) as stream:
+            async for delta in stream:
+                for chunk in chunker.feed(delta):
+                    speech.push(chunk)
+        for chunk in chunker.flush():
+            speech.push(chunk)
+        speech.finish()
+        await speech.wait()
+    except asyncio.CancelledError:
+        speech.cancel()
+        raise
+    except Exception:  # pylint: disable=broad-exception-caught
+        speech.cancel()
+        logging.exception("Error speaking the answer")
+
+
+class AnswerTasks:
+    """ The tasks answering the phrases of a call, being generated or
+    spoken, which are all cancelled when the call is interrupted """
+
+    def __init__(self):
+        self._tasks = set()
+
+    def start(self, coro):
+        """ Runs an answer in a new task """
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def cancel(self):
+        """ Cancels the answers still running """
+        for task in list(self._tasks):
+            task.cancel()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
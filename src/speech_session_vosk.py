@@ -6,17 +6,26 @@ import numpy as np
 import asyncio
 from ai import AIEngine
 from queue import Empty
-import json
 import logging
-from vosk_client import VoskClient
+from vosk_client import VoskClient, VOSK_EOF_MESSAGE
+from vosk_pool import VoskSessionPool
+from endpointing import Endpointer, Speculation, same_utterance
 import torchaudio
 import time
 from pcmu_decoder import PCMUDecoder
 import websockets
 import traceback
-import audioop  # For mu-law encoding
-import random  # For simulated responses
-from piper_client import PiperClient  # Import the new Piper client
+from chatgpt_api import ChatGPT
+from conversation import DEFAULT_CONTEXT_TOKENS
+from piper_client import PiperClientPool
+from prompts import play_prompt
+from speech_pipeline import SpeechPipeline
+from text_chunker import SentenceChunker, split_text, get_language
+from tts_output import PCMUFramer, StreamingResampler
+from tts_cache import cached
+from log_context import LogSampler, set_call_level, clear_call_level
+
+logger = logging.getLogger(__name__)
 
 # Wyoming client libraries for TTS are replaced with websockets
 # from wyoming.client import AsyncTcpClient
@@ -26,12 +35,30 @@ from piper_client import PiperClient  # Import the new Piper client
 class AudioProcessor:
     """Audio processing utilities for speech recognition"""
     
-    def __init__(self, target_sample_rate=16000, debug=False, session_id=""):
+    # Resamplers shared by all the calls, per target rate
+    _resamplers = {}
+    
+    def __init__(self, target_sample_rate=16000, debug=False):
         self.target_sample_rate = target_sample_rate
         self.debug = debug
-        self.session_id = session_id
         self.pcmu_decoder = PCMUDecoder()
-        self.resampler = torchaudio.transforms.Resample(orig_freq=8000, new_freq=target_sample_rate)
+        self.resampler = self.get_resampler(target_sample_rate)
+    
+    @classmethod
+    def get_resampler(cls, target_sample_rate):
+        """Return the shared 8kHz resampler of a target rate
+        
+        Args:
+            target_sample_rate: Sample rate expected by the STT
+            
+        Returns:
+            torchaudio.transforms.Resample: The resampler, with its kernel built
+        """
+        resampler = cls._resamplers.get(target_sample_rate)
+        if resampler is None:
+            resampler = torchaudio.transforms.Resample(orig_freq=8000, new_freq=target_sample_rate)
+            cls._resamplers[target_sample_rate] = resampler
+        return resampler
     
     def tensor_to_bytes(self, tensor):
         """Convert audio tensor to bytes
@@ -56,27 +83,28 @@ class AudioProcessor:
             tuple: (resampled_tensor, audio_bytes) or (None, None) on error
         """
         if len(audio) == 0:
-            logging.warning(f"{self.session_id}Received empty audio bytes. Skipping processing.")
+            logger.warning("Received empty audio bytes. Skipping processing.")
             return None, None
             
-        # Log input for debugging    
-        if self.debug:
-            logging.debug(f"{self.session_id}Raw input audio: {len(audio)} bytes")
+        # Per-packet details, only computed when debugging
+        verbose = logger.isEnabledFor(logging.DEBUG)
+        if verbose:
+            logger.debug("Raw input audio: %d bytes", len(audio))
         
         # Decode PCMU to PCM float32 NumPy array
         pcm32_samples_np = self.pcmu_decoder.decode(audio) # Returns np.ndarray(dtype=np.float32)
 
         if pcm32_samples_np is None or pcm32_samples_np.size == 0:
-            logging.warning(f"{self.session_id}PCMU decoder returned empty result. Skipping processing.")
+            logger.warning("PCMU decoder returned empty result. Skipping processing.")
             return None, None
             
         # DETAILED LOG 1: After decoding PCMU to float32 samples
-        # logging.debug(f"{self.session_id}Decoded PCM: {len(pcm16_samples)} bytes") # Old log
-        logging.debug(f"{self.session_id}Decoded to float32 PCM samples: {len(pcm32_samples_np)}")
+        if verbose:
+            logger.debug("Decoded to float32 PCM samples: %d", len(pcm32_samples_np))
         
         # Ensure data is valid before conversion - check size now
         # if len(pcm16_samples) == 0:
-        #     logging.warning(f"{self.session_id}Empty PCM after conversion. Skipping.")
+        #     logger.warning("Empty PCM after conversion. Skipping.")
         #     return None, None
         
         try:
@@ -85,8 +113,9 @@ class AudioProcessor:
             # audio_tensor = torch.frombuffer(bytearray(pcm16_samples), dtype=torch.int16).float() / 32768.0 # Old way
             audio_tensor = torch.from_numpy(pcm32_samples_np)
             # DETAILED LOG 2: After converting NumPy array to tensor
-            # logging.debug(f"{self.session_id}Converted to 8kHz tensor: shape={audio_tensor.shape}, min={audio_tensor.min():.4f}, max={audio_tensor.max():.4f}") # Old log
-            logging.debug(f"{self.session_id}Converted NumPy to 8kHz tensor: shape={audio_tensor.shape}, dtype={audio_tensor.dtype}, min={audio_tensor.min():.4f}, max={audio_tensor.max():.4f}")
+            if verbose:
+                logger.debug("Converted NumPy to 8kHz tensor: shape=%s, dtype=%s, min=%.4f, max=%.4f",
+                             audio_tensor.shape, audio_tensor.dtype, audio_tensor.min(), audio_tensor.max())
             
             # Clean tensor if needed
             audio_tensor = self._clean_tensor(audio_tensor)
@@ -97,25 +126,27 @@ class AudioProcessor:
             # Resample to target rate (e.g., 16kHz)
             resampled_tensor = self.resampler(audio_tensor.unsqueeze(0)).squeeze(0)
             # DETAILED LOG 3: After resampling to target rate
-            # logging.debug(f"{self.session_id}Resampled tensor: shape={resampled_tensor.shape}, min={resampled_tensor.min():.4f}, max={resampled_tensor.max():.4f}") # Old log
-            logging.debug(f"{self.session_id}Resampled tensor: shape={resampled_tensor.shape}, dtype={resampled_tensor.dtype}, min={resampled_tensor.min():.4f}, max={resampled_tensor.max():.4f}")
+            if verbose:
+                logger.debug("Resampled tensor: shape=%s, dtype=%s, min=%.4f, max=%.4f",
+                             resampled_tensor.shape, resampled_tensor.dtype,
+                             resampled_tensor.min(), resampled_tensor.max())
             
             # Check the resampled audio validity
             if resampled_tensor.shape[0] == 0:
-                logging.warning(f"{self.session_id}Resampling resulted in empty tensor. Skipping.")
+                logger.warning("Resampling resulted in empty tensor. Skipping.")
                 return None, None
             
             # Convert final float32 tensor to 16-bit PCM bytes for Vosk
             audio_bytes = self.tensor_to_bytes(resampled_tensor)
             
             # DETAILED LOG 4: Final bytes length before returning
-            logging.debug(f"{self.session_id}Final processed audio bytes length: {len(audio_bytes)}")
+            logger.debug("Final processed audio bytes length: %d", len(audio_bytes))
             
             return resampled_tensor, audio_bytes
             
         except Exception as e:
-            logging.error(f"{self.session_id}Error processing audio bytes: {str(e)}")
-            logging.error(f"{self.session_id}Exception details: {traceback.format_exc()}")
+            logger.error(f"Error processing audio bytes: {str(e)}")
+            logger.error(f"Exception details: {traceback.format_exc()}")
             return None, None
     
     def _clean_tensor(self, tensor):
@@ -128,7 +159,7 @@ class AudioProcessor:
             torch.Tensor: Cleaned tensor
         """
         if torch.isnan(tensor).any() or torch.isinf(tensor).any():
-            logging.warning(f"{self.session_id}Audio tensor contains NaN or Inf values. Cleaning tensor.")
+            logger.warning("Audio tensor contains NaN or Inf values. Cleaning tensor.")
             return torch.nan_to_num(tensor, nan=0.0, posinf=0.99, neginf=-0.99)
         return tensor
     
@@ -147,7 +178,7 @@ class AudioProcessor:
         if audio_max < 0.005:
             gain = min(0.2 / (audio_max + 1e-10), 5.0)
             tensor = tensor * gain
-            logging.debug(f"{self.session_id}Applied normalization with gain: {gain:.2f}")
+            logger.debug("Applied normalization with gain: %.2f", gain)
         
         return tensor
 
@@ -156,7 +187,7 @@ class VADProcessor:
     
     def __init__(self, vad_detector, target_sample_rate, audio_processor, 
                  vad_buffer_chunk_ms=750, speech_detection_threshold=3, 
-                 silence_detection_threshold=10, debug=False, session_id=""):
+                 silence_detection_threshold=10, preroll_ms=300, debug=False):
         self.vad = vad_detector
         self.target_sample_rate = target_sample_rate
         self.audio_processor = audio_processor  # Add reference to audio processor
@@ -164,7 +195,6 @@ class VADProcessor:
         self.speech_detection_threshold = speech_detection_threshold
         self.silence_detection_threshold = silence_detection_threshold
         self.debug = debug
-        self.session_id = session_id
         
         # VAD buffer
         self._vad_buffer = bytearray()
@@ -172,10 +202,23 @@ class VADProcessor:
         self._last_buffer_flush_time = time.time()
         self._vad_buffer_locks = asyncio.Lock()
         
+        # Pre-roll ring buffer: the most recent audio that was not sent to STT,
+        # flushed ahead of the first speech chunk so the onset is not lost
+        self._preroll = bytearray()
+        self._preroll_max_bytes = int(target_sample_rate * preroll_ms / 1000) * 2
+        
         # Speech state
         self.consecutive_speech_packets = 0
         self.consecutive_silence_packets = 0
         self.speech_active = False
+        
+        # Optional callbacks called when speech starts and ends
+        self.on_speech_start = None
+        self.on_speech_end = None
+        
+        # The per-chunk decisions are logged at most once per second
+        self._speech_log = LogSampler(interval=1.0)
+        self._silence_log = LogSampler(interval=1.0)
     
     def reset_vad_state(self, preserve_buffer=False):
         """Reset VAD state between requests
@@ -198,11 +241,37 @@ class VADProcessor:
         # Optionally clear buffer (not using lock since this method should be called 
         # when no audio processing is active)
         if not preserve_buffer:
+            # Keep the tail of the dropped audio as pre-roll, the caller may
+            # already be speaking again
+            self._remember_preroll(self._vad_buffer)
             self._vad_buffer.clear()
             self._vad_buffer_size_samples = 0
             self._last_buffer_flush_time = time.time()
             
-        logging.info(f"{self.session_id}VAD state reset. Previous active state: {was_active}")
+        logger.info(f"VAD state reset. Previous active state: {was_active}")
+
+    def _remember_preroll(self, audio_bytes):
+        """Append audio that is not sent to STT to the pre-roll ring buffer
+        
+        Args:
+            audio_bytes: 16-bit PCM audio at the target sample rate
+        """
+        if self._preroll_max_bytes <= 0 or not audio_bytes:
+            return
+        self._preroll.extend(audio_bytes)
+        excess = len(self._preroll) - self._preroll_max_bytes
+        if excess > 0:
+            del self._preroll[:excess]
+
+    def _take_preroll(self):
+        """Return and clear the pre-roll audio
+        
+        Returns:
+            bytes: Buffered pre-roll audio (may be empty)
+        """
+        preroll = bytes(self._preroll)
+        self._preroll.clear()
+        return preroll
 
     async def add_audio(self, audio_bytes, num_samples):
         """Add audio to VAD buffer and process if needed
@@ -225,7 +294,7 @@ class VADProcessor:
             
             # Check if buffer has reached threshold
             if buffer_ms >= self.vad_buffer_chunk_ms:
-                logging.debug(f"{self.session_id}VAD buffer reached {buffer_ms:.2f}ms, processing for VAD")
+                logger.debug("VAD buffer reached %.2fms, processing for VAD", buffer_ms)
                 is_speech, buffer_bytes = await self._process_buffer()
                 return True, is_speech, buffer_bytes
                 
@@ -255,29 +324,48 @@ class VADProcessor:
                 # If enough consecutive speech packets, activate speech mode
                 if self.consecutive_speech_packets >= self.speech_detection_threshold and not self.speech_active:
                     self.speech_active = True
-                    logging.info(f"{self.session_id}Speech started after {self.consecutive_speech_packets} consecutive speech packets")
+                    logger.info(f"Speech started after {self.consecutive_speech_packets} consecutive speech packets")
+                    if self.on_speech_start:
+                        self.on_speech_start()
             else:
                 self.consecutive_silence_packets += 1
                 self.consecutive_speech_packets = 0
                 
                 # If enough consecutive silence packets, deactivate speech mode
-                logging.info(f"{self.session_id}VAD CHECK: consecutive_silence_packets={self.consecutive_silence_packets}, silence_detection_threshold={self.silence_detection_threshold}, speech_active={self.speech_active}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    skipped = self._silence_log.sample()
+                    if skipped is not None:
+                        logger.debug("VAD CHECK: consecutive_silence_packets=%d, silence_detection_threshold=%d, "
+                                     "speech_active=%s (%d similar skipped)", self.consecutive_silence_packets,
+                                     self.silence_detection_threshold, self.speech_active, skipped)
                 if self.consecutive_silence_packets >= self.silence_detection_threshold and self.speech_active:
                     self.speech_active = False
-                    logging.info(f"{self.session_id}Speech ended after {self.consecutive_silence_packets} consecutive silence packets")
+                    logger.info(f"Speech ended after {self.consecutive_silence_packets} consecutive silence packets")
+                    if self.on_speech_end:
+                        self.on_speech_end()
             
             # Determine if audio should be sent to STT
             send_to_stt = is_speech or self.speech_active
             
             if send_to_stt:
-                logging.info(f"{self.session_id}VAD: speech={is_speech}, active={self.speech_active}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    skipped = self._speech_log.sample()
+                    if skipped is not None:
+                        logger.debug("VAD: speech=%s, active=%s (%d similar skipped)",
+                                     is_speech, self.speech_active, skipped)
+                # Flush the pre-roll ahead of the first speech chunk
+                preroll = self._take_preroll()
+                if preroll:
+                    logger.debug("Prepending %d bytes of pre-roll audio", len(preroll))
+                    buffer_bytes = preroll + buffer_bytes
             else:
-                logging.debug(f"{self.session_id}No speech detected in chunk, not sending to STT")
+                logger.debug("No speech detected in chunk, not sending to STT")
+                self._remember_preroll(buffer_bytes)
             
             return send_to_stt, buffer_bytes
             
         except Exception as e:
-            logging.error(f"{self.session_id}Error processing VAD buffer: {str(e)}")
+            logger.error(f"Error processing VAD buffer: {str(e)}")
             # Return false to indicate no speech detected on error
             return False, buffer_bytes
         finally:
@@ -294,32 +382,32 @@ class VADProcessor:
         """
         if len(self._vad_buffer) > 0:
             buffer_seconds = self._vad_buffer_size_samples / self.target_sample_rate
-            logging.info(f"{self.session_id}Processing remaining VAD buffer: {buffer_seconds:.2f} seconds")
+            logger.info(f"Processing remaining VAD buffer: {buffer_seconds:.2f} seconds")
             return await self._process_buffer()
         return False, None
 
 class TranscriptHandler:
     """Handles transcript processing and callbacks"""
     
-    def __init__(self, session_id=""):
+    def __init__(self):
         self.last_partial_transcript = ""
         self.last_final_transcript = ""
         self.on_partial_transcript = None
         self.on_final_transcript = None
-        self.session_id = session_id
+        # Set whenever a final result (even an empty one) is received
+        self.final_received = asyncio.Event()
     
     async def handle_message(self, message):
         """Process transcript message from STT service
         
         Args:
-            message: JSON message from STT service
+            message: Decoded JSON message from STT service
             
         Returns:
             bool: True if message was processed successfully
         """
         try:
-            # Parse JSON response
-            response = json.loads(message)
+            response = message
             
             # Process partial transcript
             if "partial" in response:
@@ -329,7 +417,7 @@ class TranscriptHandler:
                 
                 # Log the partial transcript if it's not empty
                 if partial_text:
-                    logging.info(f"{self.session_id}Partial transcript: {partial_text}") 
+                    logger.debug("Partial transcript: %s", partial_text)
                 
                 if partial_text and self.on_partial_transcript:
                     await self.on_partial_transcript(partial_text)
@@ -339,10 +427,11 @@ class TranscriptHandler:
                 final_text = response.get("text", "")
                 # Store last final transcript
                 self.last_final_transcript = final_text
+                self.final_received.set()
                 
                 # Log the final transcript if it's not empty
                 if final_text:
-                    logging.info(f"{self.session_id}FINAL transcript: {final_text}")
+                    logger.info(f"FINAL transcript: {final_text}")
                     
                 if final_text and self.on_final_transcript:
                     # Use asyncio.create_task to avoid blocking transcript receiver
@@ -350,11 +439,23 @@ class TranscriptHandler:
                     
             return True
                 
-        except json.JSONDecodeError:
-            logging.error(f"{self.session_id}Invalid JSON response: {message}")
-            return False
         except Exception as e:
-            logging.error(f"{self.session_id}Error processing transcript: {str(e)}")
+            logger.error(f"Error processing transcript: {str(e)}")
+            return False
+    
+    async def wait_for_final(self, timeout):
+        """Wait for the final result of the utterance being finalized
+        
+        Args:
+            timeout: Deadline in seconds
+            
+        Returns:
+            bool: True if a final result was received in time
+        """
+        try:
+            await asyncio.wait_for(self.final_received.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
             return False
     
     def get_final_transcript(self):
@@ -364,20 +465,26 @@ class TranscriptHandler:
             str: Last final transcript or partial if no final available
         """
         if self.last_final_transcript:
-            logging.debug(f"{self.session_id}Returning final transcript: {self.last_final_transcript[:50]}...")
+            logger.debug(f"Returning final transcript: {self.last_final_transcript[:50]}...")
             return self.last_final_transcript
         elif self.last_partial_transcript:
             # If no final transcript but partial available, return partial
-            logging.debug(f"{self.session_id}No final transcript available, returning partial: {self.last_partial_transcript[:50]}...")
+            logger.debug(f"No final transcript available, returning partial: {self.last_partial_transcript[:50]}...")
             return self.last_partial_transcript
         else:
             # If no transcript available, return empty string
-            logging.debug(f"{self.session_id}No transcript available, returning empty string")
+            logger.debug("No transcript available, returning empty string")
             return ""
 
 class VoskSTT(AIEngine):
     """Vosk API'yi kullanan konuşma tanıma motoru"""
     
+    # Piper output rate, unless announced in the start message
+    tts_input_rate = 22050  # Default Piper sample rate is 22050Hz
+    tts_target_output_rate = 8000  # Target rate for RTP queue is always 8000Hz (PCMU requirement)
+    
+    barge_in = True
+    
     def __init__(self, call, cfg):
         """Vosk temelli konuşma tanıma motorunu başlat
         
@@ -390,7 +497,6 @@ class VoskSTT(AIEngine):
         
         # Session ID olarak B2B Key'i kullan
         self.b2b_key = call.b2b_key if hasattr(call, 'b2b_key') else None
-        self.session_id = f"[Session:{self.b2b_key}] " if self.b2b_key else ""
         self.queue = call.rtp
         # Load configuration
         self._load_config()
@@ -398,9 +504,14 @@ class VoskSTT(AIEngine):
         # Initialize components
         self._init_components(call)
         
+        # Conversation context of this call, on the LLM client shared by
+        # the calls using the same key, model and server
+        self.llm = ChatGPT.get(self.llm_key, self.llm_model, self.llm_base_url)
+        self.llm.create_call(self.b2b_key, self.llm_instructions, self.llm_context_tokens)
+        
         # Task states
         self.receive_task = None
-        self.tts_task = None  # New: Task for handling TTS processing
+        self.tts_task = None  # Task of the answer being generated and spoken
         
         # Closing state
         self._is_closing = False
@@ -408,7 +519,7 @@ class VoskSTT(AIEngine):
         # Setup logging
         self._setup_logging()
         
-        logging.info(f"{self.session_id}VoskSTT initialized. bypass_vad = {self.bypass_vad}")
+        logger.info(f"VoskSTT initialized. bypass_vad = {self.bypass_vad}")
 
     def _load_config(self):
         """Load configuration parameters from config"""
@@ -420,7 +531,9 @@ class VoskSTT(AIEngine):
         self.target_sample_rate = int(self.cfg.get("sample_rate", "sample_rate", 16000))
         self.channels = self.cfg.get("channels", "channels", 1)
         self.send_eof = self.cfg.get("send_eof", "send_eof", True)
-        self.debug = self.cfg.get("debug", "debug", False)
+        self.vosk_pool_size = int(self.cfg.get("pool_size", "VOSK_POOL_SIZE", 2))
+        self.vosk_pool_health_interval = float(self.cfg.get("pool_health_interval", "VOSK_POOL_HEALTH_INTERVAL", 15))
+        self.debug = self.cfg.getboolean("debug", "VOSK_DEBUG", False)
         
         # VAD configuration
         self.bypass_vad = self.cfg.get("bypass_vad", "bypass_vad", False)
@@ -431,17 +544,37 @@ class VoskSTT(AIEngine):
         self.vad_buffer_max_seconds = self.cfg.get("vad_buffer_max_seconds", "vad_buffer_max_seconds", 2.0)
         self.speech_detection_threshold = self.cfg.get("speech_detection_threshold", "speech_detection_threshold", 1)
         self.silence_detection_threshold = self.cfg.get("silence_detection_threshold", "silence_detection_threshold", 2)
+        self.vad_preroll_ms = int(self.cfg.get("vad_preroll_ms", "VOSK_VAD_PREROLL_MS", 300))
+        
+        # Utterance segmentation: finalize the Vosk result at each VAD end of speech
+        self.segment_utterances = self.cfg.getboolean("segment_utterances", "VOSK_SEGMENT_UTTERANCES", True)
+        self.final_timeout_ms = int(self.cfg.get("final_timeout_ms", "VOSK_FINAL_TIMEOUT_MS", 1000))
+        
+        # Early endpointing configuration
+        self.early_endpointing = self.cfg.getboolean("early_endpointing", "VOSK_EARLY_ENDPOINTING", True)
+        self.partial_stability_ms = int(self.cfg.get("partial_stability_ms", "VOSK_PARTIAL_STABILITY_MS", 300))
+        self.endpoint_timeout_ms = int(self.cfg.get("endpoint_timeout_ms", "VOSK_ENDPOINT_TIMEOUT_MS", 1500))
 
 
             
         self.tts_server_host = self.cfg.get("host", "TTS_HOST", "localhost")
         self.tts_server_port = int(self.cfg.get("port", "TTS_PORT", 8000))
         self.tts_voice = self.cfg.get("voice", "TTS_VOICE", "tr_TR-fahrettin-medium")
-        self.tts_target_output_rate = 8000  # Target rate for RTP queue is always 8000Hz (PCMU requirement)
-        # We'll determine actual input rate from the first audio chunk received from Piper
+        self.tts_pool_size = int(self.cfg.get("tts_pool_size", "TTS_POOL_SIZE", 4))
+        self.tts_pool_idle_timeout = float(self.cfg.get("tts_pool_idle_timeout", "TTS_POOL_IDLE_TIMEOUT", 60))
+        self.tts_language = get_language(self.cfg.get("language", "TTS_LANGUAGE", self.tts_voice))
+        self.welcome_message = self.cfg.get("welcome_message", "VOSK_WELCOME_MSG")
         
-        logging.info(f"{self.session_id}Vosk URL: {self.vosk_server_url}, Target STT Rate: {self.target_sample_rate}")
-        logging.info(f"{self.session_id}TTS Host: {self.tts_server_host}:{self.tts_server_port}, Voice: {self.tts_voice}")
+        # --- LLM Configuration (any OpenAI compatible server) ---
+        self.llm_base_url = self.cfg.get("llm_base_url", "VOSK_LLM_BASE_URL")
+        self.llm_key = self.cfg.get(["llm_key", "openai_key"], ["VOSK_LLM_KEY", "OPENAI_API_KEY"], "none")
+        self.llm_model = self.cfg.get("llm_model", "VOSK_LLM_MODEL", "gpt-4o-mini")
+        self.llm_instructions = self.cfg.get("llm_instructions", "VOSK_LLM_INSTRUCTIONS")
+        self.llm_context_tokens = int(self.cfg.get("llm_context_tokens", "VOSK_LLM_CONTEXT_TOKENS",
+                                                   DEFAULT_CONTEXT_TOKENS))
+        
+        logger.info(f"Vosk URL: {self.vosk_server_url}, Target STT Rate: {self.target_sample_rate}")
+        logger.info(f"TTS Host: {self.tts_server_host}:{self.tts_server_port}, Voice: {self.tts_voice}")
 
     def _init_components(self, call):
         """Initialize required components
@@ -460,8 +593,7 @@ class VoskSTT(AIEngine):
         # Initialize audio processor
         self.audio_processor = AudioProcessor(
             target_sample_rate=self.target_sample_rate,
-            debug=self.debug,
-            session_id=self.session_id
+            debug=self.debug
         )
         
         # Initialize VAD detector
@@ -480,8 +612,8 @@ class VoskSTT(AIEngine):
             vad_buffer_chunk_ms=self.vad_buffer_chunk_ms,
             speech_detection_threshold=self.speech_detection_threshold,
             silence_detection_threshold=self.silence_detection_threshold,
-            debug=self.debug,
-            session_id=self.session_id
+            preroll_ms=self.vad_preroll_ms,
+            debug=self.debug
         )
         
         # Set speech active if VAD is bypassed
@@ -489,33 +621,114 @@ class VoskSTT(AIEngine):
             self.vad_processor.speech_active = True
         
         # Initialize transcript handler
-        self.transcript_handler = TranscriptHandler(session_id=self.session_id)
+        self.transcript_handler = TranscriptHandler()
         
-        # Initialize Vosk client
+        # Initialize Vosk client; with pooling enabled this placeholder is
+        # replaced by a pre-connected session leased in start()
         self.vosk_client = VoskClient(self.vosk_server_url, timeout=self.websocket_timeout)
+        self.vosk_pool = self._get_vosk_pool(self.cfg) if self.vosk_pool_size > 0 else None
+        self._vosk_session_leased = False
         
         # --- TTS Setup ---
-        # No WebSocket URL setup needed, PiperClient handles this
-        logging.info(f"{self.session_id}Initializing Piper TTS client for {self.tts_server_host}:{self.tts_server_port}")
-        # TTS resampler to be initialized when first TTS chunk arrives
-        self.tts_resampler = None
-        self.tts_input_rate = 22050  # Default Piper sample rate is 22050Hz
-        # Lock to prevent concurrent TTS processing
-        self.tts_processing_lock = asyncio.Lock()
+        # Piper connections are shared by all calls and reused across utterances
+        self.tts_pool = self._get_tts_pool(self.cfg)
+        logger.info(f"Using Piper TTS pool for {self.tts_server_host}:{self.tts_server_port}")
+        # Pipeline of the response being spoken
+        self.tts_pipeline = None
         
         # --- Set Transcript Callback ---
         # When final transcript is received, trigger TTS
         self.transcript_handler.on_final_transcript = self._handle_final_transcript
+        
+        # --- Early endpointing ---
+        # Answers are started speculatively once the VAD detected the end of
+        # speech and the partial transcript is stable, before the final one
+        self.endpointer = None
+        self._speculation = None
+        self.speculation_stats = {"issued": 0, "confirmed": 0, "wasted": 0, "saved_ms": 0}
+        if self.early_endpointing and not self.bypass_vad:
+            self.endpointer = Endpointer(self._on_endpoint, self.partial_stability_ms)
+            self.vad_processor.on_speech_start = self._on_speech_start
+            self.transcript_handler.on_partial_transcript = self._handle_partial_transcript
+        self.vad_processor.on_speech_end = self._on_speech_end
+        
+        # --- Utterance segmentation ---
+        self._finalize_pending = False
+        self._utterance_end = None
 
     def _setup_logging(self):
-        """Set up logging configuration"""
-        # Set default logging level to INFO
-        logging.basicConfig(level=logging.INFO)
-        
-        # Set debug level if enabled
+        """Enable debug logging for this call only, if configured"""
         if self.debug:
-            logging.getLogger().setLevel(logging.DEBUG)
-            logging.debug(f"{self.session_id}Debug logging enabled")
+            self.set_log_level(logging.DEBUG)
+
+    @staticmethod
+    def _get_vosk_pool(cfg):
+        """Return the process-wide Vosk session pool for a configuration
+        
+        Args:
+            cfg: Vosk configuration section
+            
+        Returns:
+            VoskSessionPool: The shared pool for the configured URL and sample rate
+        """
+        return VoskSessionPool.get(
+            cfg.get("url", "url", "ws://localhost:2700"),
+            int(cfg.get("sample_rate", "sample_rate", 16000)),
+            channels=int(cfg.get("channels", "channels", 1)),
+            timeout=float(cfg.get("websocket_timeout", "websocket_timeout", 5.0)),
+            size=int(cfg.get("pool_size", "VOSK_POOL_SIZE", 2)),
+            health_interval=float(cfg.get("pool_health_interval", "VOSK_POOL_HEALTH_INTERVAL", 15)))
+
+    @staticmethod
+    def _get_tts_pool(cfg):
+        """Return the process-wide Piper connection pool for a configuration
+        
+        Args:
+            cfg: Vosk configuration section
+            
+        Returns:
+            PiperClientPool: The shared pool for the configured Piper server
+        """
+        return PiperClientPool.get(
+            cfg.get("host", "TTS_HOST", "localhost"),
+            int(cfg.get("port", "TTS_PORT", 8000)),
+            max_size=int(cfg.get("tts_pool_size", "TTS_POOL_SIZE", 4)),
+            idle_timeout=float(cfg.get("tts_pool_idle_timeout", "TTS_POOL_IDLE_TIMEOUT", 60)))
+
+    @classmethod
+    def preload(cls):
+        """Load and warm up the VAD model and the resampling kernels"""
+        cfg = Config.get("vosk")
+        sample_rate = int(cfg.get("sample_rate", "sample_rate", 16000))
+        VADDetector.preload(sample_rate)
+        # Run the whole inbound path once on a packet of PCMU silence
+        AudioProcessor(sample_rate).process_bytes_audio(b'\xff' * 160)
+        StreamingResampler(cls.tts_input_rate, cls.tts_target_output_rate).process(
+            np.zeros(cls.tts_input_rate // 50, dtype=np.float32))
+
+    @classmethod
+    async def warm_up(cls):
+        """Pre-connect the Vosk and Piper pools before the first call arrives"""
+        cfg = Config.get("vosk")
+        await cls._get_tts_pool(cfg).warm_up()
+        if int(cfg.get("pool_size", "VOSK_POOL_SIZE", 2)) <= 0:
+            return
+        await cls._get_vosk_pool(cfg).warm_up()
+
+    @classmethod
+    def get_prompts(cls):
+        """Return the welcome message, rendered with Piper as PCMU"""
+        cfg = Config.get("vosk")
+        welcome_message = cfg.get("welcome_message", "VOSK_WELCOME_MSG")
+        if not welcome_message:
+            return []
+        tts_pool = cls._get_tts_pool(cfg)
+        voice = cfg.get("voice", "TTS_VOICE", "tr_TR-fahrettin-medium")
+
+        async def synthesize(text, sink):
+            return await cls._render_piper(tts_pool, voice, text, sink)
+
+        return [("piper", voice, "mulaw", welcome_message, synthesize)]
 
     def choose_codec(self, sdp):
         """ SDP içinden PCMU codec'ini seçer """
@@ -527,52 +740,73 @@ class VoskSTT(AIEngine):
 
     async def start(self):
         """STT motoru başlat ve bağlantıyı kur."""
-        logging.info(f"{self.session_id}Vosk sunucusuna bağlanılıyor: {self.vosk_server_url}")
+        logger.info(f"Vosk sunucusuna bağlanılıyor: {self.vosk_server_url}")
+        
+        # A pre-rendered welcome message starts playing with the first packet
+        welcome_played = self.welcome_message and play_prompt(
+            self.queue, "piper", self.tts_voice, self.codec.name, self.welcome_message)
         
         try:
             # Reset closing flag when starting
             self._is_closing = False
             
-            # Connect to Vosk server
-            await self.vosk_client.connect()
-            
-            # Send initial configuration
-            config = {
-                "config": {
-                    "sample_rate": self.target_sample_rate,
-                    "num_channels": self.channels
+            if self.vosk_pool:
+                # Lease a pre-connected session, config already sent
+                client = await self.vosk_pool.acquire()
+                if client is None:
+                    logger.error("No Vosk session available from pool")
+                    return False
+                self.vosk_client = client
+                self._vosk_session_leased = True
+            else:
+                # Connect to Vosk server
+                await self.vosk_client.connect()
+                
+                # Send initial configuration
+                config = {
+                    "config": {
+                        "sample_rate": self.target_sample_rate,
+                        "num_channels": self.channels
+                    }
                 }
-            }
-            await self.vosk_client.send(config)
+                await self.vosk_client.send(config)
             
             # Start transcript receiver task
             self.receive_task = asyncio.create_task(self.receive_transcripts())
             
-            logging.info(f"{self.session_id}Vosk STT motoru başarıyla başlatıldı")
+            if self.welcome_message and not welcome_played:
+                self.tts_task = asyncio.create_task(self._speak(self.welcome_message))
+            
+            logger.info("Vosk STT motoru başarıyla başlatıldı")
             return True
         except Exception as e:
-            logging.error(f"{self.session_id}Vosk motorunu başlatırken hata: {str(e)}")
+            logger.error(f"Vosk motorunu başlatırken hata: {str(e)}")
             return False
     
     async def stop(self):
         """STT motorunu durdur ve bağlantıyı kapat."""
-        logging.info(f"{self.session_id}Vosk STT motoru durduruluyor")
+        logger.info("Vosk STT motoru durduruluyor")
         
         try:
-            # Send EOF if enabled
-            await self._send_eof_if_enabled()
-            
-            # Close WebSocket connection
-            if self.vosk_client.is_connected:
-                await self.vosk_client.disconnect()
-            
-            # Cancel receive task
-            await self._cancel_receive_task()
+            if self.vosk_pool:
+                # Stop reading before handing the session back to the pool
+                await self._cancel_receive_task()
+                self._release_vosk_session()
+            else:
+                # Send EOF if enabled
+                await self._send_eof_if_enabled()
+                
+                # Close WebSocket connection
+                if self.vosk_client.is_connected:
+                    await self.vosk_client.disconnect()
+                
+                # Cancel receive task
+                await self._cancel_receive_task()
             
-            logging.info(f"{self.session_id}Vosk STT motoru başarıyla durduruldu")
+            logger.info("Vosk STT motoru başarıyla durduruldu")
             return True
         except Exception as e:
-            logging.error(f"{self.session_id}Vosk STT motorunu durdururken hata: {str(e)}")
+            logger.error(f"Vosk STT motorunu durdururken hata: {str(e)}")
             return False
 
     async def _manage_task(self, task, timeout=2.0):
@@ -602,16 +836,30 @@ class VoskSTT(AIEngine):
         """Cancel the transcript receive task"""
         await self._manage_task(self.receive_task)
 
+    def _release_vosk_session(self, reuse=True):
+        """Return the leased Vosk session to the pool
+        
+        Args:
+            reuse: Whether the session may be reset and handed to another call
+        """
+        if not self._vosk_session_leased:
+            return
+        client = self.vosk_client
+        # Leave an unconnected placeholder so late audio is dropped
+        self.vosk_client = VoskClient(self.vosk_server_url, timeout=self.websocket_timeout)
+        self._vosk_session_leased = False
+        self.vosk_pool.release(client, reuse=reuse)
+
     async def _send_eof_if_enabled(self):
         """Send EOF to Vosk if enabled"""
         if self.send_eof and self.vosk_client.is_connected:
             try:
-                logging.debug(f"{self.session_id}Vosk'a EOF işareti gönderiliyor")
-                await self.vosk_client.send(json.dumps({"eof": 1}))
+                logger.debug("Vosk'a EOF işareti gönderiliyor")
+                await self.vosk_client.send(VOSK_EOF_MESSAGE)
                 # Sunucunun EOF'u işlemesi için kısa bir süre bekle
                 await asyncio.sleep(0.1)
             except Exception as e:
-                logging.error(f"{self.session_id}EOF gönderirken hata: {str(e)}")
+                logger.error(f"EOF gönderirken hata: {str(e)}")
 
     async def process_audio(self, audio_data):
         """Ses verisini işle ve Vosk'a gönder
@@ -623,7 +871,7 @@ class VoskSTT(AIEngine):
             bool: İşleme başarılı olduysa True
         """
         if not self.vosk_client.is_connected:
-            logging.warning(f"{self.session_id}Ses verisini işleyemiyorum: Vosk ile bağlantı kurulamadı")
+            logger.warning("Ses verisini işleyemiyorum: Vosk ile bağlantı kurulamadı")
             return False
             
         try:
@@ -631,13 +879,13 @@ class VoskSTT(AIEngine):
             await self.vosk_client.send_audio(audio_data)
             return True
         except Exception as e:
-            logging.error(f"{self.session_id}Ses verisini işlerken hata: {str(e)}")
+            logger.error(f"Ses verisini işlerken hata: {str(e)}")
             return False
 
     async def send(self, audio):
         """Sends audio to Vosk"""
         if not self.vosk_client.is_connected:
-            logging.warning(f"{self.session_id}WebSocket not connected, cannot send audio")
+            logger.warning("WebSocket not connected, cannot send audio")
             return
             
         try:
@@ -650,11 +898,11 @@ class VoskSTT(AIEngine):
                 await self._handle_processed_audio(resampled_tensor, audio_bytes)
             else:
                 # Log a warning if the input is not bytes, as this shouldn't happen
-                logging.warning(f"{self.session_id}Unexpected audio type received: {type(audio)}, expected bytes. Skipping.")
+                logger.warning(f"Unexpected audio type received: {type(audio)}, expected bytes. Skipping.")
                 
         except Exception as e:
-            logging.error(f"{self.session_id}Error sending audio to Vosk: {str(e)}")
-            logging.error(f"{self.session_id}Exception details: {traceback.format_exc()}")
+            logger.error(f"Error sending audio to Vosk: {str(e)}")
+            logger.error(f"Exception details: {traceback.format_exc()}")
 
     async def _handle_processed_audio(self, tensor, audio_bytes):
         """Handle processed audio
@@ -664,13 +912,16 @@ class VoskSTT(AIEngine):
             audio_bytes: Processed audio bytes
         """
         # DETAILED LOG 5: Bytes entering _handle_processed_audio
-        logging.debug(f"{self.session_id}Handling processed audio: {len(audio_bytes)} bytes")
+        verbose = logger.isEnabledFor(logging.DEBUG)
+        if verbose:
+            logger.debug("Handling processed audio: %d bytes", len(audio_bytes))
         
         if self.bypass_vad:
             # In bypass mode, send directly to Vosk
             # DETAILED LOG 6: Bytes just before sending (VAD bypassed)
-            hex_preview = ' '.join([f'{b:02x}' for b in audio_bytes[:20]])
-            logging.debug(f"{self.session_id}Sending audio bytes directly (VAD bypassed): len={len(audio_bytes)}, start_hex={hex_preview}")
+            if verbose:
+                logger.debug("Sending audio bytes directly (VAD bypassed): len=%d, start_hex=%s",
+                             len(audio_bytes), audio_bytes[:20].hex(' '))
             await self.vosk_client.send_audio(audio_bytes)
         else:
             # Add to VAD buffer for speech detection
@@ -680,9 +931,15 @@ class VoskSTT(AIEngine):
             # If buffer was processed and speech detected, send to Vosk
             if was_processed and is_speech and buffer_bytes:
                 # DETAILED LOG 7: Bytes just before sending (after VAD)
-                hex_preview_vad = ' '.join([f'{b:02x}' for b in buffer_bytes[:20]])
-                logging.debug(f"{self.session_id}Sending VAD buffer bytes: len={len(buffer_bytes)}, start_hex={hex_preview_vad}")
+                if verbose:
+                    logger.debug("Sending VAD buffer bytes: len=%d, start_hex=%s",
+                                 len(buffer_bytes), buffer_bytes[:20].hex(' '))
                 await self.vosk_client.send_audio(buffer_bytes)
+            
+            # Finalize the utterance at the VAD end of speech
+            if self._finalize_pending:
+                self._finalize_pending = False
+                await self._finalize_utterance()
 
     async def receive_transcripts(self):
         """Vosk'dan transcript alır ve callback fonksiyonlarını çağırır"""
@@ -696,22 +953,22 @@ class VoskSTT(AIEngine):
                     message = await self.vosk_client.receive_result()
                     
                     if self.debug:
-                        logging.debug(f"{self.session_id}Vosk yanıtı alındı: {message}")
+                        logger.debug("Vosk yanıtı alındı: %s", message)
                     
                     if message is None:
                         # This usually means a timeout occurred in receive_result, 
                         # which is normal during periods of silence.
                         # Log at DEBUG level instead of WARNING.
-                        logging.debug(f"{self.session_id}Timeout or no new message from Vosk (normal during silence).") 
-                        # logging.warning(f"{self.session_id}Vosk'dan boş yanıt alındı") # Old warning
+                        logger.debug("Timeout or no new message from Vosk (normal during silence).") 
+                        # logger.warning("Vosk'dan boş yanıt alındı") # Old warning
                         
                         # Check if the connection is still valid
                         if not self.vosk_client.is_connected:
-                            logging.error(f"{self.session_id}WebSocket connection lost during transcript reception")
+                            logger.error("WebSocket connection lost during transcript reception")
                             
                             # Don't try to reconnect if we're closing
                             if self._is_closing or self.call.terminated:
-                                logging.info(f"{self.session_id}Session is closing, not attempting to reconnect")
+                                logger.info("Session is closing, not attempting to reconnect")
                                 break
                                 
                             # Try to reconnect
@@ -721,7 +978,7 @@ class VoskSTT(AIEngine):
                             else:
                                 reconnect_attempts += 1
                                 if reconnect_attempts >= max_reconnect_attempts:
-                                    logging.error(f"{self.session_id}Maximum reconnection attempts reached. Giving up.")
+                                    logger.error("Maximum reconnection attempts reached. Giving up.")
                                     break
                         continue
                     
@@ -734,15 +991,15 @@ class VoskSTT(AIEngine):
                 except websockets.exceptions.ConnectionClosed as conn_err:
                     # 1000 kodu normal kapatma, 1001 "going away"
                     if conn_err.code in (1000, 1001) and self.call.terminated:
-                        logging.info(f"{self.session_id}WebSocket bağlantısı normal şekilde kapandı: {conn_err.code}")
+                        logger.info(f"WebSocket bağlantısı normal şekilde kapandı: {conn_err.code}")
                         break  # Çağrı sonlandırıldıysa ve bağlantı normal kapandıysa döngüden çık
                     
                     # Don't try to reconnect if we're closing
                     if self._is_closing or self.call.terminated:
-                        logging.info(f"{self.session_id}Session is closing, not attempting to reconnect after connection closed with code {conn_err.code}")
+                        logger.info(f"Session is closing, not attempting to reconnect after connection closed with code {conn_err.code}")
                         break
                     
-                    logging.error(f"{self.session_id}WebSocket connection closed: {conn_err}")
+                    logger.error(f"WebSocket connection closed: {conn_err}")
                     self.vosk_client.is_connected = False
                     
                     # Try to reconnect
@@ -752,15 +1009,15 @@ class VoskSTT(AIEngine):
                     else:
                         reconnect_attempts += 1
                         if reconnect_attempts >= max_reconnect_attempts:
-                            logging.error(f"{self.session_id}Maximum reconnection attempts reached. Giving up.")
+                            logger.error("Maximum reconnection attempts reached. Giving up.")
                             break
                 
         except asyncio.CancelledError:
-            logging.info(f"{self.session_id}Transkript alma görevi iptal edildi")
+            logger.info("Transkript alma görevi iptal edildi")
             raise
         except Exception as e:
-            logging.error(f"{self.session_id}Transkript alırken beklenmeyen hata: {str(e)}")
-            logging.error(f"{self.session_id}Traceback: {traceback.format_exc()}")
+            logger.error(f"Transkript alırken beklenmeyen hata: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
             
             # Close WebSocket if still connected
             if self.vosk_client.is_connected:
@@ -780,18 +1037,30 @@ class VoskSTT(AIEngine):
             bool: True if reconnection was successful
         """
         if attempts >= max_attempts:
-            logging.error(f"{self.session_id}Maximum reconnection attempts ({max_attempts}) reached. Giving up.")
+            logger.error(f"Maximum reconnection attempts ({max_attempts}) reached. Giving up.")
             return False
             
         attempt_number = attempts + 1
         backoff_time = min(2 * attempt_number, 10)
             
-        logging.info(f"{self.session_id}Attempting to reconnect to Vosk server... (attempt {attempt_number}/{max_attempts})")
+        logger.info(f"Attempting to reconnect to Vosk server... (attempt {attempt_number}/{max_attempts})")
         
         try:
-            reconnected = await self.vosk_client.connect()
+            if self.vosk_pool:
+                # Drop the broken session and lease a fresh one from the pool
+                self._release_vosk_session(reuse=False)
+                client = await self.vosk_pool.acquire()
+                if client is not None:
+                    self.vosk_client = client
+                    self._vosk_session_leased = True
+                    self._is_closing = False
+                    logger.info("Leased a new Vosk session from pool")
+                    return True
+                reconnected = False
+            else:
+                reconnected = await self.vosk_client.connect()
             if reconnected:
-                logging.info(f"{self.session_id}Successfully reconnected to Vosk server")
+                logger.info("Successfully reconnected to Vosk server")
                 
                 # Reset closing flag when reconnecting successfully
                 self._is_closing = False
@@ -806,21 +1075,21 @@ class VoskSTT(AIEngine):
                 await self.vosk_client.send(config)
                 return True
             else:
-                logging.error(f"{self.session_id}Failed to reconnect to Vosk server")
+                logger.error("Failed to reconnect to Vosk server")
         except Exception as reconnect_error:
-            logging.error(f"{self.session_id}Error during reconnection attempt: {reconnect_error}")
+            logger.error(f"Error during reconnection attempt: {reconnect_error}")
         
         # If we got here, reconnection failed
-        logging.info(f"{self.session_id}Waiting {backoff_time} seconds before next attempt")
+        logger.info(f"Waiting {backoff_time} seconds before next attempt")
         await asyncio.sleep(backoff_time)
         return False
 
     async def close(self):
         """Closes the VoskSTT session"""
         if self._is_closing:
-            logging.info(f"{self.session_id}Close already in progress.")
+            logger.info("Close already in progress.")
             return
-        logging.info(f"{self.session_id}Closing VoskSTT+TTS session")
+        logger.info("Closing VoskSTT+TTS session")
         
         # Set closing flag to prevent reconnection attempts
         self._is_closing = True
@@ -828,30 +1097,48 @@ class VoskSTT(AIEngine):
         # 1. Cancel ongoing TTS tasks if any
         if hasattr(self, 'tts_task') and self.tts_task and not self.tts_task.done():
             self.tts_task.cancel()
-            logging.info(f"{self.session_id}Cancelling active TTS task.")
+            logger.info("Cancelling active TTS task.")
+        if self.tts_pipeline:
+            self.tts_pipeline.cancel()
+        if self.endpointer:
+            self.endpointer.close()
+            stats = self.speculation_stats
+            logger.info(f"Speculative answers: {stats['issued']} issued, {stats['confirmed']} confirmed, "
+                         f"{stats['wasted']} wasted, {stats['saved_ms']} ms saved")
+        self.llm.delete_call(self.b2b_key)
         
         # 2. Process any remaining audio in VAD buffer
         if not self.bypass_vad:
             try:
                 await self._process_final_vad_buffer()
             except Exception as e:
-                logging.error(f"{self.session_id}Error processing final VAD buffer: {e}")
+                logger.error(f"Error processing final VAD buffer: {e}")
         
         # 3. Use last partial as final if no final transcript
         self._finalize_transcript()
         
-        # 4. Send EOF and close Vosk connection
-        if self.vosk_client.is_connected:
+        # 4. Return the session to the pool, or send EOF and close Vosk connection
+        if self.vosk_pool:
+            # Stop the receiver first so it does not consume the reset reply
+            if self.receive_task and not self.receive_task.done():
+                self.receive_task.cancel()
+                try:
+                    await self.receive_task
+                except asyncio.CancelledError:
+                    pass
+            self._release_vosk_session()
+            logger.info("Released Vosk session to pool")
+        elif self.vosk_client.is_connected:
             try:
                 if self.send_eof:
-                    logging.debug(f"{self.session_id}Sending EOF to Vosk")
-                    await self.vosk_client.send(json.dumps({"eof": 1}))
+                    logger.debug("Sending EOF to Vosk")
+                    await self.vosk_client.send(VOSK_EOF_MESSAGE)
                     # Give server time to process EOF
                     await asyncio.sleep(0.2)
                 await self.vosk_client.disconnect()
-                logging.info(f"{self.session_id}Disconnected from Vosk")
+                logger.info("Disconnected from Vosk")
             except Exception as e:
-                logging.error(f"{self.session_id}Error disconnecting from Vosk: {e}")
+                logger.error(f"Error disconnecting from Vosk: {e}")
         
         # 5. Cancel Vosk receive task
         if self.receive_task and not self.receive_task.done():
@@ -859,37 +1146,42 @@ class VoskSTT(AIEngine):
             try:
                 await self.receive_task
             except asyncio.CancelledError:
-                logging.info(f"{self.session_id}Vosk receive task cancelled")
+                logger.info("Vosk receive task cancelled")
             except Exception as e:
-                logging.error(f"{self.session_id}Error cancelling Vosk receive task: {e}")
+                logger.error(f"Error cancelling Vosk receive task: {e}")
         
         # 6. TTS client uses websockets context manager, no explicit closing needed
         
-        logging.info(f"{self.session_id}VoskSTT+TTS session closed successfully")
+        logger.info("VoskSTT+TTS session closed successfully")
+        if self.b2b_key:
+            clear_call_level(self.b2b_key)
 
     def _finalize_transcript(self):
         """Ensure we have a final transcript (use partial if no final available)"""
         if not self.transcript_handler.last_final_transcript and self.transcript_handler.last_partial_transcript:
-            logging.info(f"{self.session_id}No final transcript received, using last partial as final: {self.transcript_handler.last_partial_transcript[:50]}...")
+            logger.info(f"No final transcript received, using last partial as final: {self.transcript_handler.last_partial_transcript[:50]}...")
             self.transcript_handler.last_final_transcript = self.transcript_handler.last_partial_transcript
         
         # Log final transcript
         if self.transcript_handler.last_final_transcript:
-            logging.info(f"{self.session_id}Final transcript result: {self.transcript_handler.last_final_transcript}")
+            logger.info(f"Final transcript result: {self.transcript_handler.last_final_transcript}")
 
     def terminate_call(self):
         """ Terminates the call """
-        logging.info(f"{self.session_id}Terminating call")
+        logger.info("Terminating call")
         self.call.terminated = True
 
     def set_log_level(self, level):
-        """Sets the logging level
+        """Sets the logging level of this call, leaving the other calls alone
         
         Args:
             level: The logging level (e.g. logging.INFO, logging.DEBUG)
         """
-        logging.getLogger().setLevel(level)
-        logging.info(f"{self.session_id}Set logging level to {logging._levelToName.get(level, level)}")
+        if self.b2b_key:
+            set_call_level(self.b2b_key, level)
+        else:
+            logging.getLogger().setLevel(level)
+        logger.info(f"Set logging level to {logging.getLevelName(level)}")
         
         # Update debug flag if setting to DEBUG
         if level == logging.DEBUG:
@@ -918,8 +1210,8 @@ class VoskSTT(AIEngine):
                 async def track_partial(text):
                     nonlocal last_partial
                     last_partial = text
-                    logging.info(f"{self.session_id}Got partial after final buffer: {text[:50]}...")
-                    logging.info(f"{self.session_id}Complete partial result after final buffer: {text}")
+                    logger.info(f"Got partial after final buffer: {text[:50]}...")
+                    logger.info(f"Complete partial result after final buffer: {text}")
                     
                     # Call original handler
                     if original_on_partial and callable(original_on_partial):
@@ -932,14 +1224,15 @@ class VoskSTT(AIEngine):
                 if is_speech:
                     await self.vosk_client.send_audio(buffer_bytes)
                 
-                # Wait briefly for response
-                wait_time = min(buffer_seconds * 0.4 + 0.2, 0.5)  # Max 0.5 seconds
-                logging.info(f"{self.session_id}Waiting {wait_time:.2f} seconds for final response...")
-                await asyncio.sleep(wait_time)
+                # Finalize the utterance and wait for its result, up to a deadline
+                got_final = False
+                if await self._finalize_utterance():
+                    logger.info(f"Waiting up to {self.final_timeout_ms} ms for final response ({buffer_seconds:.2f}s buffered)...")
+                    got_final = await self.transcript_handler.wait_for_final(self.final_timeout_ms / 1000)
                 
                 # Use last partial as final
-                if last_partial and original_on_final and callable(original_on_final):
-                    logging.info(f"{self.session_id}Using last partial as final: {last_partial[:50]}...")
+                if not got_final and last_partial and original_on_final and callable(original_on_final):
+                    logger.info(f"Using last partial as final: {last_partial[:50]}...")
                     self.transcript_handler.last_final_transcript = last_partial
                     await original_on_final(last_partial)
                 
@@ -948,7 +1241,7 @@ class VoskSTT(AIEngine):
                 self.transcript_handler.on_final_transcript = original_on_final
                 
         except Exception as e:
-            logging.error(f"{self.session_id}Error handling final buffer: {e}")
+            logger.error(f"Error handling final buffer: {e}")
 
     def get_final_transcript(self):
         """Son tanınan final transkript metnini döndürür.
@@ -959,149 +1252,267 @@ class VoskSTT(AIEngine):
         return self.transcript_handler.get_final_transcript()
 
     async def _handle_final_transcript(self, final_text):
-        """Handles final transcript: Gets LLM response, sends to TTS, converts, queues audio."""
-        # Prevent multiple TTS requests running concurrently
-        async with self.tts_processing_lock:
-            logging.info(f"{self.session_id}Final transcript for TTS: '{final_text}'")
-            
-            # 1. Get LLM Response (Simulated)
-            # PLACEHOLDER: Replace with actual LLM call
-            turkish_sentences = [
-                "Merhaba, size nasıl yardımcı olabilirim? Bu konuşma sistemimiz sayesinde isteklerinizi sesli olarak iletebilirsiniz. Ben sizin sorularınızı yanıtlamak, bilgi vermek ve çeşitli işlemlerinizi gerçekleştirmek için buradayım. Herhangi bir konuda yardıma ihtiyacınız olursa lütfen belirtin. Size en iyi şekilde yardımcı olmak için elimden geleni yapacağım. Sesli asistanınız olarak size hizmet vermekten mutluluk duyuyorum.", 
-                "Lütfen isteğinizi belirtin. Sorularınızı mümkün olduğunca açık ve net bir şekilde ifade ederseniz size daha doğru ve hızlı bir şekilde yardımcı olabilirim. Detaylı bilgiye ihtiyacım olursa ek sorular sorabilirim. İhtiyacınızı tam olarak anlayabilmem için gerekli tüm detayları paylaşmanız önemlidir. Karmaşık konularda adım adım ilerlememiz gerekebilir. Hangi konuda yardıma ihtiyacınız olduğunu lütfen anlatın.",
-                "Anlıyorum, isteğiniz işleniyor. Bu işlem birkaç saniye sürebilir, lütfen sabırla bekleyin. Sisteme erişim sağlanıyor ve gerekli bilgiler toplanıyor. Bilgileriniz güvenli bir şekilde işleniyor ve işlem süreci devam ediyor. İşlem tamamlandığında size hemen bilgi vereceğim. Eğer ek bilgiye ihtiyacımız olursa, sizinle tekrar iletişime geçeceğim. Bu süreçte başka bir sorunuz veya isteğiniz olursa lütfen belirtin.", 
-                "Bir saniye lütfen, kontrol ediyorum. Talebiniz doğrultusunda sistem kayıtlarına erişiyor ve gerekli bilgileri topluyorum. Bu işlem biraz zaman alabilir, sistem yanıt verene kadar lütfen bekleyin. Veritabanımızda arama yapılıyor ve ilgili bilgiler toplanıyor. Arama algoritması en güncel ve doğru bilgileri bulmak için çalışıyor. Sorgulama işlemi tamamlanmak üzere, sonuçları hemen sizinle paylaşacağım.",
-                "İşleminiz başarıyla tamamlandı. Talebiniz sistem tarafından onaylandı ve gerekli tüm adımlar yerine getirildi. Herhangi bir sorun veya hata tespit edilmedi. İşleminize dair tüm detaylar kayıt altına alındı ve sistem güncellemesi gerçekleştirildi. Değişiklikler şu andan itibaren aktif ve geçerlidir. İsterseniz işleminizle ilgili detaylı bir rapor sunabilirim. İşlem sonucu memnun kaldıysanız, size başka konularda da yardımcı olabilirim.", 
-                "Başka bir isteğiniz var mı? Size farklı bir konuda da yardımcı olmaktan memnuniyet duyarım. Ek sorularınız veya bilgi almak istediğiniz başka konular varsa lütfen belirtin. Önceki işleminizle ilgili herhangi bir ek bilgiye ihtiyacınız varsa, detaylandırmaktan çekinmeyin. Sistemimizin sunduğu diğer hizmetler hakkında bilgi almak isterseniz bunu da sağlayabilirim. Her türlü talebiniz için buradayım ve size yardımcı olmak için hazırım. Lütfen nasıl yardımcı olabileceğimi belirtin.",
-                "Üzgünüm, isteğinizi anlayamadım. Kullandığınız ifade veya soru formatı sistemimiz tarafından doğru şekilde işlenemedi. Farklı bir şekilde ifade etmeyi veya daha açık bir dille talep oluşturmayı deneyebilirsiniz. Bazı özel terimler veya teknik ifadeler bazen zorluk yaratabilir, bu durumda daha genel terimler kullanmanız daha iyi olabilir. Konuşma tanıma sistemi bazen arka plan gürültüsünden veya ses kalitesinden etkilenebilir. Talebinizi daha net ve yavaş bir şekilde tekrarlamanız yardımcı olabilir.", 
-                "Tekrar deneyebilir misiniz? Son talebiniz ses tanıma sistemimiz tarafından tam olarak algılanamadı veya anlaşılamadı. Lütfen daha yüksek sesle ve net bir şekilde konuşmayı deneyiniz. Bulunduğunuz ortamda ses kalitesini etkileyebilecek gürültüler varsa, daha sessiz bir ortama geçmek faydalı olabilir. Bazen belirli cümle yapıları veya terimler sistemimiz için zorlayıcı olabilir, bu durumda talebinizi daha basit bir dille ifade etmeyi deneyebilirsiniz. Birkaç kelime ile kısa ve öz bir şekilde ne istediğinizi belirtmek de yardımcı olabilir.",
-                "Yardımcı olabileceğim başka bir konu var mı? Bugün sizin için başka hangi işlemleri gerçekleştirebilirim? Sistemimiz birçok farklı konuda hizmet sunmaktadır ve sizin için daha fazla bilgi sağlamaktan veya farklı konularda yardımcı olmaktan memnuniyet duyarım. Hesap işlemleri, bilgi sorgulama, randevu oluşturma veya iptal etme gibi çeşitli hizmetlerimizden faydalanabilirsiniz. Ayrıca ürünlerimiz ve hizmetlerimiz hakkında detaylı bilgi almak isterseniz, bu konuda da size kapsamlı bilgi sunabilirim. İhtiyaçlarınız doğrultusunda size en iyi şekilde yardımcı olmak için buradayım.", 
-                "Görüşmek üzere, iyi günler! Bugün bizi tercih ettiğiniz ve hizmetimizden yararlandığınız için teşekkür ederiz. Umarım tüm sorularınıza tatmin edici yanıtlar alabilmişsinizdir. Tekrar görüşmek dileğiyle, size güzel ve verimli bir gün diliyorum. Herhangi bir sorunuz veya ihtiyacınız olduğunda tekrar bizi aramanız yeterli olacaktır. Sizinle tekrar görüşmeyi umuyoruz. Her zaman hizmetinizdeyiz. Bizden tekrar yardım almak istediğinizde çağrı merkezimizi arayabilir veya web sitemiz üzerinden bizimle iletişime geçebilirsiniz. Kendinize iyi bakın!",
-            ]
-            llm_response_text = random.choice(turkish_sentences)
-            logging.info(f"{self.session_id}Simulated LLM response: '{llm_response_text}'")
+        """Handles final transcript: starts a new answer, interrupting the current one"""
+        if self._is_closing:
+            return
+        if self._utterance_end is not None:
+            logger.info(f"Final transcript {int((time.monotonic() - self._utterance_end) * 1000)} ms after end of speech")
+            self._utterance_end = None
+        if self.endpointer:
+            self.endpointer.on_final()
+        spec = self._speculation
+        if spec and spec.awaiting_final:
+            spec.awaiting_final = False
+            # an answer that was interrupted before being confirmed is redone
+            if same_utterance(spec.text, final_text) and (spec.confirmed.is_set() or not spec.task.done()):
+                saved_ms = int((time.monotonic() - spec.started) * 1000)
+                self.speculation_stats["saved_ms"] += saved_ms
+                logger.info(f"Speculative answer matches the final transcript, saved {saved_ms} ms")
+                spec.final_text = final_text
+                self._confirm_speculation(spec)
+                return
+            self._discard_speculation(spec, f"final transcript differs: '{final_text}'")
+        self._cancel_answer()
+        self.tts_task = asyncio.create_task(self._answer(final_text))
+
+    async def _handle_partial_transcript(self, partial_text):
+        """Tracks the stability of the partial transcript"""
+        self.endpointer.on_partial(partial_text)
+
+    def _on_speech_start(self):
+        """Called by the VAD: the caller (again) started speaking"""
+        self.endpointer.on_speech_start()
+        spec = self._speculation
+        if spec and not spec.confirmed.is_set():
+            self._discard_speculation(spec, "caller kept speaking")
+            self._cancel_answer()
+
+    def _on_speech_end(self):
+        """Called by the VAD: the caller stopped speaking"""
+        if self.endpointer:
+            self.endpointer.on_speech_end()
+        if self.segment_utterances:
+            # Finalized once the current chunk has been handled
+            self._finalize_pending = True
+
+    async def _finalize_utterance(self):
+        """Asks Vosk for the final result of the utterance right away
+        
+        The session is reset instead of closed, so the next utterance is
+        recognized on the same connection.
+        """
+        self.transcript_handler.final_received.clear()
+        self._utterance_end = time.monotonic()
+        if not await self.vosk_client.send_reset():
+            self._utterance_end = None
+            return False
+        return True
+
+    def _on_endpoint(self, partial_text):
+        """Called once the caller seems done: answers the partial transcript speculatively"""
+        if self._is_closing:
+            return
+        self._cancel_answer()
+        spec = Speculation(partial_text)
+        self._speculation = spec
+        self.speculation_stats["issued"] += 1
+        logger.info(f"Speculative answer for '{partial_text}'")
+        # Without a final transcript in time, the partial one is trusted
+        spec.timer = asyncio.get_running_loop().call_later(
+            self.endpoint_timeout_ms / 1000, self._confirm_speculation, spec)
+        self.tts_task = spec.task = asyncio.create_task(self._answer(partial_text, spec))
 
-            # NOW reset VAD state AFTER getting LLM response but BEFORE TTS processing
+    def _confirm_speculation(self, spec):
+        """Lets a speculative answer be spoken"""
+        if spec.confirmed.is_set():
+            return
+        spec.timer.cancel()
+        spec.confirmed.set()
+        self.speculation_stats["confirmed"] += 1
+        if spec.awaiting_final:
+            logger.info(f"No final transcript after {self.endpoint_timeout_ms} ms, speaking the speculative answer")
+
+    def _discard_speculation(self, spec, reason):
+        """Accounts for a speculative answer that must not be spoken"""
+        spec.timer.cancel()
+        if self._speculation is spec:
+            self._speculation = None
+        self.speculation_stats["wasted"] += 1
+        stats = self.speculation_stats
+        logger.info(f"Speculative answer wasted ({reason}); "
+                     f"{stats['wasted']}/{stats['issued']} wasted, {stats['saved_ms']} ms saved so far")
+
+    def interrupt(self):
+        """Called on barge-in: drops the answer being generated or spoken"""
+        self._cancel_answer()
+
+    def _cancel_answer(self):
+        """Stops generating and speaking the current answer"""
+        if self.tts_pipeline:
+            self.tts_pipeline.cancel()
+        if self.tts_task and not self.tts_task.done():
+            logger.info("Interrupting the current answer")
+            self.tts_task.cancel()
+
+    def _drain_queue(self):
+        """Drops the audio waiting to be played"""
+        # Avoid playing TTS over residual user speech or previous TTS fragments
+        q_size = self.queue.qsize()
+        if q_size > 0:
+            logger.info(f"Draining {q_size} packets from RTP queue before TTS playback.")
+            while not self.queue.empty():
+                try:
+                    self.queue.get_nowait()
+                except Empty:
+                    break
+
+    async def _answer(self, final_text, speculation=None):
+        """Streams the LLM answer of a transcript to TTS, sentence by sentence
+        
+        Args:
+            final_text: Final transcript of the caller's utterance
+            speculation: For speculative answers, the Speculation whose
+                confirmation lets the answer be spoken; the generated
+                sentences are held until then
+        """
+        confirmed = speculation.confirmed if speculation else None
+        logger.info(f"Final transcript for LLM: '{final_text}'")
+        
+        # Each sentence is synthesized as soon as the LLM completes it, and
+        # played while the following ones are being generated
+        pipeline = None
+        held = []
+        answer = []
+        chunker = SentenceChunker(self.tts_language)
+        
+        def start_speaking():
+            nonlocal pipeline
+            # Reset VAD state before the answer is spoken
             if not self.bypass_vad:
                 self.vad_processor.reset_vad_state(preserve_buffer=False)
-                logging.info(f"{self.session_id}VAD state reset after LLM response, before TTS processing")
+                logger.info("VAD state reset before TTS processing")
+            self._drain_queue()
+            synthesize = cached(self._synthesize_chunk, "piper", self.tts_voice, self.codec.name)
+            pipeline = self.tts_pipeline = SpeechPipeline(synthesize, self.queue)
+            for chunk in held:
+                pipeline.push(chunk)
+            held.clear()
+        
+        def push(chunks):
+            if pipeline is None and (confirmed is None or confirmed.is_set()):
+                start_speaking()
+            if pipeline is None:
+                held.extend(chunks)
+            else:
+                for chunk in chunks:
+                    pipeline.push(chunk)
+        
+        try:
+            async for delta in self.llm.stream(self.b2b_key, final_text, commit=confirmed is None):
+                answer.append(delta)
+                push(chunker.feed(delta))
+            push(chunker.flush())
+            if pipeline is None:
+                await confirmed.wait()
+                start_speaking()
+            pipeline.finish()
+            await pipeline.wait()
+            logger.info(f"Queued {pipeline.packets} packets of TTS audio")
+        except asyncio.CancelledError:
+            if pipeline:
+                pipeline.cancel()
+            raise
+        except Exception as e:
+            if pipeline:
+                pipeline.cancel()
+            logger.error(f"Error answering '{final_text}': {e}", exc_info=True)
+        finally:
+            # Speculative exchanges only enter the context once confirmed,
+            # with the final transcript when it matched the partial one
+            if confirmed is not None and confirmed.is_set():
+                user_text = speculation.final_text or final_text
+                self.llm.add_exchange(self.b2b_key, user_text, "".join(answer))
 
-            # --- Drain RTP queue before playing TTS ---
-            # Avoid playing TTS over residual user speech or previous TTS fragments
-            q_size = self.queue.qsize()
-            if q_size > 0:
-                logging.info(f"{self.session_id}Draining {q_size} packets from RTP queue before TTS playback.")
-                while not self.queue.empty():
-                    try:
-                        self.queue.get_nowait()
-                    except Empty:
-                        break
-            # --- End Drain ---
+    async def _speak(self, text):
+        """Synthesizes a text and queues its audio for playback
+        
+        The first chunk is played while the following ones are being synthesized.
+        
+        Args:
+            text: Text to speak
+        """
+        synthesize = cached(self._synthesize_chunk, "piper", self.tts_voice, self.codec.name)
+        self.tts_pipeline = SpeechPipeline(synthesize, self.queue)
+        for chunk in split_text(text, self.tts_language):
+            self.tts_pipeline.push(chunk)
+        self.tts_pipeline.finish()
+        try:
+            await self.tts_pipeline.wait()
+            logger.info(f"Queued {self.tts_pipeline.packets} packets of TTS audio")
+        except Exception as e:
+            logger.error(f"Error during TTS processing: {e}", exc_info=True)
 
-            # 2. Connect to TTS service and process audio stream using PiperClient
-            tts_success = False
-            try:
-                # Create Piper client instance
-                piper_client = PiperClient(
-                    server_host=self.tts_server_host,
-                    server_port=self.tts_server_port,
-                    session_id=self.session_id
-                )
-                
-                # Set up audio handling callback
-                cumulative_pcmu_bytes = bytearray()
-                chunk_size = 160  # 20ms at 8kHz
-                
-                # Flag to track first audio chunk for resampler initialization
-                first_audio_chunk = True
-                
-                # Audio handling callback - MAKE THIS ASYNC
-                async def on_audio(audio_bytes):
-                    nonlocal cumulative_pcmu_bytes, first_audio_chunk
-                    
-                    try:
-                        # Initialize resampler on first audio chunk if needed
-                        if first_audio_chunk:
-                            first_audio_chunk = False
-                            
-                            # Create resampler if needed
-                            if self.tts_resampler is None and self.tts_input_rate != self.tts_target_output_rate:
-                                logging.info(f"{self.session_id}Initializing TTS resampler: {self.tts_input_rate}Hz -> {self.tts_target_output_rate}Hz")
-                                self.tts_resampler = torchaudio.transforms.Resample(
-                                    orig_freq=self.tts_input_rate,
-                                    new_freq=self.tts_target_output_rate
-                                )
-                            else:
-                                logging.info(f"{self.session_id}TTS output rate matches target rate ({self.tts_target_output_rate}Hz). No resampling needed.")
-                        
-                        # Process audio chunk
-                        # a. Convert bytes to tensor (S16LE PCM to float32 tensor)
-                        input_tensor = torch.frombuffer(bytearray(audio_bytes), dtype=torch.int16).float() / 32768.0
-                        
-                        # b. Resample if needed
-                        if self.tts_resampler:
-                            resampled_tensor = self.tts_resampler(input_tensor.unsqueeze(0)).squeeze(0)
-                        else:
-                            resampled_tensor = input_tensor  # No resampling needed
-                        
-                        # c. Convert tensor back to S16LE PCM bytes
-                        resampled_tensor_clamped = torch.clamp(resampled_tensor, -1.0, 1.0)
-                        pcm_s16le_bytes = (resampled_tensor_clamped * 32768.0).to(torch.int16).numpy().tobytes()
-                        
-                        # d. Convert S16LE PCM to PCMU (μ-law)
-                        pcmu_chunk_bytes = audioop.lin2ulaw(pcm_s16le_bytes, 2)
-                        cumulative_pcmu_bytes.extend(pcmu_chunk_bytes)
-                        
-                        # e. Queue audio in RTP-sized chunks (160 bytes = 20ms at 8kHz)
-                        while len(cumulative_pcmu_bytes) >= chunk_size:
-                            rtp_payload = cumulative_pcmu_bytes[:chunk_size]
-                            self.queue.put_nowait(bytes(rtp_payload))
-                            logging.debug(f"{self.session_id}Queued {len(rtp_payload)} bytes of TTS audio for RTP.")
-                            # Remove queued data from buffer
-                            cumulative_pcmu_bytes = cumulative_pcmu_bytes[chunk_size:]
-                            
-                            # Yield control occasionally to allow other tasks to run
-                            await asyncio.sleep(0)
-                            
-                    except Exception as audio_e:
-                        logging.error(f"{self.session_id}Error processing TTS audio: {audio_e}", exc_info=True)
-                
-                # Status callbacks - Make these async too
-                async def on_start(data):
-                    logging.info(f"{self.session_id}TTS stream starting: {data.get('message')}")
-                    
-                async def on_end(data):
-                    nonlocal tts_success
-                    tts_success = True
-                    logging.info(f"{self.session_id}TTS stream complete: {data.get('message')}")
-                    
-                async def on_error(data):
-                    logging.error(f"{self.session_id}TTS error: {data.get('message')}")
-                
-                # Execute the full TTS workflow - connect, synthesize, and process
-                if await piper_client.connect():
-                    if await piper_client.synthesize(llm_response_text, voice=self.tts_voice):
-                        await piper_client.process_stream(
-                            on_start=on_start,
-                            on_audio=on_audio,
-                            on_end=on_end,
-                            on_error=on_error
-                        )
-                    
-                    # Ensure client is properly closed
-                    await piper_client.close()
-                
-                # Handle any remaining audio bytes (padding to full chunk if needed)
-                if cumulative_pcmu_bytes:
-                    logging.debug(f"{self.session_id}Processing remaining {len(cumulative_pcmu_bytes)} TTS PCMU bytes.")
-                    if len(cumulative_pcmu_bytes) < chunk_size:
-                        # Pad with PCMU silence (0xFF)
-                        final_payload = bytes(cumulative_pcmu_bytes).ljust(chunk_size, b'\xff')
-                    else:
-                        final_payload = bytes(cumulative_pcmu_bytes)
-                    self.queue.put_nowait(final_payload)
-                    logging.debug(f"{self.session_id}Queued final {len(final_payload)} bytes of TTS audio.")
-                
-            except Exception as e:
-                logging.error(f"{self.session_id}Error during TTS processing: {e}", exc_info=True)
+    async def _synthesize_chunk(self, text, sink):
+        """Synthesizes a text chunk with Piper and queues it as PCMU payloads
+        
+        Args:
+            text: Text chunk to synthesize
+            sink: Queue receiving 20 ms PCMU payloads
+            
+        Returns:
+            bool: True if the synthesis completed
+        """
+        return await self._render_piper(self.tts_pool, self.tts_voice, text, sink)
 
+    @classmethod
+    async def _render_piper(cls, tts_pool, voice, text, sink):
+        """Synthesizes a text with Piper into 20 ms PCMU payloads
+        
+        Does not depend on a call, so that prompts can be rendered ahead of time.
+        
+        Args:
+            tts_pool: Piper connection pool
+            voice: Piper voice
+            text: Text to synthesize
+            sink: Queue receiving the PCMU payloads
+            
+        Returns:
+            bool: True if the synthesis completed
+        """
+        # Streaming output stage, created once the input rate is known
+        framer = None
+        input_rate = cls.tts_input_rate
+        # audio that could not be framed makes the synthesis incomplete
+        audio_failed = False
+        
+        def on_start(data):
+            nonlocal input_rate
+            input_rate = int(data.get("sample_rate") or input_rate)
+        
+        async def on_audio(audio_bytes):
+            nonlocal framer, audio_failed
+            try:
+                if framer is None:
+                    framer = PCMUFramer(input_rate, cls.tts_target_output_rate)
+                # Resample, encode and queue RTP-sized frames (160 bytes = 20ms at 8kHz)
+                await framer.feed(audio_bytes, sink)
+            except Exception as audio_e:
+                audio_failed = True
+                logger.error(f"Error processing TTS audio: {audio_e}", exc_info=True)
+        
+        async def on_error(data):
+            logger.error(f"TTS error: {data.get('message')}")
+        
+        # Synthesize and process on a pooled connection
+        success = await tts_pool.synthesize(
+            text,
+            voice=voice,
+            on_start=on_start,
+            on_audio=on_audio,
+            on_error=on_error
+        )
+        
+        # Pad the remaining audio to a full frame with PCMU silence (0xFF)
+        if framer:
+            framer.flush(sink)
+        return success is True and not audio_failed
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Splits text into sentence and clause chunks for incremental TTS """
+
+import re
+
+# abbreviations that end with a period without ending the sentence
+ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc",
+           "e.g", "i.e", "inc", "ltd", "co", "no", "approx", "dept", "est",
+           "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept",
+           "oct", "nov", "dec"},
+    "tr": {"dr", "prof", "doç", "yrd", "av", "sn", "müh", "op", "uzm",
+           "vb", "vs", "bkz", "örn", "no", "tel", "cad", "sok", "mah",
+           "apt", "blv", "böl", "md", "s", "şti", "ltd", "a.ş"},
+}
+
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]»”’]*(?=\s)|\n')
+_CLAUSE_END = re.compile(r'[,;:—–]["\')\]»”’]*(?=\s)')
+
+
+def get_language(tag):
+    """ Returns the language code of a locale or voice name
+    (e.g. `tr-TR`, `tr_TR-fahrettin-medium` -> `tr`) """
+    if not tag:
+        return "en"
+    return re.split(r'[-_]', tag, maxsplit=1)[0].lower()
+
+
+class SentenceChunker:
+    """ Incrementally cuts text into chunks that can be synthesized on their
+    own: full sentences, or clauses when a sentence gets too long """
+
+    def __init__(self, language="en", min_chars=20, max_chars=150):
+        self.language = get_language(language)
+        self.abbreviations = ABBREVIATIONS.get(self.language, set())
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def _is_boundary(self, text, match):
+        """ checks whether a punctuation match really ends a sentence """
+        punct = match.group(0)
+        if punct == "\n" or punct[0] in "!?…":
+            return True
+        word = text[:match.start()].rsplit(None, 1)
+        word = word[-1] if word else ""
+        lword = word.lower().lstrip("\"'(«“‘")
+        if lword in self.abbreviations:
+            return False
+        # single letter initials, e.g. "J. Smith"
+        if len(lword) == 1 and lword.isalpha():
+            return False
+        # Turkish ordinals, e.g. "3. kat", "15. yüzyıl"
+        if self.language == "tr" and lword.isdigit():
+            return False
+        # a lowercase continuation means this was not a sentence end
+        rest = text[match.end():].lstrip()
+        if rest and rest[0].islower():
+            return False
+        return True
+
+    def _next_cut(self, final):
+        """ returns the end index of the next chunk, or None """
+        text = self.buffer
+        for match in _SENTENCE_END.finditer(text):
+            end = match.end()
+            if len(text[:end].strip()) < self.min_chars:
+                continue
+            # wait for the next word, unless this is the end of the text
+            if not final and not text[end:].strip():
+                return None
+            if self._is_boundary(text, match):
+                return end
+        if len(text) <= self.max_chars:
+            return None
+        # sentence too long - cut it at the last clause boundary
+        cut = None
+        for match in _CLAUSE_END.finditer(text, 0, self.max_chars):
+            if match.end() >= self.min_chars:
+                cut = match.end()
+        if cut is None:
+            cut = text.rfind(" ", self.min_chars, self.max_chars)
+        return cut if cut > 0 else self.max_chars
+
+    def feed(self, text):
+        """ adds text and returns the chunks that are complete """
+        self.buffer += text
+        chunks = []
+        while True:
+            cut = self._next_cut(False)
+            if cut is None:
+                break
+            chunk = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """ returns all the remaining text as chunks """
+        chunks = []
+        while self.buffer.strip():
+            cut = self._next_cut(True)
+            if cut is None:
+                cut = len(self.buffer)
+            chunk = self.buffer[:cut].strip()
+            self.buffer = self.buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        self.buffer = ""
+        return chunks
+
+
+def split_text(text, language="en", min_chars=20, max_chars=150):
+    """ Splits a complete text into chunks """
+    chunker = SentenceChunker(language, min_chars, max_chars)
+    return chunker.feed(text) + chunker.flush()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
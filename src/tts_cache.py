@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Caches synthesized phrases as ready-to-send codec frames """
+
+import os
+import re
+import mmap
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from config import Config
+
+
+def normalize_text(text):
+    """ Normalizes a phrase so trivially different spellings share audio """
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def pack_frames(frames):
+    """ Packs frames into a blob of length-prefixed frames """
+    blob = bytearray()
+    for frame in frames:
+        blob += len(frame).to_bytes(2, 'little')
+        blob += frame
+    return bytes(blob)
+
+
+def unpack_frames(blob):
+    """ Returns the frames of a packed blob as views into the blob """
+    view = memoryview(blob)
+    frames = []
+    offset = 0
+    while offset + 2 <= len(view):
+        size = int.from_bytes(view[offset:offset + 2], 'little')
+        offset += 2
+        frames.append(view[offset:offset + size])
+        offset += size
+    return frames
+
+
+class _Recorder:  # pylint: disable=too-few-public-methods
+    """ Sink that forwards frames while recording them """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.frames = []
+
+    def put_nowait(self, frame):
+        """ forwards and records a frame """
+        self.frames.append(bytes(frame))
+        self.sink.put_nowait(frame)
+
+
+class TTSCache:
+    """ Two level cache of synthesized phrases: a bounded in-memory LRU in
+    front of a bounded on-disk store of memory-mapped files, which is shared
+    by all the processes using the same directory """
+
+    _instance = None
+
+    def __init__(self, path=None, memory_size=32 * 1024 * 1024,
+                 max_text_len=200, disk_size=256 * 1024 * 1024):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_text_len = max_text_len
+        self.disk_size = disk_size
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    @classmethod
+    def get(cls):
+        """ Returns the process-wide cache, or None if it is disabled """
+        if cls._instance is None:
+            cfg = Config.get("tts_cache")
+            if cfg.getboolean("disabled", "TTS_CACHE_DISABLE", False):
+                return None
+            path = cfg.get("path", "TTS_CACHE_PATH",
+                           os.path.join(tempfile.gettempdir(),
+                                        "oavc-tts-cache"))
+            memory_size = int(cfg.get("memory_size", "TTS_CACHE_MEMORY_SIZE",
+                                      32)) * 1024 * 1024
+            max_text_len = int(cfg.get("max_text_len",
+                                       "TTS_CACHE_MAX_TEXT_LEN", 200))
+            disk_size = int(cfg.get("disk_size", "TTS_CACHE_DISK_SIZE",
+                                    256)) * 1024 * 1024
+            cls._instance = cls(path or None, memory_size, max_text_len,
+                                disk_size)
+        return cls._instance
+
+    @staticmethod
+    def key(engine, voice, codec, text):
+        """ Returns the cache key of a phrase """
+        data = "\0".join([engine, str(voice), codec, normalize_text(text)])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _file(self, key):
+        """ Returns the on-disk location of an entry """
+        return os.path.join(self.path, key[:2], key + ".frames")
+
+    def _remember(self, key, frames, size):
+        """ Adds an entry to the in-memory LRU """
+        if size > self.memory_size:
+            return
+        self._entries[key] = (frames, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_size:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self._memory_bytes -= old_size
+
+    def _load(self, key):
+        """ Maps an entry from disk, if present """
+        if not self.path:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # used entries are the last ones evicted
+            os.utime(self._file(key))
+        except (FileNotFoundError, ValueError):
+            return None
+        except OSError as e:
+            logging.warning("cannot read TTS cache entry %s: %s", key, e)
+            return None
+        frames = unpack_frames(blob)
+        self._remember(key, frames, len(blob))
+        return frames
+
+    def _disk_entries(self):
+        """ Returns the (mtime, size, path) of the entries on disk """
+        entries = []
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(".frames"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """ Removes the least recently used entries from disk, until the
+        store fits in its size; the directory is scanned again, as other
+        processes may have added or removed entries """
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def _store(self, key, blob):
+        """ Atomically writes an entry to disk """
+        if len(blob) > self.disk_size:
+            return
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._evict()
+            else:
+                self._disk_bytes += len(blob)
+                if self._disk_bytes > self.disk_size:
+                    self._evict()
+
+    def lookup(self, engine, voice, codec, text):
+        """ Returns the cached frames of a phrase, or None """
+        key = self.key(engine, voice, codec, text)
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            frames, size = entry
+        else:
+            frames = self._load(key)
+            size = sum(len(f) for f in frames) if frames else 0
+        if frames:
+            self.hits += 1
+            self.bytes_served += size
+        else:
+            self.misses += 1
+        if (self.hits + self.misses) % 100 == 0:
+            logging.info("TTS cache: %d hits, %d misses (%.1f%%), "
+                         "%d bytes served, %d bytes in memory",
+                         self.hits, self.misses, self.hit_ratio() * 100,
+                         self.bytes_served, self._memory_bytes)
+        return frames
+
+    async def store(self, engine, voice, codec, text, frames):
+        """ Caches the frames of a phrase """
+        if not frames:
+            return
+        key = self.key(engine, voice, codec, text)
+        blob = pack_frames(frames)
+        self._remember(key, unpack_frames(blob), len(blob))
+        if self.path:
+            try:
+                await asyncio.to_thread(self._store, key, blob)
+            except OSError as e:
+                logging.warning("cannot write TTS cache entry %s: %s", key, e)
+
+    def hit_ratio(self):
+        """ Returns the ratio of lookups served from the cache """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def wrap(self, synthesize, engine, voice, codec):
+        """ Wraps a `synthesize(text, sink)` coroutine so that cached phrases
+        are played without calling the backend. Only the phrases for which
+        the coroutine returns True, reporting a complete synthesis, are
+        cached. """
+
+        async def cached_synthesize(text, sink):
+            if len(text) > self.max_text_len:
+                return await synthesize(text, sink)
+            frames = self.lookup(engine, voice, codec, text)
+            if frames:
+                for frame in frames:
+                    sink.put_nowait(frame)
+                return True
+            recorder = _Recorder(sink)
+            result = await synthesize(text, recorder)
+            if result is True:
+                await self.store(engine, voice, codec, text, recorder.frames)
+            return result
+
+        return cached_synthesize
+
+
+def cached(synthesize, engine, voice, codec):
+    """ Returns `synthesize` wrapped by the TTS cache, if enabled """
+    cache = TTSCache.get()
+    if not cache:
+        return synthesize
+    return cache.wrap(synthesize, engine, voice, codec)
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# This file is part of the OpenSIPS AI Voice Connector project
+# (see https://github.com/OpenSIPS/opensips-ai-voice-connector-ce).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+""" Converts streamed 16-bit PCM into 20ms PCMU frames """
+
+import math
+import asyncio
+import numpy as np
+from codec import FrameAssembler
+
+
+def _ulaw_table():
+    """ Returns the G.711 mu-law encoding of every 16-bit sample, computed
+    the same way as audioop.lin2ulaw() """
+    samples = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), 8159) + 33
+    segment = np.searchsorted(
+        np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]),
+        magnitude)
+    table = ((segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)) ^ mask
+    table = np.where(segment >= 8, 0x7F ^ mask, table)
+    # index the table by the unsigned view of the samples
+    return np.roll(table.astype(np.uint8), -32768)
+
+
+ULAW_TABLE = _ulaw_table()
+
+
+class StreamingResampler:
+    """ Polyphase windowed-sinc resampler that keeps its filter history
+    between chunks, so a stream can be resampled piece by piece """
+
+    _banks = {}
+
+    def __init__(self, in_rate, out_rate, taps=32):
+        gcd = math.gcd(in_rate, out_rate)
+        self.up = out_rate // gcd
+        self.down = in_rate // gcd
+        self.taps = taps
+        self.bank = self._get_bank(self.up, self.down, taps)
+        # absolute index of the first buffered input sample
+        self._offset = -(taps - 1)
+        self._buffer = np.zeros(taps - 1, dtype=np.float32)
+        self._next = 0
+
+    @classmethod
+    def _get_bank(cls, up, down, taps):
+        """ Returns the (shared) polyphase filter bank of a ratio """
+        key = (up, down, taps)
+        if key not in cls._banks:
+            length = taps * up
+            cutoff = 0.475 / max(up, down)
+            m = np.arange(length) - (length - 1) / 2
+            h = 2 * cutoff * np.sinc(2 * cutoff * m) * np.kaiser(length, 8.0)
+            h *= up / h.sum()
+            # phase p holds h[p], h[p + up], ... reversed to match the input
+            cls._banks[key] = np.ascontiguousarray(
+                h.reshape(taps, up).T[:, ::-1], dtype=np.float32)
+        return cls._banks[key]
+
+    def process(self, samples):
+        """ Resamples a chunk of float samples """
+        if self.up == self.down:
+            return samples
+        buf = np.concatenate((self._buffer, samples))
+        last = self._offset + len(buf) - 1
+        end = ((last + 1) * self.up - 1) // self.down + 1
+        out = np.arange(self._next, end, dtype=np.int64) * self.down
+        q = out // self.up - self._offset
+        windows = buf[q[:, None] + np.arange(-self.taps + 1, 1)]
+        result = np.einsum('ij,ij->i', windows, self.bank[out % self.up])
+        self._next = end
+        keep = end * self.down // self.up - self.taps + 1 - self._offset
+        keep = min(max(keep, 0), len(buf))
+        self._buffer = buf[keep:]
+        self._offset += keep
+        return result
+
+
+class PCMUFramer:  # pylint: disable=too-few-public-methods
+    """ Streaming output stage: resamples 16-bit PCM chunks, encodes them
+    to mu-law through a lookup table and cuts the result into 20ms frames.
+
+    Each chunk is encoded in a single pass into its own buffer, and frames
+    are published as memoryview slices of it by a FrameAssembler, so no
+    audio is copied after encoding, except for the frames straddling two
+    chunks. """
+
+    # chunks larger than this (in bytes) are converted off the event loop
+    OFFLOAD_SIZE = 16384
+
+    def __init__(self, in_rate, out_rate=8000, frame_size=160,
+                 silence=b'\xff'):
+        self.resampler = StreamingResampler(in_rate, out_rate)
+        self.assembler = FrameAssembler(frame_size, silence)
+        self._odd = b''
+
+    def _convert(self, pcm):
+        """ Resamples and encodes a chunk, returning the complete frames """
+        if self._odd:
+            pcm = self._odd + pcm
+        self._odd = pcm[len(pcm) & ~1:]
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        resampled = self.resampler.process(samples.astype(np.float32))
+        resampled = np.clip(np.rint(resampled), -32768, 32767)
+        encoded = ULAW_TABLE[resampled.astype(np.int16).view(np.uint16)]
+        return self.assembler.feed(encoded)
+
+    async def feed(self, pcm, sink):
+        """ Converts a chunk and puts its complete frames in the sink """
+        if len(pcm) > self.OFFLOAD_SIZE:
+            frames = await asyncio.to_thread(self._convert, pcm)
+        else:
+            frames = self._convert(pcm)
+        for frame in frames:
+            sink.put_nowait(frame)
+        return len(frames)
+
+    def flush(self, sink):
+        """ Pads the last incomplete frame with silence and sends it """
+        frame = self.assembler.flush()
+        if frame:
+            sink.put_nowait(frame)
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
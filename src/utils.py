@@ -23,30 +23,29 @@
 Module that provides helper functions for AI
 """
 
+import gc
+import os
 import re
+import time
+import logging
+import importlib
+import importlib.metadata
 from sipmessage import Address
-from deepgram_api import Deepgram
-from openai_api import OpenAI
-from deepgram_native_api import DeepgramNative
-from speech_session_vosk import VoskSTT
-# Try to import Azure, but don't fail if not available
-try:
-    from azure_api import AzureAI
-    has_azure = True
-except ImportError:
-    has_azure = False
-    print("Azure module not available, Azure STT provider will be disabled")
 from config import Config
+from prompts import render_prompts
 
-# Initialize FLAVORS dictionary
-FLAVORS = {"deepgram": Deepgram,
-           "openai": OpenAI,
-           "deepgram_native": DeepgramNative,
-           "vosk":VoskSTT}
+# Built-in flavors, as "module:Class"; they are only imported when enabled
+FLAVORS = {"deepgram": "deepgram_api:Deepgram",
+           "openai": "openai_api:OpenAI",
+           "deepgram_native": "deepgram_native_api:DeepgramNative",
+           "azure": "azure_api:AzureAI",
+           "vosk": "speech_session_vosk:VoskSTT"}
 
-# Add Azure if available
-if has_azure:
-    FLAVORS["azure"] = AzureAI
+# Entry point group of the flavors provided by other packages
+FLAVORS_ENTRY_POINT = "opensips_ai_voice_connector.flavors"
+
+_flavor_classes = {}
+_unavailable_flavors = set()
 
 class UnknownSIPUser(Exception):
     """ User is not known """
@@ -96,13 +95,107 @@ def _dialplan_match(regex, string):
     return pattern.match(string)
 
 
-def get_ai_flavor_default(user):
-    """ Returns the default algorithm for AI choosing """
-    # remove disabled engines
-    keys = [k for k, _ in FLAVORS.items() if
+def _rss_mb():
+    """ Returns the resident memory of the process, in MB """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def register_flavor_plugins():
+    """ Adds the flavors provided through entry points """
+    for entry_point in importlib.metadata.entry_points(
+            group=FLAVORS_ENTRY_POINT):
+        if entry_point.name in FLAVORS:
+            logging.warning("ignoring %s flavor plugin %s: name already used",
+                            entry_point.name, entry_point.value)
+            continue
+        FLAVORS[entry_point.name] = entry_point.value
+
+
+def get_flavor(flavor):
+    """ Returns the class of a flavor, importing it on first use;
+    returns None if it cannot be imported """
+    cls = _flavor_classes.get(flavor)
+    if cls is not None or flavor in _unavailable_flavors:
+        return cls
+    module_name, _, class_name = FLAVORS[flavor].partition(":")
+    start = time.monotonic()
+    rss = _rss_mb()
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as e:
+        logging.warning("%s flavor is not available: %s", flavor, e)
+        _unavailable_flavors.add(flavor)
+        return None
+    _flavor_classes[flavor] = cls
+    logging.info("Loaded %s flavor in %.0f ms, RSS +%.1f MB (%.1f MB)",
+                 flavor, (time.monotonic() - start) * 1000,
+                 _rss_mb() - rss, _rss_mb())
+    return cls
+
+
+def load_enabled_flavors():
+    """ Imports the enabled flavors, so that calls do not wait for it """
+    register_flavor_plugins()
+    for flavor in get_enabled_flavors():
+        get_flavor(flavor)
+
+
+def preload_flavors():
+    """ Loads the models of the enabled flavors before serving calls """
+    start = time.monotonic()
+    for flavor in get_enabled_flavors():
+        try:
+            get_flavor(flavor).preload()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("Error preloading %s flavor", flavor)
+    # move the preloaded objects out of the reach of the garbage collector,
+    # so that it does not dirty their pages in processes forked from this one
+    gc.freeze()
+    logging.info("Preloaded flavors in %.2fs, RSS %.1f MB",
+                 time.monotonic() - start, _rss_mb())
+
+
+def get_enabled_flavors():
+    """ Returns the flavors that are not disabled """
+    return [k for k in FLAVORS if k not in _unavailable_flavors and
             not Config.get(k).getboolean("disabled",
                                          f"{k.upper()}_DISABLE",
                                          False)]
+
+
+async def warm_up_flavors():
+    """ Prepares the shared resources of the enabled flavors """
+    for flavor in get_enabled_flavors():
+        try:
+            await get_flavor(flavor).warm_up()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logging.exception("Error warming up %s flavor", flavor)
+
+
+async def render_flavor_prompts():
+    """ Pre-renders the fixed prompts of the enabled flavors """
+    flavors = [get_flavor(flavor) for flavor in get_enabled_flavors()]
+    await render_prompts([cls for cls in flavors if cls])
+
+
+async def prepare_flavors():
+    """ Warms up the enabled flavors and pre-renders their prompts """
+    start = time.monotonic()
+    await warm_up_flavors()
+    await render_flavor_prompts()
+    logging.info("Engine ready: flavors warmed up in %.2fs",
+                 time.monotonic() - start)
+
+
+def get_ai_flavor_default(user):
+    """ Returns the default algorithm for AI choosing """
+    # remove disabled engines
+    keys = get_enabled_flavors()
     if user in keys:
         return user
     hash_index = hash(user) % len(keys)
@@ -119,7 +212,7 @@ def get_ai_flavor(params):
     # first, get the sections in order and check if they have a dialplan
     flavor = None
     for flavor in Config.sections():
-        if flavor not in FLAVORS:
+        if flavor not in FLAVORS or flavor in _unavailable_flavors:
             continue
         if Config.get(flavor).getboolean("disabled",
                                          f"{flavor.upper()}_DISABLE",
@@ -139,6 +232,9 @@ def get_ai_flavor(params):
 
 def get_ai(flavor, call, cfg):
     """ Returns an AI object """
-    return FLAVORS[flavor](call, cfg)
+    cls = get_flavor(flavor)
+    if cls is None:
+        raise ValueError(f"{flavor} flavor is not available")
+    return cls(call, cfg)
 
 # vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
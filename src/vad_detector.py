@@ -12,11 +12,22 @@ class VADDetector:
         self.min_silence_duration_ms = min_silence_duration_ms
         logging.info(f"Initializing VADDetector with sample rate: {self.sample_rate}, threshold: {self.threshold}")
 
-        if not VADDetector._model:
-            VADDetector._model = load_silero_vad()
+        self.model = VADDetector._load_model()
+
+    @classmethod
+    def _load_model(cls):
+        if not cls._model:
+            cls._model = load_silero_vad()
             logging.info("Loaded Silero VAD model")
+        return cls._model
 
-        self.model = VADDetector._model
+    @classmethod
+    def preload(cls, sample_rate=16000):
+        """Loads the model and runs it once on noise, so that the first call
+        pays neither for loading it nor for the JIT warm-up"""
+        model = cls._load_model()
+        noise = torch.randn(sample_rate) * 0.1
+        get_speech_timestamps(noise, model, sampling_rate=sample_rate)
 
     def is_speech(self, audio_tensor: torch.Tensor) -> bool:
         if len(audio_tensor.shape) == 2:
@@ -2,9 +2,15 @@ import asyncio
 import websockets
 import json
 import logging
-import traceback
-from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+from websockets.protocol import State
 from typing import Optional
+from messages import loads
+
+logger = logging.getLogger(__name__)
+
+# vosk-server matches these control messages verbatim
+VOSK_EOF_MESSAGE = '{"eof" : 1}'
+VOSK_RESET_MESSAGE = '{"reset" : 1}'
 
 class VoskClient:
     def __init__(self, server_url, timeout=5.0):
@@ -18,10 +24,10 @@ class VoskClient:
         try:
             self.websocket = await websockets.connect(self.server_url)
             self.is_connected = True
-            logging.info(f"Connected to Vosk server at {self.server_url}")
+            logger.info(f"Connected to Vosk server at {self.server_url}")
             return True
         except Exception as e:
-            logging.error(f"Failed to connect to Vosk server: {e}")
+            logger.error(f"Failed to connect to Vosk server: {e}")
             self.is_connected = False
             return False
 
@@ -35,7 +41,7 @@ class VoskClient:
             bool: True if successful, False otherwise
         """
         if not self.is_connected or not self.websocket:
-            logging.error("Cannot send data: Not connected to Vosk server")
+            logger.error("Cannot send data: Not connected to Vosk server")
             return False
 
         try:
@@ -44,57 +50,128 @@ class VoskClient:
             await self.websocket.send(data)
             return True
         except Exception as e:
-            logging.error(f"Failed to send data to Vosk server: {e}")
+            logger.error(f"Failed to send data to Vosk server: {e}")
             self.is_connected = False
             return False
 
     async def send_audio(self, audio_bytes: bytes):
         if not self.is_connected or not self.websocket:
-            logging.error("Cannot send audio: Not connected to Vosk server")
+            logger.error("Cannot send audio: Not connected to Vosk server")
             return False
 
         if not isinstance(audio_bytes, bytes):
-            logging.error(f"Audio data must be bytes, got {type(audio_bytes).__name__}")
+            logger.error(f"Audio data must be bytes, got {type(audio_bytes).__name__}")
             return False
             
         # Debug log the audio data details
         audio_len = len(audio_bytes)
         if audio_len == 0:
-            logging.error("Cannot send empty audio data to Vosk")
+            logger.error("Cannot send empty audio data to Vosk")
             return False
             
         # Add hex dump of first few bytes for debugging
-        if audio_len > 0:
-            hex_preview = ' '.join([f'{b:02x}' for b in audio_bytes[:20]])
-            logging.debug(f"Sending audio: {audio_len} bytes, first 20 bytes: {hex_preview}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending audio: %d bytes, first 20 bytes: %s",
+                         audio_len, audio_bytes[:20].hex(' '))
 
         try:
             await self.websocket.send(audio_bytes)
             return True
         except Exception as e:
-            logging.error(f"Failed to send audio data to Vosk server: {e}")
+            logger.error(f"Failed to send audio data to Vosk server: {e}")
             self.is_connected = False
             return False
 
     async def send_eof(self):
         if not self.is_connected or not self.websocket:
-            logging.error("Cannot send EOF: Not connected to Vosk server")
+            logger.error("Cannot send EOF: Not connected to Vosk server")
             return False
 
         try:
-            logging.info("Sending EOF message to Vosk server")
-            await self.websocket.send(json.dumps({"eof": 1}))
+            logger.info("Sending EOF message to Vosk server")
+            await self.websocket.send(VOSK_EOF_MESSAGE)
             # Sunucuya EOF işlenmesi için kısa bir süre tanı
             await asyncio.sleep(0.1)
             return True
         except Exception as e:
-            logging.error(f"Failed to send EOF to Vosk server: {e}")
+            logger.error(f"Failed to send EOF to Vosk server: {e}")
             self.is_connected = False
             return False
 
-    async def receive_result(self) -> Optional[str]:
+    async def send_reset(self):
+        """Finalize the current utterance without closing the session
+        
+        The server answers with the final result and resets its recognizer,
+        keeping the connection (and the configuration) for the next utterance.
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
         if not self.is_connected or not self.websocket:
-            logging.error("Cannot receive result: Not connected to Vosk server")
+            logger.error("Cannot send reset: Not connected to Vosk server")
+            return False
+
+        try:
+            await self.websocket.send(VOSK_RESET_MESSAGE)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to send reset to Vosk server: {e}")
+            self.is_connected = False
+            return False
+
+    def is_open(self):
+        """Check whether the WebSocket connection is still usable
+        
+        Returns:
+            bool: True if the connection is open
+        """
+        return (self.is_connected and self.websocket is not None
+                and self.websocket.state is State.OPEN)
+
+    async def ping(self, timeout=None):
+        """Check the connection health with a WebSocket ping
+        
+        Args:
+            timeout: Seconds to wait for the pong (defaults to read timeout)
+            
+        Returns:
+            bool: True if the server answered in time
+        """
+        if not self.is_open():
+            return False
+        try:
+            pong = await self.websocket.ping()
+            await asyncio.wait_for(pong, timeout=timeout or self.read_timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Vosk session failed health check: {e}")
+            self.is_connected = False
+            return False
+
+    async def drain(self, idle_timeout=0.5):
+        """Discard pending server messages until the connection goes quiet
+        
+        Args:
+            idle_timeout: Seconds without messages that end the drain
+            
+        Returns:
+            bool: True if the connection is still usable afterwards
+        """
+        if not self.is_open():
+            return False
+        try:
+            while True:
+                await asyncio.wait_for(self.websocket.recv(), timeout=idle_timeout)
+        except asyncio.TimeoutError:
+            return True
+        except Exception as e:
+            logger.debug(f"Vosk session closed while draining: {e}")
+            self.is_connected = False
+            return False
+
+    async def receive_result(self) -> Optional[dict]:
+        if not self.is_connected or not self.websocket:
+            logger.error("Cannot receive result: Not connected to Vosk server")
             return None
 
         try:
@@ -106,41 +183,37 @@ class VoskClient:
                     self.websocket.recv(), 
                     timeout=self.read_timeout
                 )
-                logging.debug(f"Received raw WebSocket message: {message[:100]}...")
-                
-                # JSON mesajı ise, içeriği kontrol et
+                # Decoded once here; handlers receive the decoded result
                 try:
-                    result = json.loads(message)
-                    if "text" in result and result["text"]:
-                        logging.info(f"Transcription received from Vosk: {result['text']}")
-                    elif "partial" in result and result["partial"]:
-                        logging.debug(f"Partial transcription: {result['partial']}")
-                    elif "eof" in result:
-                        logging.info("EOF acknowledgment received from Vosk server")
-                    else:
-                        logging.debug(f"Other message received: {message[:50]}...")
-                except json.JSONDecodeError:
-                    logging.warning(f"Received non-JSON message: {message[:50]}...")
-                except Exception as e:
-                    logging.error(f"Error processing message: {e}")
+                    result = loads(message)
+                except ValueError:
+                    logger.warning("Received non-JSON message: %.50s...", message)
+                    return None
+                if not isinstance(result, dict):
+                    logger.warning("Received unexpected message: %.50s...", message)
+                    return None
                 
-                return message
+                if result.get("text"):
+                    logger.info("Transcription received from Vosk: %s", result["text"])
+                elif "eof" in result:
+                    logger.info("EOF acknowledgment received from Vosk server")
+                return result
                 
             except asyncio.TimeoutError:
-                logging.debug("Timeout while waiting for message from Vosk server")
+                logger.debug("Timeout while waiting for message from Vosk server")
                 return None
             
         except websockets.exceptions.ConnectionClosed as e:
             if e.code == 1000:
-                logging.info(f"WebSocket connection closed normally with code {e.code}")
+                logger.info(f"WebSocket connection closed normally with code {e.code}")
             elif e.code == 1001:
-                logging.info(f"WebSocket connection going away with code {e.code}")
+                logger.info(f"WebSocket connection going away with code {e.code}")
             else:
-                logging.warning(f"WebSocket connection closed with code {e.code}: {e.reason}")
+                logger.warning(f"WebSocket connection closed with code {e.code}: {e.reason}")
             self.is_connected = False
             return None
         except Exception as e:
-            logging.error(f"Error receiving result from Vosk server: {e}")
+            logger.error(f"Error receiving result from Vosk server: {e}")
             self.is_connected = False
             return None
         finally:
@@ -155,9 +228,9 @@ class VoskClient:
             try:
                 # Normal kapatma kodu ile WebSocket'i kapatıyoruz
                 await self.websocket.close(code=1000, reason="Normal closure")
-                logging.info("WebSocket connection closed gracefully")
+                logger.info("WebSocket connection closed gracefully")
             except Exception as e:
-                logging.error(f"Error closing WebSocket connection: {e}")
+                logger.error(f"Error closing WebSocket connection: {e}")
             finally:
                 self.websocket = None
                 self.is_connected = False
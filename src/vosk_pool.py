@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from collections import deque
+from vosk_client import VoskClient
+
+logger = logging.getLogger(__name__)
+
+
+class VoskSessionPool:
+    """Process-wide pool of pre-connected Vosk sessions.
+
+    Sessions are connected and configured ahead of time, leased to calls and
+    reset (instead of closed) when the call releases them. Idle sessions are
+    health-checked in the background and replaced when they go stale.
+    """
+
+    _pools = {}
+
+    @classmethod
+    def get(cls, server_url, sample_rate, channels=1, timeout=5.0, size=2,
+            health_interval=15.0):
+        """Return the pool for a server URL and sample rate, creating it if needed
+
+        Args:
+            server_url: Vosk WebSocket server URL
+            sample_rate: Sample rate sent in the session configuration
+            channels: Number of channels sent in the session configuration
+            timeout: Read timeout of the sessions, in seconds
+            size: Number of sessions kept warm, the leased ones included
+            health_interval: Seconds between health checks of idle sessions
+
+        Returns:
+            VoskSessionPool: The shared pool
+        """
+        key = (server_url, int(sample_rate))
+        pool = cls._pools.get(key)
+        if pool is None:
+            pool = cls(server_url, sample_rate, channels, timeout, size,
+                       health_interval)
+            cls._pools[key] = pool
+        return pool
+
+    def __init__(self, server_url, sample_rate, channels=1, timeout=5.0,
+                 size=2, health_interval=15.0):
+        self.server_url = server_url
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.timeout = float(timeout)
+        self.size = int(size)
+        self.health_interval = float(health_interval)
+        self.leased = 0
+        self._idle = deque()
+        self._fill_task = None
+        self._health_task = None
+        self._recycle_tasks = set()
+
+    def _config_message(self):
+        """Build the configuration message sent on every new session"""
+        return {
+            "config": {
+                "sample_rate": self.sample_rate,
+                "num_channels": self.channels
+            }
+        }
+
+    async def _open(self):
+        """Connect and configure a new session
+
+        Returns:
+            VoskClient: The configured client, or None on failure
+        """
+        client = VoskClient(self.server_url, timeout=self.timeout)
+        if not await client.connect():
+            return None
+        if not await client.send(self._config_message()):
+            await client.close()
+            return None
+        return client
+
+    def _ensure_background(self):
+        """Start the health check task if it is not running"""
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def _warm(self):
+        """Count the sessions that are idle, or will be once released"""
+        return len(self._idle) + len(self._recycle_tasks) + self.leased
+
+    def _schedule_fill(self):
+        """Top the warm sessions up to the pool size in the background"""
+        if self._warm() >= self.size:
+            return
+        if self._fill_task is None or self._fill_task.done():
+            self._fill_task = asyncio.create_task(self._fill())
+
+    async def _fill(self):
+        """Open sessions until the pool holds `size` warm sessions"""
+        while self._warm() < self.size:
+            client = await self._open()
+            if client is None:
+                logger.warning("Could not pre-connect Vosk session to %s", self.server_url)
+                return
+            self._idle.append(client)
+        logger.debug("Vosk pool %s@%s: %d idle, %d leased",
+                     self.server_url, self.sample_rate, len(self._idle), self.leased)
+
+    async def _health_loop(self):
+        """Periodically ping idle sessions and replace the broken ones"""
+        try:
+            while True:
+                await asyncio.sleep(self.health_interval)
+                for client in list(self._idle):
+                    if await client.ping():
+                        continue
+                    logger.info("Dropping stale Vosk session to %s", self.server_url)
+                    try:
+                        self._idle.remove(client)
+                    except ValueError:
+                        pass  # leased while being checked
+                    await client.close()
+                self._schedule_fill()
+        except asyncio.CancelledError:
+            pass
+
+    async def warm_up(self):
+        """Pre-connect the idle sessions and start the health checks"""
+        self._ensure_background()
+        await self._fill()
+
+    async def acquire(self):
+        """Lease a connected and configured session
+
+        Returns:
+            VoskClient: The leased client, or None if the server is unreachable
+        """
+        self._ensure_background()
+        client = None
+        # most recently released sessions are the least likely to be stale
+        while self._idle:
+            candidate = self._idle.pop()
+            if candidate.is_open():
+                client = candidate
+                break
+            await candidate.close()
+        if client is None:
+            client = await self._open()
+        if client is not None:
+            self.leased += 1
+        self._schedule_fill()
+        return client
+
+    def release(self, client, reuse=True):
+        """Return a leased session to the pool
+
+        The session is reset in the background; it is closed instead if it is
+        broken, if `reuse` is False, or if the pool is already full.
+
+        Args:
+            client: The client returned by acquire()
+            reuse: Whether the session may be handed to another call
+        """
+        self.leased = max(0, self.leased - 1)
+        task = asyncio.create_task(self._recycle(client, reuse))
+        self._recycle_tasks.add(task)
+        task.add_done_callback(self._recycle_tasks.discard)
+
+    async def _recycle(self, client, reuse):
+        """Reset a released session and put it back in the idle set"""
+        if reuse and client.is_open() and len(self._idle) < self.size:
+            # the pool may have been filled while draining
+            if (await client.send_reset() and await client.drain()
+                    and len(self._idle) < self.size):
+                self._idle.append(client)
+                return
+        await client.close()
+        # this session does not come back: open another one in its place
+        self._recycle_tasks.discard(asyncio.current_task())
+        self._schedule_fill()
+
+    async def close(self):
+        """Close all idle sessions and stop the background tasks"""
+        for task in (self._health_task, self._fill_task):
+            if task and not task.done():
+                task.cancel()
+        while self._idle:
+            await self._idle.popleft().close()
+
+    @classmethod
+    async def close_all(cls):
+        """Close every pool of the process"""
+        for pool in list(cls._pools.values()):
+            await pool.close()
+        cls._pools.clear()
@@ -0,0 +1,6 @@
+""" Makes the modules of src/ importable by the tests """
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,91 @@
+""" Tests of the barge-in detector """
+
+import time
+import queue
+from types import SimpleNamespace
+
+from barge_in import BargeIn, DECODE_TABLES
+
+# 20 ms mu-law payloads, at about -0, -33 and -40 dBFS
+LOUD = b"\x80" * 160
+SPEECH = b"\xd4" * 160
+NOISE = b"\xe4" * 160
+
+
+class AI:  # pylint: disable=too-few-public-methods
+    """ Counts the interruptions asked to the engine """
+
+    def __init__(self):
+        self.interrupts = 0
+
+    def interrupt(self):
+        self.interrupts += 1
+
+
+def call(playing=True):
+    """ Returns a call whose bot is speaking, unless told otherwise """
+    rtp = queue.Queue()
+    if playing:
+        for _ in range(5):
+            rtp.put_nowait(b"\xff" * 160)
+    return SimpleNamespace(rtp=rtp, ai=AI(),
+                           last_playout=time.monotonic() if playing else 0.0)
+
+
+def feed(barge_in, payload, count):
+    """ Processes payloads, returning the results """
+    return [barge_in.process(payload) for _ in range(count)]
+
+
+def test_speech_over_playback_triggers():
+    c = call()
+    barge_in = BargeIn(c, DECODE_TABLES["mulaw"], min_speech_ms=200)
+    assert feed(barge_in, LOUD, 10) == [False] * 9 + [True]
+    assert c.rtp.empty()
+    assert c.ai.interrupts == 1
+    assert barge_in.count == 1
+
+
+def test_silence_resets_speech():
+    barge_in = BargeIn(call(), DECODE_TABLES["mulaw"], min_speech_ms=200)
+    feed(barge_in, LOUD, 9)
+    barge_in.process(b"\xff" * 160)
+    assert not any(feed(barge_in, LOUD, 9))
+
+
+def test_no_trigger_without_playback():
+    c = call(playing=False)
+    barge_in = BargeIn(c, DECODE_TABLES["mulaw"])
+    assert not any(feed(barge_in, LOUD, 50))
+    assert c.ai.interrupts == 0
+
+
+def test_hold_time():
+    c = call(playing=False)
+    barge_in = BargeIn(c, DECODE_TABLES["mulaw"], min_speech_ms=20)
+    # between two sentences, with nothing queued
+    c.last_playout = time.monotonic() - BargeIn.HOLD_TIME / 3
+    assert barge_in.process(LOUD)
+    c.last_playout = time.monotonic() - BargeIn.HOLD_TIME * 3
+    assert not barge_in.process(LOUD)
+
+
+def test_triggers_once_per_playback():
+    c = call()
+    barge_in = BargeIn(c, DECODE_TABLES["mulaw"], min_speech_ms=20)
+    assert barge_in.process(LOUD)
+    c.rtp.put_nowait(b"\xff" * 160)
+    assert not any(feed(barge_in, LOUD, 20))
+    c.last_playout = time.monotonic()
+    assert barge_in.process(LOUD)
+    assert c.ai.interrupts == 2
+
+
+def test_noise_floor():
+    barge_in = BargeIn(call(), DECODE_TABLES["mulaw"], min_speech_ms=20)
+    feed(barge_in, NOISE, 200)
+    assert abs(barge_in.noise_floor + 40.5) < 1
+    # above the threshold, but not enough above the background noise
+    assert not any(feed(barge_in, SPEECH, 20))
+    fresh = BargeIn(call(), DECODE_TABLES["mulaw"], min_speech_ms=20)
+    assert fresh.process(SPEECH)
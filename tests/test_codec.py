@@ -0,0 +1,84 @@
+""" Tests of the framing of the synthesized audio """
+
+import asyncio
+import queue
+import random
+
+import pytest
+
+pytest.importorskip("aiortc")
+
+# pylint: disable=wrong-import-position
+from codec import FrameAssembler, PARSE_OFFLOAD_SIZE, queue_frames
+
+
+def feed_chunks(assembler, data, sizes):
+    """ Feeds the data in chunks of the given sizes, returning the frames """
+    frames = []
+    offset = 0
+    for size in sizes:
+        chunk = data[offset:offset + size]
+        frames += [bytes(f) for f in assembler.feed(chunk)]
+        offset += size
+    return frames
+
+
+def test_exact_frames_are_views():
+    data = bytes(range(160)) * 3
+    frames = FrameAssembler(160, b"\xff").feed(data)
+    assert [bytes(f) for f in frames] == [bytes(range(160))] * 3
+    assert all(isinstance(f, memoryview) for f in frames)
+
+
+def test_odd_sized_feeds():
+    data = bytes(random.Random(2).getrandbits(8) for _ in range(160 * 20))
+    expected = [data[i:i + 160] for i in range(0, len(data), 160)]
+    for sizes in ([1] * len(data), [7, 333, 159, 161, 1, 2000, 539],
+                  [159] * 20 + [20]):
+        assembler = FrameAssembler(160, b"\xff")
+        assert feed_chunks(assembler, data, sizes) == expected
+        assert assembler.flush() is None
+
+
+def test_small_feeds_are_kept():
+    assembler = FrameAssembler(160, b"\xff")
+    assert assembler.feed(b"\x01" * 100) == []
+    assert assembler.feed(b"\x02" * 50) == []
+    frames = assembler.feed(b"\x03" * 20)
+    assert [bytes(f) for f in frames] == [b"\x01" * 100 + b"\x02" * 50 +
+                                          b"\x03" * 10]
+
+
+def test_flush_pads_with_silence():
+    assembler = FrameAssembler(160, b"\xd5")
+    assembler.feed(b"\x01" * 170)
+    assert assembler.flush() == b"\x01" * 10 + b"\xd5" * 150
+    assert assembler.flush() is None
+
+
+def test_reset_drops_tail():
+    assembler = FrameAssembler(160, b"\xff")
+    assembler.feed(b"\x01" * 100)
+    assembler.reset()
+    assert assembler.flush() is None
+    assert [bytes(f) for f in assembler.feed(b"\x02" * 160)] == [b"\x02" * 160]
+
+
+def test_accepts_memoryviews():
+    buffer = bytearray(b"\x01" * 200)
+    assembler = FrameAssembler(160, b"\xff")
+    frames = assembler.feed(memoryview(buffer)[:170])
+    assert [bytes(f) for f in frames] == [b"\x01" * 160]
+    assert assembler.flush() == b"\x01" * 10 + b"\xff" * 150
+
+
+def test_queue_frames_inline_and_offloaded():
+    async def run(size):
+        playback = queue.Queue()
+        await queue_frames(FrameAssembler(160, b"\xff"), b"\x01" * size,
+                           playback)
+        return playback.qsize()
+
+    assert asyncio.run(run(800)) == 5
+    size = (PARSE_OFFLOAD_SIZE // 160 + 1) * 160
+    assert asyncio.run(run(size)) == size // 160
@@ -0,0 +1,68 @@
+""" Tests of the token budget of the conversations """
+
+from conversation import ConversationContext, estimate_tokens
+
+
+def exchange(context, index, size=40):
+    """ Adds a user message and its answer """
+    context.add("user", f"question {index} " + "q" * size)
+    context.add("assistant", f"answer {index} " + "a" * size)
+
+
+def test_totals_are_tracked():
+    context = ConversationContext("Be brief.", max_tokens=0)
+    exchange(context, 1)
+    assert context.total == sum(estimate_tokens(m["content"])
+                                for m in context.messages)
+    assert context.request("next")[-1] == {"role": "user",
+                                           "content": "next"}
+    assert len(context.request("next")) == 4
+
+
+def test_unlimited_budget_keeps_everything():
+    context = ConversationContext("Be brief.", max_tokens=0)
+    for i in range(50):
+        exchange(context, i)
+    assert len(context.messages) == 101
+    assert context.compactions == 0
+
+
+def test_compaction_drops_oldest_exchanges():
+    context = ConversationContext("Be brief.", max_tokens=200)
+    for i in range(20):
+        exchange(context, i)
+        assert context.total <= context.max_tokens
+    messages = context.messages
+    assert messages[0] == {"role": "system", "content": "Be brief."}
+    assert messages[1] == {"role": "system",
+                           "content": ConversationContext.OMITTED_NOTE}
+    # whole exchanges are dropped, the last one is always kept
+    assert messages[2]["role"] == "user"
+    assert messages[-1]["content"].startswith("answer 19 ")
+    assert messages[-2]["content"].startswith("question 19 ")
+    assert context.compactions > 0
+    assert context.dropped + len(messages) == 20 * 2 + 2
+    assert context.total == sum(estimate_tokens(m["content"])
+                                for m in messages)
+
+
+def test_compaction_goes_down_to_low_water():
+    context = ConversationContext("Be brief.", max_tokens=300, low_water=0.5)
+    while not context.compactions:
+        exchange(context, len(context.messages))
+    assert context.total <= 300 * 0.5 + 2 * estimate_tokens("x" * 50)
+
+
+def test_prefix_is_stable_between_compactions():
+    context = ConversationContext("Be brief.", max_tokens=1000)
+    exchange(context, 1)
+    before = context.request("next")[:-1]
+    exchange(context, 2)
+    assert context.messages[:len(before)] == before
+
+
+def test_oversized_last_exchange_is_kept():
+    context = ConversationContext("Be brief.", max_tokens=50)
+    exchange(context, 1, size=400)
+    assert context.messages[-1]["content"].startswith("answer 1 ")
+    assert context.messages[-2]["content"].startswith("question 1 ")
@@ -0,0 +1,163 @@
+""" Tests of the endpointer and of the speculative answers """
+
+import queue
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from endpointing import Endpointer, same_utterance
+
+
+def endpointer(stability_ms=20):
+    """ Returns an endpointer, and the list of the partials it fired on """
+    fired = []
+    return Endpointer(fired.append, stability_ms), fired
+
+
+def test_same_utterance():
+    assert same_utterance("Hello there", "hello, there.")
+    assert not same_utterance("Hello there", "hello where")
+
+
+def test_fires_on_stable_partial():
+    async def run():
+        ep, fired = endpointer()
+        ep.on_partial("hello")
+        ep.on_speech_end()
+        await asyncio.sleep(0.05)
+        assert fired == ["hello"]
+        # only once per partial
+        ep.on_speech_start()
+        ep.on_speech_end()
+        await asyncio.sleep(0.05)
+        assert fired == ["hello"]
+
+    asyncio.run(run())
+
+
+def test_waits_for_end_of_speech():
+    async def run():
+        ep, fired = endpointer()
+        ep.on_partial("hello")
+        await asyncio.sleep(0.05)
+        assert not fired
+        ep.on_speech_end()
+        ep.on_speech_start()
+        await asyncio.sleep(0.05)
+        assert not fired
+
+    asyncio.run(run())
+
+
+def test_changing_partial_rearms():
+    async def run():
+        ep, fired = endpointer(stability_ms=40)
+        ep.on_speech_end()
+        ep.on_partial("hello")
+        await asyncio.sleep(0.025)
+        ep.on_partial("hello there")
+        await asyncio.sleep(0.025)
+        assert not fired
+        await asyncio.sleep(0.05)
+        assert fired == ["hello there"]
+
+    asyncio.run(run())
+
+
+def test_final_resets():
+    async def run():
+        ep, fired = endpointer()
+        ep.on_partial("hello")
+        ep.on_speech_end()
+        ep.on_final()
+        await asyncio.sleep(0.05)
+        assert not fired
+        assert not ep.partial
+
+    asyncio.run(run())
+
+
+class LLM:
+    """ Answers every message with the same sentence """
+
+    def __init__(self):
+        self.exchanges = []
+
+    async def stream(self, b2b_key, message, commit=True):
+        # pylint: disable=unused-argument
+        await asyncio.sleep(0)
+        yield "Hi."
+
+    def add_exchange(self, b2b_key, message, answer):
+        self.exchanges.append((b2b_key, message, answer))
+
+
+def session(monkeypatch, timeout_ms=1000):
+    """ Returns a Vosk session reduced to its answering logic """
+    vosk = pytest.importorskip("speech_session_vosk")
+    monkeypatch.setattr(vosk, "cached", lambda synthesize, *args: synthesize)
+    s = vosk.VoskSTT.__new__(vosk.VoskSTT)
+
+    async def synthesize(text, sink):
+        sink.put_nowait(text.encode())
+        return True
+
+    s.__dict__.update(
+        b2b_key="key", llm=LLM(), queue=queue.Queue(), bypass_vad=True,
+        codec=SimpleNamespace(name="pcmu"), tts_voice="voice",
+        tts_language="en", tts_task=None, tts_pipeline=None,
+        endpointer=None, _is_closing=False, _utterance_end=None,
+        _speculation=None, endpoint_timeout_ms=timeout_ms,
+        speculation_stats={"issued": 0, "confirmed": 0, "wasted": 0,
+                           "saved_ms": 0},
+        _synthesize_chunk=synthesize)
+    return s
+
+
+def test_matching_final_confirms(monkeypatch):
+    s = session(monkeypatch)
+
+    async def run():
+        s._on_endpoint("hello there")
+        await asyncio.sleep(0.01)
+        assert s.queue.empty()
+        await s._handle_final_transcript("Hello, there.")
+        await s.tts_task
+
+    asyncio.run(run())
+    assert s.queue.get_nowait() == b"Hi."
+    # the context gets the final transcript, not the partial one
+    assert s.llm.exchanges == [("key", "Hello, there.", "Hi.")]
+    assert s.speculation_stats["confirmed"] == 1
+    assert s.speculation_stats["wasted"] == 0
+
+
+def test_differing_final_discards(monkeypatch):
+    s = session(monkeypatch)
+
+    async def run():
+        s._on_endpoint("hello there")
+        await asyncio.sleep(0.01)
+        await s._handle_final_transcript("hello where")
+        await s.tts_task
+
+    asyncio.run(run())
+    assert s.queue.qsize() == 1
+    # the final answer commits its exchange itself
+    assert not s.llm.exchanges
+    assert s.speculation_stats["wasted"] == 1
+    assert s.speculation_stats["confirmed"] == 0
+
+
+def test_timeout_confirms(monkeypatch):
+    s = session(monkeypatch, timeout_ms=20)
+
+    async def run():
+        s._on_endpoint("hello there")
+        await s.tts_task
+
+    asyncio.run(run())
+    assert s.queue.get_nowait() == b"Hi."
+    assert s.llm.exchanges == [("key", "hello there", "Hi.")]
+    assert s.speculation_stats["confirmed"] == 1
@@ -0,0 +1,102 @@
+""" Tests of the call context, levels and sampling of the log records """
+
+import time
+import queue
+import asyncio
+import logging
+
+import log_context
+from log_context import (CallContextFilter, LogSampler, bind_call,
+                         current_call, set_call_level, clear_call_level)
+
+
+def record(name="engine", level=logging.INFO):
+    """ Returns a log record """
+    return logging.LogRecord(name, level, __file__, 1, "message", (), None)
+
+
+def test_bind_call():
+    async def run():
+        async def child():
+            return current_call()
+
+        with bind_call("outer"):
+            with bind_call("inner"):
+                assert current_call() == "inner"
+            task = asyncio.create_task(child())
+        # the task keeps the call it was started in
+        assert await task == "outer"
+        assert current_call() is None
+
+    asyncio.run(run())
+
+
+def test_filter_tags_records():
+    log_filter = CallContextFilter()
+    plain = record()
+    assert log_filter.filter(plain)
+    assert plain.call == ""
+    with bind_call("key"):
+        tagged = record()
+        assert log_filter.filter(tagged)
+    assert tagged.call == "[key] "
+
+
+def test_component_levels():
+    log_filter = CallContextFilter(logging.INFO,
+                                   {"vosk_pool": logging.WARNING,
+                                    "vosk_pool.debug": logging.DEBUG})
+    assert not log_filter.filter(record("vosk_pool"))
+    assert log_filter.filter(record("vosk_pool.debug.x", logging.DEBUG))
+    assert not log_filter.filter(record("engine", logging.DEBUG))
+    log_filter.configure(logging.DEBUG, {})
+    assert log_filter.filter(record("vosk_pool", logging.DEBUG))
+
+
+def test_call_level():
+    root = logging.getLogger()
+    old = root.level
+    log_filter = CallContextFilter()
+    try:
+        set_call_level("noisy", "debug")
+        assert root.level == logging.DEBUG
+        with bind_call("noisy"):
+            assert log_filter.filter(record(level=logging.DEBUG))
+        with bind_call("quiet"):
+            assert not log_filter.filter(record(level=logging.DEBUG))
+        clear_call_level("noisy")
+        assert root.level == log_context._filter.level
+        with bind_call("noisy"):
+            assert not log_filter.filter(record(level=logging.DEBUG))
+    finally:
+        clear_call_level("noisy")
+        root.setLevel(old)
+
+
+def test_parse_components():
+    assert log_context._parse_components(" vosk=debug, ,engine=30") == {
+        "vosk": logging.DEBUG, "engine": logging.WARNING}
+
+
+def test_full_queue_drops_records():
+    handler = log_context._LazyQueueHandler(queue.Queue(1))
+    handler.handle(record())
+    handler.handle(record())
+    handler.handle(record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
+
+
+def test_sampler_every():
+    sampler = LogSampler(every=3)
+    assert [sampler.sample() for _ in range(6)] == [None, None, 2,
+                                                    None, None, 2]
+
+
+def test_sampler_interval():
+    sampler = LogSampler(interval=60)
+    sampler._last = time.monotonic() - 61
+    assert sampler.sample() == 0
+    assert sampler.sample() is None
+    sampler._last -= 61
+    assert sampler.sample() == 1
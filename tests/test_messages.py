@@ -0,0 +1,81 @@
+""" Tests of the decoding and dispatching of the backend messages """
+
+import sys
+import base64
+import asyncio
+import importlib
+
+import messages
+from messages import MessageDispatcher, peek_type, extract_base64
+
+AUDIO = bytes(range(256))
+FRAME = ('{"type": "audio", "event_id": "e1", "delta": "'
+         + base64.b64encode(AUDIO).decode() + '"}')
+
+
+def test_peek_type():
+    assert peek_type(FRAME) == "audio"
+    assert peek_type(' { "type":"done"}') == "done"
+    # only when the type comes first
+    assert peek_type('{"id": 1, "type": "done"}') is None
+    assert peek_type('{"type": "esc\\"aped"}') is None
+
+
+def test_extract_base64():
+    assert extract_base64(FRAME, "delta") == AUDIO
+    assert extract_base64(FRAME, "missing") is None
+    assert extract_base64('{"delta": "ab\\/cd"}', "delta") is None
+
+
+def test_dispatch():
+    async def run():
+        decoded, raw = [], []
+
+        async def on_done(msg):
+            decoded.append(msg)
+
+        async def on_audio(frame):
+            raw.append(extract_base64(frame, "delta"))
+            return True
+
+        dispatcher = MessageDispatcher("test", {"done": on_done},
+                                       {"audio": on_audio})
+        await dispatcher.dispatch(FRAME)
+        await dispatcher.dispatch('{"type": "done", "id": 1}')
+        for _ in range(3):
+            await dispatcher.dispatch('{"type": "ping"}')
+        await dispatcher.dispatch('{"id": 2}')
+        assert raw == [AUDIO]
+        assert decoded == [{"type": "done", "id": 1}]
+        assert dispatcher.unhandled == {"ping": 3, None: 1}
+
+    asyncio.run(run())
+
+
+def test_raw_handler_can_fall_back():
+    async def run():
+        decoded = []
+
+        async def on_audio(frame):  # pylint: disable=unused-argument
+            return False
+
+        async def on_decoded(msg):
+            decoded.append(msg["event_id"])
+
+        dispatcher = MessageDispatcher("test", {"audio": on_decoded},
+                                       {"audio": on_audio})
+        await dispatcher.dispatch(FRAME)
+        assert decoded == ["e1"]
+
+    asyncio.run(run())
+
+
+def test_json_fallback(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    try:
+        fallback = importlib.reload(messages)
+        assert fallback.loads('{"a": [1, "b"]}') == {"a": [1, "b"]}
+        assert fallback.dumps({"a": [1, "b"]}) == '{"a":[1,"b"]}'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(messages)
@@ -0,0 +1,95 @@
+""" Tests of the streaming Ogg Opus demuxer """
+
+import random
+
+from opus import OggOpusDemuxer, OGG_CONTINUED
+
+
+def lacing(size, last=True):
+    """ Returns the lacing values of a packet, or of the part of a packet
+    that continues on the next page when `last` is False """
+    values = [255] * (size // 255)
+    if last:
+        values.append(size % 255)
+    return values
+
+
+def page(segments, continued=False, seq=0):
+    """ Builds an Ogg page from (data, lacing values) segments """
+    table = b"".join(bytes(values) for _, values in segments)
+    header = (b"OggS" + bytes([0, OGG_CONTINUED if continued else 0]) +
+              bytes(8) + (1234).to_bytes(4, "little") +
+              seq.to_bytes(4, "little") + bytes(4) + bytes([len(table)]))
+    return header + table + b"".join(data for data, _ in segments)
+
+
+def packet(size, fill):
+    """ Returns an Opus packet of a given size """
+    return bytes([fill]) * size
+
+
+def stream():
+    """ Returns an Ogg Opus stream, and the audio packets it carries """
+    packets = [packet(size, i) for i, size in
+               enumerate([80, 120, 255, 160, 600, 90], 1)]
+    big = packets[4]
+    data = page([(b"OpusHead" + bytes(11), lacing(19))], seq=0)
+    data += page([(b"OpusTags" + bytes(8), lacing(16))], seq=1)
+    data += page([(p, lacing(len(p))) for p in packets[:4]], seq=2)
+    # the fifth packet spans two pages
+    data += page([(big[:510], lacing(510, last=False))], seq=3)
+    data += page([(big[510:], lacing(90)), (packets[5], lacing(90))],
+                 continued=True, seq=4)
+    return data, packets
+
+
+def feed_chunks(demuxer, data, sizes):
+    """ Feeds the data in chunks of the given sizes """
+    packets = []
+    offset = 0
+    for size in sizes:
+        packets += demuxer.feed(data[offset:offset + size])
+        offset += size
+    return packets + demuxer.feed(data[offset:])
+
+
+def test_whole_stream():
+    data, packets = stream()
+    demuxer = OggOpusDemuxer()
+    assert demuxer.feed(data) == packets
+    assert demuxer.pages == 5
+    assert demuxer.discarded == 0
+
+
+def test_split_chunks():
+    data, packets = stream()
+    rand = random.Random(1)
+    for _ in range(50):
+        sizes = [rand.randint(1, 200) for _ in range(len(data) // 50)]
+        assert feed_chunks(OggOpusDemuxer(), data, sizes) == packets
+    assert feed_chunks(OggOpusDemuxer(), data, [1] * len(data)) == packets
+
+
+def test_junk_before_capture_pattern():
+    data, packets = stream()
+    junk = b"xxOgg\x00garbage"
+    demuxer = OggOpusDemuxer()
+    assert feed_chunks(demuxer, junk + data, [3, 4, 30]) == packets
+    assert demuxer.discarded == len(junk)
+
+
+def test_lost_continuation_is_discarded():
+    _, packets = stream()
+    demuxer = OggOpusDemuxer()
+    first = page([(packets[4][:510], lacing(510, last=False))])
+    assert demuxer.feed(first) == []
+    assert demuxer.feed(page([(packets[0], lacing(80))])) == [packets[0]]
+    assert demuxer.discarded == 510
+
+
+def test_reset_drops_incomplete_data():
+    data, packets = stream()
+    demuxer = OggOpusDemuxer()
+    demuxer.feed(data[:-10])
+    demuxer.reset()
+    assert demuxer.feed(page([(packets[0], lacing(80))])) == [packets[0]]
@@ -0,0 +1,64 @@
+""" Tests of the Piper TTS connection pool """
+
+import asyncio
+
+from piper_client import PiperClientPool
+
+
+class FakeClient:
+    """ An open connection that does nothing """
+
+    def is_open(self):
+        return True
+
+    async def close(self):
+        pass
+
+
+def slow_pool(max_size=2):
+    """ Returns a pool whose connections take long to open """
+    pool = PiperClientPool(max_size=max_size)
+
+    async def connect():
+        await asyncio.sleep(10)
+        return FakeClient()
+
+    pool._connect = connect
+    return pool
+
+
+def test_cancelled_acquire_releases_slot():
+    async def run():
+        pool = slow_pool()
+        for _ in range(pool.max_size):
+            task = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        async def connect():
+            return FakeClient()
+
+        pool._connect = connect
+        client = await asyncio.wait_for(pool.acquire(), 1)
+        assert isinstance(client, FakeClient)
+        pool.release(client)
+        pool._evict_task.cancel()
+
+    asyncio.run(run())
+
+
+def test_acquire_reuses_released_client():
+    async def run():
+        pool = PiperClientPool(max_size=1)
+
+        async def connect():
+            return FakeClient()
+
+        pool._connect = connect
+        client = await pool.acquire()
+        pool.release(client)
+        assert await asyncio.wait_for(pool.acquire(), 1) is client
+        pool._evict_task.cancel()
+
+    asyncio.run(run())
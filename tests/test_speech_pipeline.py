@@ -0,0 +1,137 @@
+""" Tests of the pipelined synthesis of the answers """
+
+import asyncio
+import queue
+
+import pytest
+
+from speech_pipeline import SpeechPipeline, AnswerTasks, speak_answer
+
+
+def synthesizer(delay=0.0):
+    """ Returns a synthesize coroutine producing one packet per word """
+    async def synthesize(text, sink):
+        for word in text.split():
+            await asyncio.sleep(delay)
+            sink.put_nowait(word)
+        return True
+    return synthesize
+
+
+def test_chunks_are_forwarded_in_order():
+    async def run():
+        playback = queue.Queue()
+        speech = SpeechPipeline(synthesizer(), playback, lookahead=2)
+        for text in ("one two", "three", "four five six"):
+            speech.push(text)
+        speech.finish()
+        await speech.wait()
+        return list(playback.queue), speech
+
+    packets, speech = asyncio.run(run())
+    assert packets == ["one", "two", "three", "four", "five", "six"]
+    assert speech.done and speech.packets == 6
+
+
+def test_wait_returns_when_pipeline_is_cancelled():
+    async def run():
+        speech = SpeechPipeline(synthesizer(10), queue.Queue())
+        speech.push("never spoken")
+        waiter = asyncio.create_task(speech.wait())
+        await asyncio.sleep(0.01)
+        speech.cancel()
+        await asyncio.wait_for(waiter, 1)
+        return waiter
+
+    assert not asyncio.run(run()).cancelled()
+
+
+def test_caller_cancelled_after_pipeline_stays_cancelled():
+    async def run():
+        speech = SpeechPipeline(synthesizer(10), queue.Queue())
+        speech.push("never spoken")
+        waiter = asyncio.create_task(speech.wait())
+        await asyncio.sleep(0.01)
+        # what interrupt() does: the pipeline, then the answer task
+        speech.cancel()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return waiter
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_no_push_after_cancel():
+    async def run():
+        playback = queue.Queue()
+        speech = SpeechPipeline(synthesizer(), playback)
+        speech.cancel()
+        speech.push("ignored")
+        await speech.wait()
+        return playback
+
+    assert asyncio.run(run()).empty()
+
+
+def test_speak_answer_pushes_sentences_as_generated():
+    spoken = []
+
+    async def synthesize(text, sink):
+        spoken.append(text)
+        sink.put_nowait(text)
+        return True
+
+    async def deltas():
+        for delta in ("Hello there, how ", "are you today? I am ",
+                      "fine, thanks for asking."):
+            yield delta
+            await asyncio.sleep(0)
+        # the first sentence is being spoken before the answer ends
+        assert spoken == ["Hello there, how are you today?"]
+
+    async def run():
+        playback = queue.Queue()
+        await speak_answer(SpeechPipeline(synthesize, playback), deltas())
+        return list(playback.queue)
+
+    assert asyncio.run(run()) == ["Hello there, how are you today?",
+                                  "I am fine, thanks for asking."]
+
+
+def test_cancelled_answer_closes_stream_and_pipeline():
+    closed = asyncio.Event()
+
+    async def deltas():
+        try:
+            yield "A first sentence that is long enough. "
+            await asyncio.sleep(10)
+        finally:
+            closed.set()
+
+    async def run():
+        speech = SpeechPipeline(synthesizer(10), queue.Queue())
+        answers = AnswerTasks()
+        task = answers.start(speak_answer(speech, deltas()))
+        await asyncio.sleep(0.01)
+        answers.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return speech
+
+    speech = asyncio.run(run())
+    assert closed.is_set()
+    assert speech.cancelled
+
+
+def test_failed_answer_cancels_pipeline():
+    async def deltas():
+        yield "Some words"
+        raise RuntimeError("stream broken")
+
+    async def run():
+        speech = SpeechPipeline(synthesizer(), queue.Queue())
+        await speak_answer(speech, deltas())
+        return speech
+
+    assert asyncio.run(run()).cancelled
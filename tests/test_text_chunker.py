@@ -0,0 +1,81 @@
+""" Tests of the sentence chunking of the answers """
+
+from text_chunker import SentenceChunker, get_language, split_text
+
+
+def feed_by(text, step, language="en"):
+    """ Feeds a text to a chunker `step` characters at a time """
+    chunker = SentenceChunker(language)
+    chunks = []
+    for i in range(0, len(text), step):
+        chunks += chunker.feed(text[i:i + step])
+    return chunks + chunker.flush()
+
+
+def test_get_language():
+    assert get_language("tr-TR") == "tr"
+    assert get_language("tr_TR-fahrettin-medium") == "tr"
+    assert get_language("en-US") == "en"
+    assert get_language(None) == "en"
+
+
+def test_splits_sentences():
+    text = ("Hello, how are you doing today? I am fine, thank you. "
+            "Let me check your account!")
+    assert split_text(text) == ["Hello, how are you doing today?",
+                                "I am fine, thank you.",
+                                "Let me check your account!"]
+
+
+def test_short_sentences_are_merged():
+    assert split_text("Yes. Sure. I can do that for you right now.") == [
+        "Yes. Sure. I can do that for you right now."]
+
+
+def test_english_abbreviations():
+    text = "Please call Dr. Smith at the clinic. He will see you at noon."
+    assert split_text(text) == ["Please call Dr. Smith at the clinic.",
+                                "He will see you at noon."]
+
+
+def test_turkish_abbreviations():
+    text = "Randevunuz Prof. Yılmaz ile yarın. Lütfen erken gelin efendim."
+    assert split_text(text, "tr-TR") == ["Randevunuz Prof. Yılmaz ile yarın.",
+                                         "Lütfen erken gelin efendim."]
+
+
+def test_turkish_ordinals():
+    text = "Ofisimiz binanın 3. katında bulunuyor. Asansörü kullanabilirsiniz."
+    assert split_text(text, "tr") == ["Ofisimiz binanın 3. katında bulunuyor.",
+                                      "Asansörü kullanabilirsiniz."]
+    assert split_text("Bina 15. Yüzyılda yapılmış ve hâlâ ayakta.", "tr") == [
+        "Bina 15. Yüzyılda yapılmış ve hâlâ ayakta."]
+
+
+def test_long_sentences_are_cut_at_clauses():
+    text = ("This is a rather long sentence that keeps going on and on, "
+            "with several clauses separated by commas, and it goes well "
+            "beyond the maximum length of a chunk, so it must be cut.")
+    chunks = split_text(text, max_chars=80)
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    assert " ".join(chunks) == text
+    assert chunks[0].endswith(",")
+
+
+def test_feed_delta_by_delta():
+    text = ("Merhaba, size nasıl yardımcı olabilirim? Dr. Kaya bugün "
+            "2. katta hasta kabul ediyor. Randevu ister misiniz?")
+    expected = split_text(text, "tr")
+    assert len(expected) == 3
+    for step in (1, 2, 3, 7, 50):
+        assert feed_by(text, step, "tr") == expected
+
+
+def test_feed_waits_for_the_next_word():
+    chunker = SentenceChunker()
+    assert chunker.feed("Please call Dr.") == []
+    assert chunker.feed(" Smith at the clinic today.") == []
+    assert chunker.feed(" Thanks") == ["Please call Dr. Smith at the clinic "
+                                       "today."]
+    assert chunker.flush() == ["Thanks"]
+    assert chunker.flush() == []
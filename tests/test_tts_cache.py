@@ -0,0 +1,115 @@
+""" Tests of the cache of synthesized phrases """
+
+import os
+import time
+import asyncio
+
+from tts_cache import TTSCache
+
+FRAME = b"\xff" * 160
+
+
+class Sink:  # pylint: disable=too-few-public-methods
+    """ Collects the frames put in it """
+
+    def __init__(self):
+        self.frames = []
+
+    def put_nowait(self, frame):
+        self.frames.append(bytes(frame))
+
+
+def backend(result=True, frames=3):
+    """ Returns a synthesize coroutine, and the list of its calls """
+    calls = []
+
+    async def synthesize(text, sink):
+        calls.append(text)
+        for _ in range(frames):
+            sink.put_nowait(FRAME)
+        return result
+
+    return synthesize, calls
+
+
+def speak(synthesize, text):
+    """ Runs a synthesis, returning its result and the frames played """
+    sink = Sink()
+    result = asyncio.run(synthesize(text, sink))
+    return result, sink.frames
+
+
+def test_miss_then_hit(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    synthesize, calls = backend()
+    wrapped = cache.wrap(synthesize, "test", "voice", "pcmu")
+    assert speak(wrapped, "Hello there.") == (True, [FRAME] * 3)
+    assert speak(wrapped, "Hello   there. ") == (True, [FRAME] * 3)
+    assert calls == ["Hello there."]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_hit_from_disk(tmp_path):
+    synthesize, calls = backend()
+    first = TTSCache(str(tmp_path))
+    speak(first.wrap(synthesize, "test", "voice", "pcmu"), "Hello.")
+    other = TTSCache(str(tmp_path))
+    result, frames = speak(other.wrap(synthesize, "test", "voice", "pcmu"),
+                           "Hello.")
+    assert (result, frames) == (True, [FRAME] * 3)
+    assert len(calls) == 1
+
+
+def test_failures_are_not_cached(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    for result in (False, None):
+        synthesize, calls = backend(result)
+        wrapped = cache.wrap(synthesize, "test", "voice", "pcmu")
+        speak(wrapped, "Hello.")
+        speak(wrapped, "Hello.")
+        assert len(calls) == 2
+    assert cache.lookup("test", "voice", "pcmu", "Hello.") is None
+    assert not list(tmp_path.rglob("*.frames"))
+
+
+def test_long_phrases_are_not_cached():
+    cache = TTSCache(max_text_len=10)
+    synthesize, calls = backend()
+    wrapped = cache.wrap(synthesize, "test", "voice", "pcmu")
+    speak(wrapped, "A phrase longer than ten characters.")
+    speak(wrapped, "A phrase longer than ten characters.")
+    assert len(calls) == 2
+
+
+def test_memory_is_bounded():
+    # each entry is 3 frames of 162 bytes, once packed
+    cache = TTSCache(memory_size=3 * 162 * 2)
+    synthesize, calls = backend()
+    wrapped = cache.wrap(synthesize, "test", "voice", "pcmu")
+    for text in ("One.", "Two.", "Three."):
+        speak(wrapped, text)
+    assert cache._memory_bytes <= cache.memory_size
+    speak(wrapped, "Three.")
+    speak(wrapped, "Two.")
+    assert len(calls) == 3
+    speak(wrapped, "One.")
+    assert calls == ["One.", "Two.", "Three.", "One."]
+
+
+def test_disk_is_bounded(tmp_path):
+    # room for two entries of 3 frames of 162 bytes
+    cache = TTSCache(str(tmp_path), disk_size=3 * 162 * 2)
+    synthesize, calls = backend()
+    wrapped = cache.wrap(synthesize, "test", "voice", "pcmu")
+    for age, text in ((30, "One."), (20, "Two."), (10, "Three.")):
+        speak(wrapped, text)
+        # make the order of the writes visible despite the mtime resolution
+        path = cache._file(cache.key("test", "voice", "pcmu", text))
+        if os.path.exists(path):
+            os.utime(path, (time.time() - age,) * 2)
+    files = list(tmp_path.rglob("*.frames"))
+    assert sum(f.stat().st_size for f in files) <= cache.disk_size
+    assert len(files) == 2
+    other = TTSCache(str(tmp_path))
+    assert other.lookup("test", "voice", "pcmu", "Three.")
+    assert other.lookup("test", "voice", "pcmu", "One.") is None
@@ -0,0 +1,118 @@
+""" Tests of the pool of pre-connected Vosk sessions """
+
+import asyncio
+
+from vosk_pool import VoskSessionPool
+
+
+class FakeClient:
+    """ A Vosk session that can be reset, pinged and broken """
+
+    def __init__(self):
+        self.open = True
+        self.resets = 0
+        self.closed = False
+
+    def is_open(self):
+        return self.open
+
+    async def send_reset(self):
+        self.resets += 1
+        return self.open
+
+    async def drain(self):
+        return self.open
+
+    async def ping(self):
+        return self.open
+
+    async def close(self):
+        self.open = False
+        self.closed = True
+
+
+def fake_pool(size=1, health_interval=15.0):
+    """ Returns a pool opening fake sessions, and the list of them """
+    pool = VoskSessionPool("ws://vosk", 8000, size=size,
+                           health_interval=health_interval)
+    opened = []
+
+    async def open_session():
+        client = FakeClient()
+        opened.append(client)
+        return client
+
+    pool._open = open_session
+    return pool, opened
+
+
+async def settle():
+    """ Lets the background fill and recycle tasks run """
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_released_session_is_reused():
+    async def run():
+        pool, opened = fake_pool(size=2)
+        first = await pool.acquire()
+        pool.release(first)
+        await settle()
+        second = await pool.acquire()
+        await pool.close()
+        return first, second, opened
+
+    first, second, opened = asyncio.run(run())
+    assert second is first
+    assert first.resets == 1 and not first.closed
+    # one session for the call, one kept warm next to it
+    assert len(opened) == 2
+
+
+def test_idle_sessions_stay_bounded():
+    async def run():
+        pool, opened = fake_pool(size=2)
+        clients = [await pool.acquire() for _ in range(4)]
+        for client in clients:
+            pool.release(client)
+        await settle()
+        idle = len(pool._idle)
+        closed = sum(client.closed for client in clients)
+        await pool.close()
+        return idle, closed
+
+    idle, closed = asyncio.run(run())
+    assert idle == 2
+    assert closed == 2
+
+
+def test_not_reusable_session_is_replaced():
+    async def run():
+        pool, opened = fake_pool(size=1)
+        client = await pool.acquire()
+        pool.release(client, reuse=False)
+        await settle()
+        idle = list(pool._idle)
+        await pool.close()
+        return client, idle, opened
+
+    client, idle, opened = asyncio.run(run())
+    assert client.closed
+    assert idle == [opened[-1]] and opened[-1] is not client
+
+
+def test_stale_sessions_are_evicted():
+    async def run():
+        pool, opened = fake_pool(size=1, health_interval=0.01)
+        await pool.warm_up()
+        stale = opened[0]
+        stale.open = False
+        await asyncio.sleep(0.05)
+        idle = list(pool._idle)
+        await pool.close()
+        return stale, idle, opened
+
+    stale, idle, opened = asyncio.run(run())
+    assert stale.closed
+    assert idle and stale not in idle
+    assert idle[0] is opened[-1]